@@ -4,10 +4,12 @@ from typing import List, Optional
 
 from pydantic import BaseModel, Field, model_validator
 
+from app.checkpoint import CheckpointStore
 from app.llm import LLM
 from app.logger import logger
 from app.sandbox.client import SANDBOX_CLIENT
 from app.schema import ROLE_TYPE, AgentState, Memory, Message
+from app.tracing import tracer
 
 
 class BaseAgent(BaseModel, ABC):
@@ -42,6 +44,25 @@ class BaseAgent(BaseModel, ABC):
 
     duplicate_threshold: int = 2
 
+    # Durable per-step snapshots, used to resume an interrupted run
+    checkpoint: Optional[CheckpointStore] = Field(
+        None, description="Checkpoint store written after every step"
+    )
+    checkpoint_id: Optional[str] = Field(
+        None,
+        description="Key of this agent's checkpoint records; defaults to its name, "
+        "so agents that share a name and a store need distinct ids",
+    )
+
+    @property
+    def checkpoint_key(self) -> str:
+        return self.checkpoint_id or self.name
+
+    # Pooled agents keep their tools and sandbox warm between runs
+    cleanup_after_run: bool = Field(
+        True, description="Release tool and sandbox resources when run() returns"
+    )
+
     class Config:
         arbitrary_types_allowed = True
         extra = "allow"  # Allow extra fields for flexibility in subclasses
@@ -132,27 +153,57 @@ class BaseAgent(BaseModel, ABC):
             self.update_memory("user", request)
 
         results: List[str] = []
-        async with self.state_context(AgentState.RUNNING):
-            while (
-                self.current_step < self.max_steps and self.state != AgentState.FINISHED
-            ):
-                self.current_step += 1
-                logger.info(f"Executing step {self.current_step}/{self.max_steps}")
-                step_result = await self.step()
-
-                # Check for stuck state
-                if self.is_stuck():
-                    self.handle_stuck_state()
-
-                results.append(f"Step {self.current_step}: {step_result}")
-
-            if self.current_step >= self.max_steps:
-                self.current_step = 0
-                self.state = AgentState.IDLE
-                results.append(f"Terminated: Reached max steps ({self.max_steps})")
-        await SANDBOX_CLIENT.cleanup()
+        with tracer.span(
+            "agent.run", agent=self.name, max_steps=self.max_steps
+        ) as run_span:
+            async with self.state_context(AgentState.RUNNING):
+                while (
+                    self.current_step < self.max_steps
+                    and self.state != AgentState.FINISHED
+                ):
+                    self.current_step += 1
+                    logger.info(f"Executing step {self.current_step}/{self.max_steps}")
+                    with tracer.span("agent.step", step=self.current_step):
+                        step_result = await self.step()
+                    if self.checkpoint:
+                        self.checkpoint.save_agent(self)
+
+                    # Check for stuck state
+                    if self.is_stuck():
+                        self.handle_stuck_state()
+
+                    results.append(f"Step {self.current_step}: {step_result}")
+
+                run_span.set_attribute("steps", self.current_step)
+                if self.current_step >= self.max_steps:
+                    self.current_step = 0
+                    self.state = AgentState.IDLE
+                    results.append(f"Terminated: Reached max steps ({self.max_steps})")
+        if self.cleanup_after_run:
+            await SANDBOX_CLIENT.cleanup()
         return "\n".join(results) if results else "No steps executed"
 
+    def reset(self) -> None:
+        """Drop memory and progress so the agent can serve an unrelated request"""
+        self.memory = Memory(max_messages=self.memory.max_messages)
+        self.current_step = 0
+        self.state = AgentState.IDLE
+
+    def restore_checkpoint(self, after: int = 0) -> bool:
+        """Restore memory, step counter and tool state from `checkpoint`.
+
+        Calling `run()` without a request afterwards continues the interrupted run.
+
+        Args:
+            after: Only restore if the agent was checkpointed after this record.
+
+        Returns:
+            bool: Whether a checkpoint for this agent was found.
+        """
+        if not self.checkpoint:
+            return False
+        return self.checkpoint.restore_agent(self, after)
+
     @abstractmethod
     async def step(self) -> str:
         """Execute a single step in the agent's workflow.
@@ -164,6 +215,8 @@ class BaseAgent(BaseModel, ABC):
         """Handle stuck state by adding a prompt to change strategy"""
         stuck_prompt = "\
         Observed duplicate responses. Consider new strategies and avoid repeating ineffective paths already attempted."
+        if self.next_step_prompt and stuck_prompt in self.next_step_prompt:
+            return
         self.next_step_prompt = f"{stuck_prompt}\n{self.next_step_prompt}"
         logger.warning(f"Agent detected stuck state. Added prompt: {stuck_prompt}")
 
@@ -176,12 +229,12 @@ class BaseAgent(BaseModel, ABC):
         if not last_message.content:
             return False
 
-        # Count identical content occurrences
-        duplicate_count = sum(
-            1
-            for msg in reversed(self.memory.messages[:-1])
-            if msg.role == "assistant" and msg.content == last_message.content
+        # Count identical earlier assistant responses from the memory index
+        duplicate_count = self.memory.messages.assistant_content_count(
+            last_message.content
         )
+        if last_message.role == "assistant":
+            duplicate_count -= 1
 
         return duplicate_count >= self.duplicate_threshold
 
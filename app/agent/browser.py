@@ -1,13 +1,16 @@
+import asyncio
 import json
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
 
 from pydantic import Field, model_validator
 
 from app.agent.toolcall import ToolCallAgent
 from app.logger import logger
 from app.prompt.browser import NEXT_STEP_PROMPT, SYSTEM_PROMPT
-from app.schema import Message, ToolChoice
+from app.schema import Message, ToolCall, ToolChoice
 from app.tool import BrowserUseTool, Terminate, ToolCollection
+from app.tool.base import ToolResult
+from app.tracing import tracer
 
 
 # Avoid circular import if BrowserAgent needs BrowserContextHelper
@@ -19,14 +22,52 @@ class BrowserContextHelper:
     def __init__(self, agent: "BaseAgent"):
         self.agent = agent
         self._current_base64_image: Optional[str] = None
+        # Browser state captured in the background after the last browser action
+        self._prefetch_task: Optional[asyncio.Task] = None
 
-    async def get_browser_state(self) -> Optional[dict]:
+    async def _capture_state(self) -> Optional[ToolResult]:
         browser_tool = self.agent.available_tools.get_tool(BrowserUseTool().name)
         if not browser_tool or not hasattr(browser_tool, "get_current_state"):
             logger.warning("BrowserUseTool not found or doesn't have get_current_state")
             return None
+        with tracer.span("browser.capture_state"):
+            return await browser_tool.get_current_state()
+
+    def start_prefetch(self) -> None:
+        """Start capturing the next browser state without blocking the caller"""
+        self.cancel_prefetch()
+        self._prefetch_task = asyncio.create_task(self._capture_state())
+
+    def cancel_prefetch(self) -> None:
+        """Drop a pending prefetch, e.g. because the page is about to change"""
+        if self._prefetch_task and not self._prefetch_task.done():
+            self._prefetch_task.cancel()
+        self._prefetch_task = None
+
+    async def execute_tool(
+        self,
+        command: ToolCall,
+        execute: Callable[[ToolCall], Awaitable[str]],
+    ) -> str:
+        """Run a tool call, prefetching the browser state after browser actions"""
+        if command.function.name != BrowserUseTool().name:
+            return await execute(command)
+        self.cancel_prefetch()
+        try:
+            return await execute(command)
+        finally:
+            self.start_prefetch()
+
+    async def get_browser_state(self) -> Optional[dict]:
+        task, self._prefetch_task = self._prefetch_task, None
         try:
-            result = await browser_tool.get_current_state()
+            if task:
+                # Usually already finished while the tool result was being recorded
+                result = await task
+            else:
+                result = await self._capture_state()
+            if result is None:
+                return None
             if result.error:
                 logger.debug(f"Browser state error: {result.error}")
                 return None
@@ -35,6 +76,11 @@ class BrowserContextHelper:
             else:
                 self._current_base64_image = None
             return json.loads(result.output)
+        except asyncio.CancelledError:
+            # A prefetch cancelled by a newer browser action: capture afresh
+            if task and task.cancelled() and not asyncio.current_task().cancelling():
+                return await self.get_browser_state()
+            raise
         except Exception as e:
             logger.debug(f"Failed to get browser state: {str(e)}")
             return None
@@ -74,6 +120,7 @@ class BrowserContextHelper:
         )
 
     async def cleanup_browser(self):
+        self.cancel_prefetch()
         browser_tool = self.agent.available_tools.get_tool(BrowserUseTool().name)
         if browser_tool and hasattr(browser_tool, "cleanup"):
             await browser_tool.cleanup()
@@ -119,6 +166,12 @@ class BrowserAgent(ToolCallAgent):
         )
         return await super().think()
 
+    async def execute_tool(self, command: ToolCall) -> str:
+        """Execute a tool call, prefetching the browser state after browser actions"""
+        return await self.browser_context_helper.execute_tool(
+            command, super().execute_tool
+        )
+
     async def cleanup(self):
         """Clean up browser agent resources by calling parent cleanup."""
         await self.browser_context_helper.cleanup_browser()
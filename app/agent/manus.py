@@ -1,10 +1,14 @@
-from typing import Dict, List, Optional
+import asyncio
+from typing import ClassVar, Dict, List, Optional
 
 from app.agent.browser import BrowserContextHelper
 from app.agent.toolcall import ToolCallAgent
 from app.config import config
 from app.logger import logger
 from app.prompt.manus import NEXT_STEP_PROMPT, SYSTEM_PROMPT
+from app.replay import RecordReplayTransport
+from app.schema import Message, ToolCall
+from app.singleflight import SingleFlight
 from app.tool import Terminate, ToolCollection
 from app.tool.ask_human import AskHuman
 from app.tool.browser_use_tool import BrowserUseTool
@@ -42,6 +46,8 @@ class Manus(ToolCallAgent):
 
     special_tool_names: list[str] = Field(default_factory=lambda: [Terminate().name])
     browser_context_helper: Optional[BrowserContextHelper] = None
+    # Capture the next browser state in the background right after browser actions
+    prefetch_browser_state: bool = True
 
     # Track connected MCP servers
     connected_servers: Dict[str, str] = Field(
@@ -136,6 +142,12 @@ class Manus(ToolCallAgent):
             await self.disconnect_mcp_server()
             self._initialized = False
 
+    def reset(self) -> None:
+        """Reset for a new request; MCP connections and the browser stay open."""
+        super().reset()
+        if self.browser_context_helper:
+            self.browser_context_helper.cancel_prefetch()
+
     async def think(self) -> bool:
         """Process current state and decide next actions with appropriate context."""
         if not self._initialized:
@@ -163,6 +175,14 @@ class Manus(ToolCallAgent):
 
         return result
 
+    async def execute_tool(self, command: ToolCall) -> str:
+        """Execute a tool call, prefetching the browser state after browser actions."""
+        if not self.prefetch_browser_state:
+            return await super().execute_tool(command)
+        return await self.browser_context_helper.execute_tool(
+            command, super().execute_tool
+        )
+
     async def run_vision_analysis(self, vision_prompt: Dict) -> Dict[str, str]:
         """Performs vision analysis and returns structured results for Excel population."""
         logger.info(f"Received vision prompt: {vision_prompt}")
@@ -189,7 +209,7 @@ class Manus(ToolCallAgent):
             media_type = image_data["media_type"]
             image_base64 = image_data["data"]
 
-            message = client.messages.create(
+            params = dict(
                 model=vision_config.model,
                 max_tokens=vision_config.max_tokens,
                 messages=[
@@ -209,9 +229,29 @@ class Manus(ToolCallAgent):
                     }
                 ],
             )
+            transport = self._get_vision_transport(vision_config)
+
+            async def create_message():
+                # Run the blocking SDK call off the loop so duplicate photos overlap
+                # and share one request
+                if transport:
+                    return await transport.invoke(
+                        params,
+                        lambda: asyncio.to_thread(client.messages.create, **params),
+                    )
+                return await asyncio.to_thread(client.messages.create, **params)
+
+            if vision_config.coalesce_requests:
+                message, owner = await self._vision_flight.do(
+                    self._vision_flight.request_key(params), create_message
+                )
+            else:
+                message, owner = await create_message(), True
+            if not owner:
+                logger.info("Reused in-flight vision analysis for an identical image")
             claude_response_text = message.content[0].text
             logger.info(f"Vision analysis response: {claude_response_text}")
-            self.memory.add_message({"role": "assistant", "content": claude_response_text})
+            self.memory.add_message(Message.assistant_message(claude_response_text))
 
             # FIX: Parse Claude's response into a structured dictionary for Excel
             # This is a placeholder. You NEED to implement _parse_claude_vision_response
@@ -223,6 +263,21 @@ class Manus(ToolCallAgent):
             logger.error(f"Error during vision analysis: {str(e)}")
             return {}
 
+    _vision_transports: ClassVar[Dict[str, RecordReplayTransport]] = {}
+    _vision_flight: ClassVar[SingleFlight] = SingleFlight()
+
+    @classmethod
+    def _get_vision_transport(cls, vision_config) -> Optional[RecordReplayTransport]:
+        """Shared record/replay transport for vision calls, if configured."""
+        if not vision_config.replay_mode:
+            return None
+        key = f"{vision_config.replay_mode}:{vision_config.replay_path}"
+        if key not in cls._vision_transports:
+            cls._vision_transports[key] = RecordReplayTransport.from_settings(
+                vision_config
+            )
+        return cls._vision_transports[key]
+
     def _parse_claude_vision_response(self, response_text: str) -> Dict[str, str]:
         """
         Parses the raw text response from Claude Vision into a dictionary
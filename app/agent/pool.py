@@ -0,0 +1,254 @@
+"""A pool of warm agents serving independent requests concurrently.
+
+Each agent is created once (MCP connections, browser and tools initialized) and
+then reused: requests are taken from a queue by one worker per agent, run with
+fresh memory, and the agent is reset before it picks up the next request.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.agent.base import BaseAgent
+from app.logger import logger
+from app.sandbox.client import SANDBOX_CLIENT
+
+
+AgentFactory = Callable[[], Awaitable[BaseAgent]]
+# Called with the agent that picked up a request, before it runs
+StartHook = Callable[[BaseAgent], None]
+# Called with the agent and its result before the agent is reset
+FinishHook = Callable[[BaseAgent, str], None]
+
+# Number of recent requests kept for latency percentiles
+STATS_WINDOW = 1000
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class AgentPool:
+    """Fixed-size pool of agents fed from an asyncio queue.
+
+    Usage:
+        async with AgentPool(Manus.create, size=4) as pool:
+            results = await asyncio.gather(*(pool.run(p) for p in prompts))
+
+    Attributes:
+        size: Number of agents, i.e. requests processed concurrently.
+        completed: Requests that returned a result.
+        failed: Requests whose agent raised.
+        recycled: Agents replaced after failing to reset.
+    """
+
+    def __init__(self, factory: AgentFactory, size: int = 4, max_queue_size: int = 0):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.factory = factory
+        self.size = size
+        self._queue: asyncio.Queue[
+            Optional[
+                Tuple[
+                    str,
+                    asyncio.Future,
+                    float,
+                    Optional[StartHook],
+                    Optional[FinishHook],
+                ]
+            ]
+        ] = asyncio.Queue(max_queue_size)
+        self._agents: List[BaseAgent] = []
+        self._workers: List[asyncio.Task] = []
+        self._busy = 0
+        self._started_at: Optional[float] = None
+        self._queue_waits: Deque[float] = deque(maxlen=STATS_WINDOW)
+        self._run_times: Deque[float] = deque(maxlen=STATS_WINDOW)
+        self.completed = 0
+        self.failed = 0
+        self.recycled = 0
+
+    async def start(self) -> None:
+        """Create the agents and start one worker per agent"""
+        if self._workers:
+            return
+        self._agents = list(
+            await asyncio.gather(*(self._create_agent() for _ in range(self.size)))
+        )
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"agent-pool-worker-{i}")
+            for i in range(self.size)
+        ]
+        self._started_at = time.monotonic()
+        logger.info(f"Agent pool started with {self.size} agents")
+
+    async def _create_agent(self) -> BaseAgent:
+        agent = await self.factory()
+        agent.cleanup_after_run = False
+        # Pooled agents start each request afresh, so there is nothing to resume
+        agent.checkpoint = None
+        return agent
+
+    async def submit(
+        self,
+        request: str,
+        on_finish: Optional[FinishHook] = None,
+        on_start: Optional[StartHook] = None,
+    ) -> asyncio.Future:
+        """Queue a request and return a future for its result.
+
+        Args:
+            request: Prompt for the agent.
+            on_finish: Called with the agent and its result before the agent is
+                reset, e.g. to read from its memory.
+            on_start: Called with the agent before it runs the request, e.g. to
+                adjust its limits.
+        """
+        if not self._workers:
+            raise RuntimeError("Agent pool is not started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((request, future, time.monotonic(), on_start, on_finish))
+        return future
+
+    async def run(
+        self,
+        request: str,
+        on_finish: Optional[FinishHook] = None,
+        on_start: Optional[StartHook] = None,
+    ) -> str:
+        """Queue a request and wait for its result"""
+        return await (await self.submit(request, on_finish, on_start))
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job is None:
+                    return
+                request, future, enqueued_at, on_start, on_finish = job
+                if future.cancelled():
+                    continue
+                await self._serve(
+                    index, request, future, enqueued_at, on_start, on_finish
+                )
+            finally:
+                self._queue.task_done()
+
+    async def _serve(
+        self,
+        index: int,
+        request: str,
+        future: asyncio.Future,
+        enqueued_at: float,
+        on_start: Optional[StartHook] = None,
+        on_finish: Optional[FinishHook] = None,
+    ) -> None:
+        agent = self._agents[index]
+        started_at = time.monotonic()
+        self._queue_waits.append(started_at - enqueued_at)
+        self._busy += 1
+        try:
+            if on_start:
+                on_start(agent)
+            result = await agent.run(request)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.failed += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self.completed += 1
+            if on_finish:
+                try:
+                    on_finish(agent, result)
+                except Exception as e:
+                    logger.warning(f"Error in finish hook of '{agent.name}': {e}")
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._busy -= 1
+            self._run_times.append(time.monotonic() - started_at)
+            await self._recycle(index)
+
+    async def _recycle(self, index: int) -> None:
+        """Reset the agent for the next request, replacing it if that fails"""
+        agent = self._agents[index]
+        try:
+            agent.reset()
+            return
+        except Exception as e:
+            logger.warning(f"Replacing pooled agent '{agent.name}' after reset: {e}")
+        self.recycled += 1
+        await self._cleanup_agent(agent)
+        self._agents[index] = await self._create_agent()
+
+    @staticmethod
+    async def _cleanup_agent(agent: BaseAgent) -> None:
+        cleanup = getattr(agent, "cleanup", None)
+        if cleanup is None:
+            return
+        try:
+            await cleanup()
+        except Exception as e:
+            logger.warning(f"Error cleaning up pooled agent '{agent.name}': {e}")
+
+    def stats(self) -> Dict[str, float]:
+        """Queue latency, run time and throughput over recent requests"""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        waits, runs = list(self._queue_waits), list(self._run_times)
+        return {
+            "size": self.size,
+            "busy": self._busy,
+            "queued": self._queue.qsize(),
+            "completed": self.completed,
+            "failed": self.failed,
+            "recycled": self.recycled,
+            "queue_wait_mean_s": sum(waits) / len(waits) if waits else 0.0,
+            "queue_wait_p95_s": _percentile(waits, 0.95),
+            "run_time_mean_s": sum(runs) / len(runs) if runs else 0.0,
+            "run_time_p95_s": _percentile(runs, 0.95),
+            "throughput_per_min": (
+                60 * (self.completed + self.failed) / elapsed if elapsed else 0.0
+            ),
+        }
+
+    async def close(self, wait: bool = True) -> None:
+        """Stop the workers and clean up the agents.
+
+        Args:
+            wait: Finish queued requests first; otherwise cancel them.
+        """
+        if not self._workers:
+            return
+        if wait:
+            for _ in self._workers:
+                await self._queue.put(None)
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        else:
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            while not self._queue.empty():
+                job = self._queue.get_nowait()
+                if job is not None and not job[1].done():
+                    job[1].cancel()
+        self._workers = []
+
+        for agent in self._agents:
+            await self._cleanup_agent(agent)
+        self._agents = []
+        await SANDBOX_CLIENT.cleanup()
+        logger.info(f"Agent pool closed: {self.stats()}")
+
+    async def __aenter__(self) -> "AgentPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close(wait=exc_type is None)
@@ -1,12 +1,15 @@
 import asyncio
 import json
-from typing import Any, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from app.agent.react import ReActAgent
+from app.context_budget import ContextBudgeter
 from app.exceptions import TokenLimitExceeded
 from app.logger import logger
+from app.loop_guard import LoopAction, LoopGuard
+from app.observation import ObservationCompressor
 from app.prompt.toolcall import NEXT_STEP_PROMPT, SYSTEM_PROMPT
 from app.schema import TOOL_CHOICE_TYPE, AgentState, Message, ToolCall, ToolChoice
 from app.tool import CreateChatCompletion, Terminate, ToolCollection
@@ -31,10 +34,36 @@ class ToolCallAgent(ReActAgent):
     special_tool_names: List[str] = Field(default_factory=lambda: [Terminate().name])
 
     tool_calls: List[ToolCall] = Field(default_factory=list)
-    _current_base64_image: Optional[str] = None
+    # Images returned by tool calls, keyed by tool call id
+    _tool_images: Dict[str, str] = PrivateAttr(default_factory=dict)
 
     max_steps: int = 30
     max_observe: Optional[Union[int, bool]] = None
+    # Reduce large observations by content type and spill the full text to a file,
+    # instead of slicing them at `max_observe`
+    compress_observations: bool = True
+    observation_compressor: Optional[ObservationCompressor] = None
+
+    # Run consecutive concurrency-safe tool calls of one turn in parallel
+    parallel_tool_calls: bool = True
+    max_parallel_tools: int = 4
+
+    # Compact the history sent to the LLM so each request fits the context window
+    compact_context: bool = True
+    context_budgeter: Optional[ContextBudgeter] = None
+
+    # Escalate on repeated tool calls/observations: hint, withhold tools, stop early
+    loop_guard: Optional[LoopGuard] = Field(default_factory=LoopGuard)
+
+    def get_request_messages(
+        self, system_msgs: Optional[List[Message]], tools: List[dict]
+    ) -> List[Message]:
+        """Messages to send with the next LLM request, compacted if enabled"""
+        if not self.compact_context:
+            return self.messages
+        if self.context_budgeter is None:
+            self.context_budgeter = ContextBudgeter(self.llm)
+        return self.context_budgeter.compact(self.messages, system_msgs, tools)
 
     async def think(self) -> bool:
         """Process current state and decide next actions using tools"""
@@ -42,16 +71,24 @@ class ToolCallAgent(ReActAgent):
             user_msg = Message.user_message(self.next_step_prompt)
             self.messages += [user_msg]
 
+        system_msgs = (
+            [Message.system_message(self.system_prompt)] if self.system_prompt else None
+        )
+        tools = self.available_tools.to_params()
+        if self.loop_guard and self.loop_guard.blocked_tools:
+            tools = [
+                tool
+                for tool in tools
+                if tool["function"]["name"] not in self.loop_guard.blocked_tools
+                or self._is_special_tool(tool["function"]["name"])
+            ]
+
         try:
             # Get response with tool options
             response = await self.llm.ask_tool(
-                messages=self.messages,
-                system_msgs=(
-                    [Message.system_message(self.system_prompt)]
-                    if self.system_prompt
-                    else None
-                ),
-                tools=self.available_tools.to_params(),
+                messages=self.get_request_messages(system_msgs, tools),
+                system_msgs=system_msgs,
+                tools=tools,
                 tool_choice=self.tool_choices,
             )
         except ValueError:
@@ -135,33 +172,137 @@ class ToolCallAgent(ReActAgent):
                 raise ValueError(TOOL_CALL_REQUIRED)
 
             # Return last message content if no tool calls
-            return self.messages[-1].content or "No content or commands to execute"
+            content = self.messages[-1].content
+            if self.loop_guard:
+                self.loop_guard.record_step([], [], content)
+            return content or "No content or commands to execute"
 
         results = []
-        for command in self.tool_calls:
-            # Reset base64_image for each tool call
-            self._current_base64_image = None
+        for batch in self._batch_tool_calls(self.tool_calls):
+            if len(batch) == 1:
+                outcomes = [await self._run_tool_call(batch[0])]
+            else:
+                logger.info(
+                    f"⚡ Running {len(batch)} tools concurrently: "
+                    f"{[call.function.name for call in batch]}"
+                )
+                semaphore = asyncio.Semaphore(self.max_parallel_tools)
 
-            result = await self.execute_tool(command)
+                async def run_limited(command: ToolCall) -> Tuple[str, Optional[str]]:
+                    async with semaphore:
+                        return await self._run_tool_call(command)
 
-            if self.max_observe:
-                result = result[: self.max_observe]
+                outcomes = await asyncio.gather(*[run_limited(c) for c in batch])
 
-            logger.info(
-                f"🎯 Tool '{command.function.name}' completed its mission! Result: {result}"
+            # Add tool responses to memory in the original call order
+            for command, (result, base64_image) in zip(batch, outcomes):
+                if self.max_observe:
+                    result = self._limit_observation(result, command.function.name)
+
+                logger.info(
+                    f"🎯 Tool '{command.function.name}' completed its mission! Result: {result}"
+                )
+
+                tool_msg = Message.tool_message(
+                    content=result,
+                    tool_call_id=command.id,
+                    name=command.function.name,
+                    base64_image=base64_image,
+                )
+                self.memory.add_message(tool_msg)
+                results.append(result)
+
+        if self.loop_guard:
+            self.loop_guard.record_step(self.tool_calls, results)
+        return "\n\n".join(results)
+
+    def _limit_observation(self, result: str, tool_name: str) -> str:
+        """Fit a tool result into `max_observe` characters"""
+        if not self.compress_observations:
+            return result[: self.max_observe]
+        if self.observation_compressor is None:
+            self.observation_compressor = ObservationCompressor(
+                max_chars=int(self.max_observe)
+            )
+        return self.observation_compressor.compress(result, tool_name)
+
+    def is_stuck(self) -> bool:
+        """Stuck if the loop guard flagged the last step or content repeats"""
+        if self.loop_guard and self.loop_guard.last_action != LoopAction.NONE:
+            return True
+        return super().is_stuck()
+
+    def handle_stuck_state(self):
+        """Escalate according to the loop guard: hint, withhold tools, stop"""
+        action = self.loop_guard.last_action if self.loop_guard else LoopAction.NONE
+        if action == LoopAction.TERMINATE:
+            logger.warning(
+                f"🔁 {self.name} repeated itself for {self.loop_guard.strikes} steps, stopping early"
             )
+            self.memory.add_message(
+                Message.assistant_message(
+                    f"Stopped early after {self.loop_guard.strikes} steps without "
+                    f"progress. Partial result:\n{self._partial_result()}"
+                )
+            )
+            self.state = AgentState.FINISHED
+            return
 
-            # Add tool response to memory
-            tool_msg = Message.tool_message(
-                content=result,
-                tool_call_id=command.id,
-                name=command.function.name,
-                base64_image=self._current_base64_image,
+        if action == LoopAction.RESTRICT_TOOLS:
+            blocked = ", ".join(sorted(self.loop_guard.blocked_tools))
+            logger.warning(f"🔁 Withholding repeated tools from next step: {blocked}")
+            self.memory.add_message(
+                Message.user_message(
+                    f"Repeating {blocked} returned nothing new, so it is unavailable "
+                    "for the next step. Use a different approach, or finish with "
+                    "what you have."
+                )
             )
-            self.memory.add_message(tool_msg)
-            results.append(result)
+        super().handle_stuck_state()
+
+    def _partial_result(self) -> str:
+        """Latest assistant text, or the latest tool output if there is none"""
+        for message in reversed(self.memory.messages):
+            if message.role == "assistant" and message.content:
+                return message.content
+        for message in reversed(self.memory.messages):
+            if message.role == "tool" and message.content:
+                return message.content[:2000]
+        return "No result produced."
+
+    def _batch_tool_calls(self, tool_calls: List[ToolCall]) -> List[List[ToolCall]]:
+        """Group consecutive concurrency-safe calls; every other call runs alone"""
+        batches: List[List[ToolCall]] = []
+        run: List[ToolCall] = []
+        for command in tool_calls:
+            if self.parallel_tool_calls and self._is_concurrency_safe(command):
+                run.append(command)
+                continue
+            if run:
+                batches.append(run)
+                run = []
+            batches.append([command])
+        if run:
+            batches.append(run)
+        return batches
+
+    def _is_concurrency_safe(self, command: ToolCall) -> bool:
+        name = command.function.name
+        if self._is_special_tool(name):
+            return False
+        try:
+            args = json.loads(command.function.arguments or "{}")
+        except json.JSONDecodeError:
+            return False
+        # Valid JSON that is not an object runs alone and fails in execute_tool
+        if not isinstance(args, dict):
+            return False
+        return self.available_tools.is_concurrency_safe(name=name, tool_input=args)
 
-        return "\n\n".join(results)
+    async def _run_tool_call(self, command: ToolCall) -> Tuple[str, Optional[str]]:
+        """Execute a tool call and return its observation and image, if any"""
+        result = await self.execute_tool(command)
+        return result, self._tool_images.pop(command.id, None)
 
     async def execute_tool(self, command: ToolCall) -> str:
         """Execute a single tool call with robust error handling"""
@@ -186,7 +327,7 @@ class ToolCallAgent(ReActAgent):
             # Check if result is a ToolResult with base64_image
             if hasattr(result, "base64_image") and result.base64_image:
                 # Store the base64_image for later use in tool_message
-                self._current_base64_image = result.base64_image
+                self._tool_images[command.id] = result.base64_image
 
             # Format result for display (standard case)
             observation = (
@@ -242,9 +383,24 @@ class ToolCallAgent(ReActAgent):
                     )
         logger.info(f"✨ Cleanup complete for agent '{self.name}'.")
 
+    def reset(self) -> None:
+        """Drop memory and per-request tool state, keeping tools initialized"""
+        super().reset()
+        self.tool_calls = []
+        self._tool_images.clear()
+        self.context_budgeter = None
+        if self.loop_guard:
+            self.loop_guard.reset()
+        for tool in self.available_tools:
+            if tool.dump_state() is not None:
+                tool.load_state({})
+
     async def run(self, request: Optional[str] = None) -> str:
         """Run the agent with cleanup when done."""
         try:
             return await super().run(request)
         finally:
-            await self.cleanup()
+            if self.available_tools.cache.lookups:
+                logger.info(f"🗃️ Tool cache: {self.available_tools.cache.summary()}")
+            if self.cleanup_after_run:
+                await self.cleanup()
@@ -1,16 +1,25 @@
+import asyncio
 import json
 import sys
+import threading
 import time
 import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Literal, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Literal, Optional
 
 import boto3
+from botocore.config import Config as BotoConfig
 
 
-# Global variables to track the current tool use ID across function calls
-# Tmp solution
-CURRENT_TOOLUSE_ID = None
+# Default size of the thread pool running blocking boto3 calls
+DEFAULT_MAX_WORKERS = 8
+# Maximum Bedrock calls queued or in flight per event loop
+DEFAULT_MAX_PENDING = 32
+
+# Sentinel marking the end of a converse_stream event stream
+_STREAM_END = object()
 
 
 # Class to handle OpenAI-style response formatting
@@ -34,13 +43,95 @@ class OpenAIResponse:
         return data
 
 
+class BedrockExecutor:
+    """Runs blocking boto3 calls on a dedicated thread pool.
+
+    The pool is shared by every BedrockClient so concurrent agents reuse the same
+    threads and HTTP connections. A per-event-loop semaphore bounds how many calls
+    can be queued or in flight, so a burst of requests cannot grow the queue
+    without limit.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        self.max_pending = max_pending
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bedrock"
+        )
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_pending)
+        return self._semaphores[loop]
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run `fn` on the pool without blocking the event loop"""
+        async with self._semaphore():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._pool, lambda: fn(*args, **kwargs))
+
+    async def stream(self, fn: Callable[[], Any]) -> AsyncIterator[Any]:
+        """Iterate a blocking event stream on the pool, yielding events as they arrive"""
+        async with self._semaphore():
+            loop = asyncio.get_running_loop()
+            queue: asyncio.Queue = asyncio.Queue()
+
+            def pump():
+                try:
+                    for event in fn():
+                        loop.call_soon_threadsafe(queue.put_nowait, event)
+                except Exception as e:
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+                finally:
+                    loop.call_soon_threadsafe(queue.put_nowait, _STREAM_END)
+
+            future = loop.run_in_executor(self._pool, pump)
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is _STREAM_END:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+            finally:
+                await future
+
+
 # Main client class for interacting with Amazon Bedrock
 class BedrockClient:
-    def __init__(self):
-        # Initialize Bedrock client, you need to configure AWS env first
+    _shared_client = None
+    _shared_executor: Optional[BedrockExecutor] = None
+    _lock = threading.Lock()
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_pending: int = DEFAULT_MAX_PENDING,
+    ):
+        # Initialize Bedrock client, you need to configure AWS env first.
+        # boto3 clients are thread-safe, so one client (and its connection pool)
+        # is shared by every LLM instance.
         try:
-            self.client = boto3.client("bedrock-runtime")
-            self.chat = Chat(self.client)
+            with BedrockClient._lock:
+                if BedrockClient._shared_client is None:
+                    BedrockClient._shared_client = boto3.client(
+                        "bedrock-runtime",
+                        config=BotoConfig(max_pool_connections=max_workers),
+                    )
+                    BedrockClient._shared_executor = BedrockExecutor(
+                        max_workers, max_pending
+                    )
+            self.client = BedrockClient._shared_client
+            self.executor = BedrockClient._shared_executor
+            self.chat = Chat(self.client, self.executor)
         except Exception as e:
             print(f"Error initializing Bedrock client: {e}")
             sys.exit(1)
@@ -48,14 +139,15 @@ class BedrockClient:
 
 # Chat interface class
 class Chat:
-    def __init__(self, client):
-        self.completions = ChatCompletions(client)
+    def __init__(self, client, executor: Optional[BedrockExecutor] = None):
+        self.completions = ChatCompletions(client, executor)
 
 
 # Core class handling chat completions functionality
 class ChatCompletions:
-    def __init__(self, client):
+    def __init__(self, client, executor: Optional[BedrockExecutor] = None):
         self.client = client
+        self.executor = executor or BedrockExecutor()
 
     def _convert_openai_tools_to_bedrock_format(self, tools):
         # Convert OpenAI function calling format to Bedrock tool format
@@ -81,15 +173,28 @@ class ChatCompletions:
                     }
                 }
                 bedrock_tools.append(bedrock_tool)
+                if tool.get("cache_control"):
+                    # Everything up to this tool is a stable, cacheable prefix
+                    bedrock_tools.append({"cachePoint": {"type": "default"}})
         return bedrock_tools
 
     def _convert_openai_messages_to_bedrock_format(self, messages):
-        # Convert OpenAI message format to Bedrock message format
+        # Convert OpenAI message format to Bedrock message format.
+        # Tool use ids are resolved per request, so concurrent calls never share state.
         bedrock_messages = []
         system_prompt = []
+        last_tool_use_id = None
         for message in messages:
             if message.get("role") == "system":
-                system_prompt = [{"text": message.get("content")}]
+                content = message.get("content")
+                # Every system message is kept, in order
+                if isinstance(content, list):
+                    for item in content:
+                        system_prompt.append({"text": item.get("text", "")})
+                        if item.get("cache_control"):
+                            system_prompt.append({"cachePoint": {"type": "default"}})
+                else:
+                    system_prompt.append({"text": content})
             elif message.get("role") == "user":
                 bedrock_message = {
                     "role": message.get("role", "user"),
@@ -97,36 +202,37 @@ class ChatCompletions:
                 }
                 bedrock_messages.append(bedrock_message)
             elif message.get("role") == "assistant":
-                bedrock_message = {
-                    "role": "assistant",
-                    "content": [{"text": message.get("content")}],
-                }
-                openai_tool_calls = message.get("tool_calls", [])
-                if openai_tool_calls:
+                bedrock_message = {"role": "assistant", "content": []}
+                if message.get("content"):
+                    bedrock_message["content"].append({"text": message["content"]})
+                for tool_call in message.get("tool_calls") or []:
                     bedrock_tool_use = {
-                        "toolUseId": openai_tool_calls[0]["id"],
-                        "name": openai_tool_calls[0]["function"]["name"],
-                        "input": json.loads(
-                            openai_tool_calls[0]["function"]["arguments"]
-                        ),
+                        "toolUseId": tool_call["id"],
+                        "name": tool_call["function"]["name"],
+                        "input": json.loads(tool_call["function"]["arguments"] or "{}"),
                     }
                     bedrock_message["content"].append({"toolUse": bedrock_tool_use})
-                    global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = openai_tool_calls[0]["id"]
+                    last_tool_use_id = tool_call["id"]
+                if not bedrock_message["content"]:
+                    bedrock_message["content"].append({"text": "."})
                 bedrock_messages.append(bedrock_message)
             elif message.get("role") == "tool":
-                bedrock_message = {
-                    "role": "user",
-                    "content": [
-                        {
-                            "toolResult": {
-                                "toolUseId": CURRENT_TOOLUSE_ID,
-                                "content": [{"text": message.get("content")}],
-                            }
-                        }
-                    ],
+                tool_result = {
+                    "toolResult": {
+                        "toolUseId": message.get("tool_call_id") or last_tool_use_id,
+                        "content": [{"text": message.get("content")}],
+                    }
                 }
-                bedrock_messages.append(bedrock_message)
+                # Results of parallel tool calls belong in a single user turn
+                previous = bedrock_messages[-1] if bedrock_messages else None
+                if (
+                    previous
+                    and previous["role"] == "user"
+                    and all("toolResult" in item for item in previous["content"])
+                ):
+                    previous["content"].append(tool_result)
+                else:
+                    bedrock_messages.append({"role": "user", "content": [tool_result]})
             else:
                 raise ValueError(f"Invalid role: {message.get('role')}")
         return system_prompt, bedrock_messages
@@ -146,10 +252,8 @@ class ChatCompletions:
             for content_item in bedrock_response["output"]["message"]["content"]:
                 if content_item.get("toolUse"):
                     bedrock_tool_use = content_item["toolUse"]
-                    global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = bedrock_tool_use["toolUseId"]
                     openai_tool_call = {
-                        "id": CURRENT_TOOLUSE_ID,
+                        "id": bedrock_tool_use["toolUseId"],
                         "type": "function",
                         "function": {
                             "name": bedrock_tool_use["name"],
@@ -188,10 +292,34 @@ class ChatCompletions:
                     "inputTokens", 0
                 ),
                 "total_tokens": bedrock_response.get("usage", {}).get("totalTokens", 0),
+                "prompt_tokens_details": {
+                    "cached_tokens": bedrock_response.get("usage", {}).get(
+                        "cacheReadInputTokens", 0
+                    ),
+                },
             },
         }
         return OpenAIResponse(openai_format)
 
+    @staticmethod
+    def _build_request(
+        model: str,
+        system_prompt: List[dict],
+        bedrock_messages: List[dict],
+        max_tokens: int,
+        temperature: float,
+        tools: Optional[List[dict]],
+    ) -> Dict[str, Any]:
+        request = {
+            "modelId": model,
+            "system": system_prompt,
+            "messages": bedrock_messages,
+            "inferenceConfig": {"temperature": temperature, "maxTokens": max_tokens},
+        }
+        if tools:
+            request["toolConfig"] = {"tools": tools}
+        return request
+
     async def _invoke_bedrock(
         self,
         model: str,
@@ -202,21 +330,38 @@ class ChatCompletions:
         tool_choice: Literal["none", "auto", "required"] = "auto",
         **kwargs,
     ) -> OpenAIResponse:
-        # Non-streaming invocation of Bedrock model
+        # Non-streaming invocation of Bedrock model, off the event loop
         (
             system_prompt,
             bedrock_messages,
         ) = self._convert_openai_messages_to_bedrock_format(messages)
-        response = self.client.converse(
-            modelId=model,
-            system=system_prompt,
-            messages=bedrock_messages,
-            inferenceConfig={"temperature": temperature, "maxTokens": max_tokens},
-            toolConfig={"tools": tools} if tools else None,
+        request = self._build_request(
+            model, system_prompt, bedrock_messages, max_tokens, temperature, tools
         )
+        response = await self.executor.run(self.client.converse, **request)
         openai_response = self._convert_bedrock_response_to_openai_format(response)
         return openai_response
 
+    @staticmethod
+    def _make_chunk(
+        chunk_id: str, delta: dict, finish_reason: Optional[str] = None, **extra
+    ) -> OpenAIResponse:
+        return OpenAIResponse(
+            {
+                "id": chunk_id,
+                "created": int(time.time()),
+                "object": "chat.completion.chunk",
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": None, **delta},
+                        "finish_reason": finish_reason,
+                    }
+                ],
+                **extra,
+            }
+        )
+
     async def _invoke_bedrock_stream(
         self,
         model: str,
@@ -226,78 +371,89 @@ class ChatCompletions:
         tools: Optional[List[dict]] = None,
         tool_choice: Literal["none", "auto", "required"] = "auto",
         **kwargs,
-    ) -> OpenAIResponse:
-        # Streaming invocation of Bedrock model
+    ) -> AsyncIterator[OpenAIResponse]:
+        # Streaming invocation of Bedrock model via converse_stream.
+        # Events are read on the pool and yielded as OpenAI-style chunks.
         (
             system_prompt,
             bedrock_messages,
         ) = self._convert_openai_messages_to_bedrock_format(messages)
-        response = self.client.converse_stream(
-            modelId=model,
-            system=system_prompt,
-            messages=bedrock_messages,
-            inferenceConfig={"temperature": temperature, "maxTokens": max_tokens},
-            toolConfig={"tools": tools} if tools else None,
+        request = self._build_request(
+            model, system_prompt, bedrock_messages, max_tokens, temperature, tools
         )
+        response = await self.executor.run(self.client.converse_stream, **request)
+        stream = response.get("stream") or []
 
-        # Initialize response structure
-        bedrock_response = {
-            "output": {"message": {"role": "", "content": []}},
-            "stopReason": "",
-            "usage": {},
-            "metrics": {},
-        }
-        bedrock_response_text = ""
-        bedrock_response_tool_input = ""
-
-        # Process streaming response
-        stream = response.get("stream")
-        if stream:
-            for event in stream:
-                if event.get("messageStart", {}).get("role"):
-                    bedrock_response["output"]["message"]["role"] = event[
-                        "messageStart"
-                    ]["role"]
-                if event.get("contentBlockDelta", {}).get("delta", {}).get("text"):
-                    bedrock_response_text += event["contentBlockDelta"]["delta"]["text"]
-                    print(
-                        event["contentBlockDelta"]["delta"]["text"], end="", flush=True
-                    )
-                if event.get("contentBlockStop", {}).get("contentBlockIndex") == 0:
-                    bedrock_response["output"]["message"]["content"].append(
-                        {"text": bedrock_response_text}
-                    )
-                if event.get("contentBlockStart", {}).get("start", {}).get("toolUse"):
-                    bedrock_tool_use = event["contentBlockStart"]["start"]["toolUse"]
-                    tool_use = {
-                        "toolUseId": bedrock_tool_use["toolUseId"],
-                        "name": bedrock_tool_use["name"],
-                    }
-                    bedrock_response["output"]["message"]["content"].append(
-                        {"toolUse": tool_use}
+        chunk_id = f"chatcmpl-{uuid.uuid4()}"
+        # Tool calls are indexed by content block, per request
+        tool_indexes: Dict[int, int] = {}
+        async for event in self.executor.stream(lambda: iter(stream)):
+            if event.get("messageStart", {}).get("role"):
+                yield self._make_chunk(
+                    chunk_id, {"role": event["messageStart"]["role"], "content": ""}
+                )
+            elif "contentBlockStart" in event:
+                block = event["contentBlockStart"]
+                tool_use = block.get("start", {}).get("toolUse")
+                if tool_use:
+                    index = len(tool_indexes)
+                    tool_indexes[block.get("contentBlockIndex", 0)] = index
+                    yield self._make_chunk(
+                        chunk_id,
+                        {
+                            "tool_calls": [
+                                {
+                                    "index": index,
+                                    "id": tool_use["toolUseId"],
+                                    "type": "function",
+                                    "function": {
+                                        "name": tool_use["name"],
+                                        "arguments": "",
+                                    },
+                                }
+                            ]
+                        },
                     )
-                    global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = bedrock_tool_use["toolUseId"]
-                if event.get("contentBlockDelta", {}).get("delta", {}).get("toolUse"):
-                    bedrock_response_tool_input += event["contentBlockDelta"]["delta"][
-                        "toolUse"
-                    ]["input"]
-                    print(
-                        event["contentBlockDelta"]["delta"]["toolUse"]["input"],
-                        end="",
-                        flush=True,
+            elif "contentBlockDelta" in event:
+                block = event["contentBlockDelta"]
+                delta = block.get("delta", {})
+                if delta.get("text"):
+                    yield self._make_chunk(chunk_id, {"content": delta["text"]})
+                elif delta.get("toolUse"):
+                    index = tool_indexes.get(block.get("contentBlockIndex", 0), 0)
+                    yield self._make_chunk(
+                        chunk_id,
+                        {
+                            "tool_calls": [
+                                {
+                                    "index": index,
+                                    "function": {
+                                        "arguments": delta["toolUse"]["input"]
+                                    },
+                                }
+                            ]
+                        },
                     )
-                if event.get("contentBlockStop", {}).get("contentBlockIndex") == 1:
-                    bedrock_response["output"]["message"]["content"][1]["toolUse"][
-                        "input"
-                    ] = json.loads(bedrock_response_tool_input)
-        print()
-        openai_response = self._convert_bedrock_response_to_openai_format(
-            bedrock_response
-        )
-        return openai_response
+            elif "messageStop" in event:
+                yield self._make_chunk(
+                    chunk_id, {}, finish_reason=event["messageStop"].get("stopReason")
+                )
+            elif "metadata" in event:
+                usage = event["metadata"].get("usage", {})
+                yield self._make_chunk(
+                    chunk_id,
+                    {},
+                    usage={
+                        "prompt_tokens": usage.get("inputTokens", 0),
+                        "completion_tokens": usage.get("outputTokens", 0),
+                        "total_tokens": usage.get("totalTokens", 0),
+                        "prompt_tokens_details": {
+                            "cached_tokens": usage.get("cacheReadInputTokens", 0)
+                        },
+                    },
+                )
 
-    def create(
+    async def create(
         self,
         model: str,
         messages: List[Dict[str, str]],
@@ -307,8 +463,9 @@ class ChatCompletions:
         tools: Optional[List[dict]] = None,
         tool_choice: Literal["none", "auto", "required"] = "auto",
         **kwargs,
-    ) -> OpenAIResponse:
-        # Main entry point for chat completion
+    ):
+        # Main entry point for chat completion. Returns an OpenAI-style response,
+        # or an async iterator of chunks when streaming.
         bedrock_tools = []
         if tools is not None:
             bedrock_tools = self._convert_openai_tools_to_bedrock_format(tools)
@@ -322,13 +479,12 @@ class ChatCompletions:
                 tool_choice,
                 **kwargs,
             )
-        else:
-            return self._invoke_bedrock(
-                model,
-                messages,
-                max_tokens,
-                temperature,
-                bedrock_tools,
-                tool_choice,
-                **kwargs,
-            )
+        return await self._invoke_bedrock(
+            model,
+            messages,
+            max_tokens,
+            temperature,
+            bedrock_tools,
+            tool_choice,
+            **kwargs,
+        )
@@ -0,0 +1,183 @@
+"""Durable checkpoints for agent and flow runs.
+
+Checkpoints are appended to a JSONL file after every agent step and every flow
+step. Agent records hold only the messages added since the previous record and
+the tool state that changed, so the file grows with the run rather than with
+its square. Images referenced by messages are written once per content hash
+next to the log. A run that dies part-way can be restored from the file and
+continued without repeating the LLM calls already made.
+"""
+
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Union
+
+from app.image_store import image_store
+from app.logger import logger
+from app.schema import AgentState, Message
+
+
+if TYPE_CHECKING:
+    from app.agent.base import BaseAgent
+    from app.tool import ToolCollection
+
+
+class CheckpointStore:
+    """Append-only JSONL log of agent and flow snapshots"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.image_dir = self.path.parent / f"{self.path.stem}_images"
+        # Last message saved per agent (by checkpoint key), for message deltas
+        self._last_saved: Dict[str, Message] = {}
+        # Digest of the last saved state per agent tool, to skip unchanged state
+        self._tool_digests: Dict[str, str] = {}
+        self._seq = sum(1 for _ in self.records())
+
+    def records(self) -> Iterator[dict]:
+        if not self.path.exists():
+            return
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _append(self, record: dict) -> int:
+        self._seq += 1
+        record = {"seq": self._seq, "time": time.time(), **record}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        return self._seq
+
+    def _save_images(self, messages: List[Message]) -> None:
+        for message in messages:
+            if not message.image_ref:
+                continue
+            path = self.image_dir / f"{message.image_ref}.b64"
+            if path.exists():
+                continue
+            data = message.base64_image
+            if data:
+                self.image_dir.mkdir(parents=True, exist_ok=True)
+                path.write_text(data, encoding="ascii")
+
+    def _load_image(self, ref: str) -> None:
+        if ref in image_store:
+            return
+        path = self.image_dir / f"{ref}.b64"
+        if path.exists():
+            image_store.put(path.read_text(encoding="ascii"))
+
+    def _changed_tool_states(
+        self, agent_key: str, tools: "ToolCollection"
+    ) -> Dict[str, Any]:
+        changed = {}
+        for tool in tools:
+            state = tool.dump_state()
+            if state is None:
+                continue
+            key = f"{agent_key}:{tool.name}"
+            digest = hashlib.sha256(
+                json.dumps(state, sort_keys=True, default=str).encode("utf-8")
+            ).hexdigest()
+            if self._tool_digests.get(key) != digest:
+                self._tool_digests[key] = digest
+                changed[tool.name] = state
+        return changed
+
+    def save_agent(self, agent: "BaseAgent") -> int:
+        """Record the agent's progress since its previous checkpoint"""
+        messages = list(agent.memory.messages)
+        key = agent.checkpoint_key
+        last = self._last_saved.get(key)
+        start = next(
+            (i + 1 for i in range(len(messages) - 1, -1, -1) if messages[i] is last),
+            None,
+        )
+        full = start is None
+        new_messages = messages if full else messages[start:]
+        if messages:
+            self._last_saved[key] = messages[-1]
+
+        self._save_images(new_messages)
+        tools = getattr(agent, "available_tools", None)
+        return self._append(
+            {
+                "type": "agent",
+                "agent": key,
+                "current_step": agent.current_step,
+                "full": full,
+                "messages": [m.model_dump(exclude_none=True) for m in new_messages],
+                "tools": self._changed_tool_states(key, tools) if tools else {},
+            }
+        )
+
+    def load_agent(self, name: str, after: int = 0) -> Optional[dict]:
+        """Rebuild the latest state of the agent with checkpoint key `name`, if it
+        was saved after record `after`"""
+        state = None
+        for record in self.records():
+            if record.get("type") != "agent" or record["agent"] != name:
+                continue
+            if state is None or record["full"]:
+                state = {"messages": [], "tools": {}}
+            state["messages"].extend(record["messages"])
+            state["tools"].update(record["tools"])
+            state["current_step"] = record["current_step"]
+            state["seq"] = record["seq"]
+        if state is None or state["seq"] <= after:
+            return None
+        return state
+
+    def restore_agent(self, agent: "BaseAgent", after: int = 0) -> bool:
+        """Restore memory, step counter and tool state of `agent`.
+
+        Returns:
+            bool: Whether a checkpoint for the agent was found.
+        """
+        key = agent.checkpoint_key
+        state = self.load_agent(key, after)
+        if state is None:
+            return False
+
+        for data in state["messages"]:
+            if data.get("image_ref"):
+                self._load_image(data["image_ref"])
+        agent.memory.messages = [Message(**data) for data in state["messages"]]
+        agent.current_step = state["current_step"]
+        agent.state = AgentState.IDLE
+
+        tools = getattr(agent, "available_tools", None)
+        for name, tool_state in state["tools"].items():
+            tool = tools.get_tool(name) if tools else None
+            if tool:
+                tool.load_state(tool_state)
+        # Continue writing deltas from the restored history
+        self._tool_digests = {
+            key: digest
+            for key, digest in self._tool_digests.items()
+            if not key.startswith(f"{agent.checkpoint_key}:")
+        }
+        if agent.memory.messages:
+            self._last_saved[key] = agent.memory.messages[-1]
+
+        logger.info(
+            f"Restored agent '{agent.name}' at step {agent.current_step} "
+            f"with {len(agent.memory.messages)} messages from {self.path}"
+        )
+        return True
+
+    def save_flow(self, **state) -> int:
+        """Record flow-level state (plan, step index, partial result)"""
+        return self._append({"type": "flow", **state})
+
+    def load_flow(self) -> Optional[dict]:
+        """Latest flow record, if any"""
+        latest = None
+        for record in self.records():
+            if record.get("type") == "flow":
+                latest = record
+        return latest
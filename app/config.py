@@ -25,9 +25,39 @@ class LLMSettings(BaseModel):
         None,
         description="Maximum input tokens to use across all requests (None for unlimited)",
     )
+    context_window: Optional[int] = Field(
+        None,
+        description="Model context window in tokens (None to look up by model name)",
+    )
     temperature: float = Field(1.0, description="Sampling temperature")
     api_type: str = Field(..., description="Azure, Openai, or Ollama")
     api_version: str = Field(..., description="Azure Openai version if AzureOpenai")
+    prompt_cache: bool = Field(
+        True,
+        description="Mark the stable prompt prefix (system prompt + tools) for provider-side caching",
+    )
+    max_inline_images: Optional[int] = Field(
+        3,
+        description="Inline only the most recent N images in each request (None for all)",
+    )
+    coalesce_requests: bool = Field(
+        True,
+        description="Share one API call between identical concurrent non-streaming requests",
+    )
+    replay_mode: Optional[str] = Field(
+        None, description="Record/replay LLM traffic: 'record', 'replay' or None"
+    )
+    replay_path: Optional[str] = Field(
+        None, description="JSONL file holding recorded request/response pairs"
+    )
+    replay_latency: Optional[float] = Field(
+        None,
+        description="Simulated seconds per replayed call (None reproduces recorded latency)",
+    )
+    replay_strict: bool = Field(
+        False,
+        description="Fail on unrecorded requests instead of serving the next record in order",
+    )
 
 
 class ProxySettings(BaseModel):
@@ -99,6 +129,51 @@ class SandboxSettings(BaseModel):
     )
 
 
+class TracingSettings(BaseModel):
+    """Configuration for span tracing of agent runs"""
+
+    enabled: bool = Field(False, description="Whether to record trace spans")
+    output_dir: str = Field(
+        "logs/traces", description="Directory for exported traces (relative to root)"
+    )
+    formats: List[str] = Field(
+        default_factory=lambda: ["jsonl", "chrome"],
+        description="Export formats: 'jsonl' (OTLP-style spans) and/or 'chrome'",
+    )
+    summary: bool = Field(
+        True, description="Log a per-span summary table when a run finishes"
+    )
+
+
+class ToolCacheSettings(BaseModel):
+    """Configuration for memoizing read-only tool calls"""
+
+    enabled: bool = Field(True, description="Whether to cache opted-in tool calls")
+    max_entries: int = Field(256, description="Results kept in the in-memory LRU")
+    disk_dir: Optional[str] = Field(
+        None,
+        description="Directory persisting cacheable results across runs (relative to root)",
+    )
+
+
+class PlanTemplateSettings(BaseModel):
+    """Configuration for reusing plans of recurring requests"""
+
+    enabled: bool = Field(
+        False, description="Whether to reuse stored plans for requests of a known shape"
+    )
+    path: str = Field(
+        "logs/plan_templates.json",
+        description="File storing plan templates (relative to root)",
+    )
+    fuzzy_threshold: Optional[float] = Field(
+        0.9,
+        description="Minimum similarity (0-1) for a near-identical request shape to "
+        "match; None for exact matches only",
+    )
+    max_templates: int = Field(200, description="Templates kept, least used dropped")
+
+
 class MCPServerConfig(BaseModel):
     """Configuration for a single MCP server"""
 
@@ -158,6 +233,15 @@ class AppConfig(BaseModel):
         None, description="Search configuration"
     )
     mcp_config: Optional[MCPSettings] = Field(None, description="MCP configuration")
+    tracing: Optional[TracingSettings] = Field(
+        None, description="Tracing configuration"
+    )
+    tool_cache: Optional[ToolCacheSettings] = Field(
+        None, description="Tool result cache configuration"
+    )
+    plan_templates: Optional[PlanTemplateSettings] = Field(
+        None, description="Plan template cache configuration"
+    )
 
     class Config:
         arbitrary_types_allowed = True
@@ -212,9 +296,17 @@ class Config:
             "api_key": base_llm.get("api_key"),
             "max_tokens": base_llm.get("max_tokens", 4096),
             "max_input_tokens": base_llm.get("max_input_tokens"),
+            "context_window": base_llm.get("context_window"),
             "temperature": base_llm.get("temperature", 1.0),
             "api_type": base_llm.get("api_type", ""),
             "api_version": base_llm.get("api_version", ""),
+            "prompt_cache": base_llm.get("prompt_cache", True),
+            "coalesce_requests": base_llm.get("coalesce_requests", True),
+            "max_inline_images": base_llm.get("max_inline_images", 3),
+            "replay_mode": base_llm.get("replay_mode"),
+            "replay_path": base_llm.get("replay_path"),
+            "replay_latency": base_llm.get("replay_latency"),
+            "replay_strict": base_llm.get("replay_strict", False),
         }
 
         # handle browser config.
@@ -269,6 +361,15 @@ class Config:
         else:
             mcp_settings = MCPSettings(servers=MCPSettings.load_server_config())
 
+        tracing_config = raw_config.get("tracing", {})
+        tracing_settings = TracingSettings(**tracing_config)
+
+        tool_cache_config = raw_config.get("tool_cache", {})
+        tool_cache_settings = ToolCacheSettings(**tool_cache_config)
+
+        plan_templates_config = raw_config.get("plan_templates", {})
+        plan_templates_settings = PlanTemplateSettings(**plan_templates_config)
+
         config_dict = {
             "llm": {
                 "default": default_settings,
@@ -281,6 +382,9 @@ class Config:
             "browser_config": browser_settings,
             "search_config": search_settings,
             "mcp_config": mcp_settings,
+            "tracing": tracing_settings,
+            "tool_cache": tool_cache_settings,
+            "plan_templates": plan_templates_settings,
         }
 
         self._config = AppConfig(**config_dict)
@@ -306,6 +410,21 @@ class Config:
         """Get the MCP configuration"""
         return self._config.mcp_config
 
+    @property
+    def tracing(self) -> TracingSettings:
+        """Get the tracing configuration"""
+        return self._config.tracing
+
+    @property
+    def tool_cache(self) -> ToolCacheSettings:
+        """Get the tool result cache configuration"""
+        return self._config.tool_cache
+
+    @property
+    def plan_templates(self) -> PlanTemplateSettings:
+        """Get the plan template cache configuration"""
+        return self._config.plan_templates
+
     @property
     def workspace_root(self) -> Path:
         """Get the workspace root directory"""
@@ -0,0 +1,185 @@
+"""Per-request context budgeting for long agent runs.
+
+`ContextBudgeter` compacts the message history sent with each `ask_tool` call
+so the request always fits the model's context window: old tool observations
+are elided, stale images are dropped and, if still needed, the oldest turns are
+removed while keeping assistant tool calls paired with their tool results.
+The agent's memory itself is never modified.
+"""
+
+from typing import TYPE_CHECKING, List, Optional
+
+from app.logger import logger
+from app.schema import Message, Role, recent_image_indices
+
+
+if TYPE_CHECKING:
+    from app.llm import LLM
+
+
+ELIDED_NOTE = "\n...[{count} characters of earlier output elided to save context]"
+IMAGE_DROPPED_NOTE = "[earlier image omitted to save context]"
+TURNS_DROPPED_NOTE = "[{count} earlier messages omitted to fit the context window]"
+# Tokens counted per image, TokenCounter's estimate for an image of unknown size
+IMAGE_TOKENS = 1024
+
+
+class ContextBudgeter:
+    """Keeps each LLM request inside a token budget derived from the model window.
+
+    Attributes:
+        context_window: Total tokens the model accepts (input + output).
+        reserved_tokens: Tokens kept free for the completion.
+        keep_recent: Number of most recent messages never compacted.
+        max_images: Number of most recent images kept inline.
+        elide_to: Characters kept from an elided tool observation.
+    """
+
+    def __init__(
+        self,
+        llm: "LLM",
+        context_window: Optional[int] = None,
+        reserved_tokens: Optional[int] = None,
+        keep_recent: int = 8,
+        max_images: int = 2,
+        elide_to: int = 500,
+    ):
+        self.llm = llm
+        self.context_window = context_window or llm.context_window
+        self.reserved_tokens = (
+            reserved_tokens if reserved_tokens is not None else llm.max_tokens
+        )
+        self.keep_recent = keep_recent
+        self.max_images = max_images
+        self.elide_to = elide_to
+
+    def budget(self, fixed_tokens: int = 0) -> int:
+        """Tokens available for the message history"""
+        return max(self.context_window - self.reserved_tokens - fixed_tokens, 0)
+
+    def _count(self, *messages: Message) -> int:
+        """Tokens for `messages`, with an estimate per image instead of loading it"""
+        tokens = self.llm.count_message_tokens(
+            [message.to_dict(include_image=False) for message in messages]
+        )
+        return tokens + IMAGE_TOKENS * sum(1 for m in messages if m.image_ref)
+
+    def compact(
+        self,
+        messages: List[Message],
+        system_msgs: Optional[List[Message]] = None,
+        tools: Optional[List[dict]] = None,
+    ) -> List[Message]:
+        """Return a compacted copy of `messages` that fits the budget.
+
+        Args:
+            messages: Conversation history (excluding system messages)
+            system_msgs: System messages that are always sent in full
+            tools: Tool schemas sent with the request
+
+        Returns:
+            List[Message]: Messages to send; untouched messages are shared, changed
+            ones are copies.
+        """
+        fixed = self._count(*(system_msgs or []))
+        fixed += sum(self.llm.count_tokens(str(tool)) for tool in tools or [])
+        budget = self.budget(fixed)
+
+        messages = self._drop_orphan_tool_results(list(messages))
+        messages = self._drop_stale_images(messages)
+
+        sizes = [self._count(m) for m in messages]
+        total = sum(sizes)
+        if total <= budget:
+            return messages
+
+        original_total = total
+        protected_from = max(len(messages) - self.keep_recent, 0)
+
+        # Pass 1: elide old tool observations, oldest first
+        for i in range(protected_from):
+            if total <= budget:
+                break
+            message = messages[i]
+            if message.role != Role.TOOL or not message.content:
+                continue
+            if len(message.content) <= self.elide_to:
+                continue
+            elided = message.model_copy(
+                update={
+                    "content": message.content[: self.elide_to]
+                    + ELIDED_NOTE.format(count=len(message.content) - self.elide_to)
+                }
+            )
+            new_size = self._count(elided)
+            total += new_size - sizes[i]
+            messages[i], sizes[i] = elided, new_size
+
+        # Pass 2: drop the oldest turns, keeping the initial request. Once
+        # anything is dropped the note saying so has to fit as well.
+        dropped = 0
+        first_kept = 1 if messages and messages[0].role == Role.USER else 0
+        note_size = self._count(
+            Message.user_message(TURNS_DROPPED_NOTE.format(count=len(messages)))
+        )
+        while (
+            total + (note_size if dropped else 0) > budget
+            and first_kept < protected_from - dropped
+        ):
+            end = self._turn_end(messages, first_kept)
+            if end > protected_from - dropped:
+                break
+            total -= sum(sizes[first_kept:end])
+            del messages[first_kept:end]
+            del sizes[first_kept:end]
+            dropped += end - first_kept
+
+        if dropped:
+            messages.insert(
+                first_kept,
+                Message.user_message(TURNS_DROPPED_NOTE.format(count=dropped)),
+            )
+            total += note_size
+
+        logger.info(
+            f"Context compacted from {original_total} to ~{total} tokens "
+            f"(budget {budget}, {dropped} messages dropped)"
+        )
+        return messages
+
+    @staticmethod
+    def _turn_end(messages: List[Message], start: int) -> int:
+        """Index after the turn starting at `start` (assistant call + its tool results)"""
+        end = start + 1
+        if messages[start].tool_calls:
+            while end < len(messages) and messages[end].role == Role.TOOL:
+                end += 1
+        return end
+
+    @staticmethod
+    def _drop_orphan_tool_results(messages: List[Message]) -> List[Message]:
+        """Remove tool results whose assistant tool call is no longer in history"""
+        call_ids = set()
+        result = []
+        for message in messages:
+            if message.tool_calls:
+                call_ids.update(call.id for call in message.tool_calls)
+            if message.role == Role.TOOL and message.tool_call_id not in call_ids:
+                continue
+            result.append(message)
+        return result
+
+    def _drop_stale_images(self, messages: List[Message]) -> List[Message]:
+        """Keep only the most recent `max_images` images inline"""
+        inline_images = recent_image_indices(messages, self.max_images)
+        for i, message in enumerate(messages):
+            if not message.image_ref or i in inline_images:
+                continue
+            content = message.content or ""
+            messages[i] = message.model_copy(
+                update={
+                    "image_ref": None,
+                    "content": f"{content}\n{IMAGE_DROPPED_NOTE}".strip(),
+                }
+            )
+        return messages
@@ -11,3 +11,7 @@ class OpenManusError(Exception):
 
 class TokenLimitExceeded(OpenManusError):
     """Exception raised when the token limit is exceeded"""
+
+
+class ReplayMissError(OpenManusError):
+    """Exception raised when a replayed LLM request has no recorded response"""
@@ -4,6 +4,7 @@ from typing import Dict, List, Optional, Union
 from pydantic import BaseModel
 
 from app.agent.base import BaseAgent
+from app.flow.budget import FlowBudget
 
 
 class BaseFlow(BaseModel, ABC):
@@ -12,6 +13,8 @@ class BaseFlow(BaseModel, ABC):
     agents: Dict[str, BaseAgent]
     tools: Optional[List] = None
     primary_agent_key: Optional[str] = None
+    # Time and token limits; flows degrade and return partial results near them
+    budget: Optional[FlowBudget] = None
 
     class Config:
         arbitrary_types_allowed = True
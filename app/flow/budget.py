@@ -0,0 +1,171 @@
+"""Wall-clock and token budgets for flow runs.
+
+A `FlowBudget` tracks time since the flow started and tokens used by every LLM
+the flow touches. Part of each limit (`reserve_ratio`) is held back for the
+final summary; the rest is shared between the remaining plan steps, which sets
+each step's timeout and, once the cost of an agent step is known, its
+`max_steps`. Below `low_ratio` of the usable budget the flow degrades: it
+switches executors to the `fallback_llm` config and skips optional steps. When
+the usable budget is gone it stops and summarizes what it has.
+"""
+
+import time
+from typing import Dict, Iterable, Optional
+
+from app.llm import LLM
+
+
+class FlowBudget:
+    """Time and token limits for one flow run.
+
+    Attributes:
+        max_seconds: Wall-clock limit for the run, or None.
+        max_tokens: Input plus completion tokens for the run, or None.
+        reserve_ratio: Share of each limit kept for the final summary.
+        low_ratio: Share of the usable budget left at which the flow degrades.
+        fallback_llm: Name of an `[llm.<name>]` config used once the budget is
+            low, or None to keep the current models.
+        min_agent_steps: Lower bound for an executor's adapted `max_steps`.
+    """
+
+    def __init__(
+        self,
+        max_seconds: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        reserve_ratio: float = 0.1,
+        low_ratio: float = 0.25,
+        fallback_llm: Optional[str] = None,
+        min_agent_steps: int = 2,
+    ):
+        if not 0 <= reserve_ratio < 1:
+            raise ValueError("reserve_ratio must be in [0, 1)")
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.reserve_ratio = reserve_ratio
+        self.low_ratio = low_ratio
+        self.fallback_llm = fallback_llm
+        self.min_agent_steps = min_agent_steps
+        self._started_at: Optional[float] = None
+        self._llms: Dict[int, LLM] = {}
+        self._baselines: Dict[int, int] = {}
+        self._agent_steps = 0
+        self._agent_step_tokens = 0
+        self._agent_step_seconds = 0.0
+
+    def start(self, llms: Iterable[LLM] = ()) -> None:
+        """Start the clock and count tokens from now on"""
+        self._started_at = time.monotonic()
+        self._llms.clear()
+        self._baselines.clear()
+        self._agent_steps = 0
+        self._agent_step_tokens = 0
+        self._agent_step_seconds = 0.0
+        for llm in llms:
+            self.track(llm)
+
+    def track(self, llm: LLM) -> None:
+        """Count tokens used by `llm` from now on; LLMs are shared, so once is enough"""
+        if id(llm) not in self._llms:
+            self._llms[id(llm)] = llm
+            self._baselines[id(llm)] = self._used(llm)
+
+    @staticmethod
+    def _used(llm: LLM) -> int:
+        return llm.total_input_tokens + llm.total_completion_tokens
+
+    @property
+    def seconds_spent(self) -> float:
+        return time.monotonic() - self._started_at if self._started_at else 0.0
+
+    @property
+    def tokens_spent(self) -> int:
+        return sum(
+            self._used(llm) - self._baselines[key] for key, llm in self._llms.items()
+        )
+
+    def _usable(self, limit: float) -> float:
+        return limit * (1 - self.reserve_ratio)
+
+    def remaining_seconds(self) -> Optional[float]:
+        """Usable seconds left for steps, excluding the reserve"""
+        if self.max_seconds is None:
+            return None
+        return max(self._usable(self.max_seconds) - self.seconds_spent, 0.0)
+
+    def remaining_tokens(self) -> Optional[float]:
+        """Usable tokens left for steps, excluding the reserve"""
+        if self.max_tokens is None:
+            return None
+        return max(self._usable(self.max_tokens) - self.tokens_spent, 0.0)
+
+    def remaining_ratio(self) -> float:
+        """Share of the usable budget left, by the scarcer of time and tokens"""
+        ratios = [1.0]
+        if self.max_seconds:
+            ratios.append(self.remaining_seconds() / self._usable(self.max_seconds))
+        if self.max_tokens:
+            ratios.append(self.remaining_tokens() / self._usable(self.max_tokens))
+        return min(ratios)
+
+    @property
+    def low(self) -> bool:
+        return self.remaining_ratio() < self.low_ratio
+
+    @property
+    def exhausted(self) -> bool:
+        """Nothing is left for further steps; only the reserve remains"""
+        return self.remaining_ratio() <= 0
+
+    @property
+    def over_limit(self) -> bool:
+        """The reserve is used up too, so even the final summary must not call an LLM"""
+        return bool(
+            (self.max_seconds is not None and self.seconds_spent >= self.max_seconds)
+            or (self.max_tokens is not None and self.tokens_spent >= self.max_tokens)
+        )
+
+    def reserve_seconds(self) -> Optional[float]:
+        """Seconds left before the hard limit, for the final summary"""
+        if self.max_seconds is None:
+            return None
+        return max(self.max_seconds - self.seconds_spent, 0.0)
+
+    def step_timeout(self, remaining_steps: int) -> Optional[float]:
+        """Time for the next step: its share of what is left, doubled so a slow
+        step can borrow from later ones, which then run on a tighter budget."""
+        seconds = self.remaining_seconds()
+        if seconds is None:
+            return None
+        return min(seconds, 2 * seconds / max(remaining_steps, 1))
+
+    def record_agent_steps(self, steps: int, tokens: int, seconds: float) -> None:
+        """Record what an executor spent, to estimate the cost of one agent step"""
+        self._agent_steps += max(steps, 1)
+        self._agent_step_tokens += tokens
+        self._agent_step_seconds += seconds
+
+    def max_agent_steps(self, default: int, remaining_steps: int) -> int:
+        """`max_steps` an executor can afford for the next plan step"""
+        if not self._agent_steps:
+            return default
+        allowed = float(default)
+        share = 1 / max(remaining_steps, 1)
+        tokens = self.remaining_tokens()
+        if tokens is not None and self._agent_step_tokens:
+            per_step = self._agent_step_tokens / self._agent_steps
+            allowed = min(allowed, tokens * share / per_step)
+        seconds = self.remaining_seconds()
+        if seconds is not None and self._agent_step_seconds:
+            per_step = self._agent_step_seconds / self._agent_steps
+            allowed = min(allowed, seconds * share / per_step)
+        return max(self.min_agent_steps, min(default, int(allowed)))
+
+    def summary(self) -> str:
+        parts = [f"{self.seconds_spent:.1f}s"]
+        if self.max_seconds is not None:
+            parts[0] += f" of {self.max_seconds:.0f}s"
+        tokens = f"{self.tokens_spent} tokens"
+        if self.max_tokens is not None:
+            tokens += f" of {self.max_tokens}"
+        parts.append(tokens)
+        return ", ".join(parts)
@@ -0,0 +1,167 @@
+"""Plan progress events.
+
+Flows publish a `PlanEvent` when a plan is created, when a step starts,
+completes, fails or is skipped, and when the plan finishes. A `PlanEventBus`
+gives every subscriber its own queue and delivery task, so a slow subscriber
+(a GUI, a file sink) never holds up the flow or the other subscribers. Events
+that pile up while a subscriber is busy are handed to it together in one
+batch, so it writes or redraws once instead of once per event.
+
+    bus = PlanEventBus()
+    bus.subscribe(JsonlEventSink("logs/plan_events.jsonl"))
+    metrics = bus.subscribe(PlanMetrics())
+    flow = PlanningFlow(agent, events=bus)
+"""
+
+import asyncio
+import inspect
+import json
+import time
+from enum import Enum
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from app.logger import logger
+
+
+class PlanEventType(str, Enum):
+    PLAN_CREATED = "plan_created"
+    STEP_STARTED = "step_started"
+    STEP_COMPLETED = "step_completed"
+    STEP_FAILED = "step_failed"
+    STEP_SKIPPED = "step_skipped"
+    PLAN_FINISHED = "plan_finished"
+
+
+class PlanEvent(BaseModel):
+    """A change in a plan's progress"""
+
+    type: PlanEventType
+    plan_id: str
+    step_index: Optional[int] = None
+    step_text: Optional[str] = None
+    timestamp: float = Field(default_factory=time.time)
+    # Notes, error messages, counts; whatever the publisher knows about the change
+    detail: Dict[str, Any] = Field(default_factory=dict)
+
+
+# Called with the events delivered together; may be a coroutine function
+Subscriber = Callable[[List[PlanEvent]], Union[None, Awaitable[None]]]
+
+
+class _Subscription:
+    def __init__(self, handler: Subscriber, max_batch: int):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.task: Optional[asyncio.Task] = None
+
+    def put(self, event: PlanEvent) -> None:
+        self.queue.put_nowait(event)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._deliver())
+
+    async def _deliver(self) -> None:
+        # Runs until the queue is empty; `put` starts it again for new events
+        while not self.queue.empty():
+            batch = [self.queue.get_nowait()]
+            while len(batch) < self.max_batch and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                result = self.handler(batch)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning(f"Plan event subscriber {self.handler!r} failed: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+
+class PlanEventBus:
+    """Fans plan events out to subscribers without waiting for them.
+
+    Attributes:
+        max_batch: Most events handed to a subscriber in one call.
+    """
+
+    def __init__(self, max_batch: int = 100):
+        self.max_batch = max_batch
+        self._subscriptions: Dict[int, _Subscription] = {}
+
+    def subscribe(self, handler: Subscriber) -> Subscriber:
+        """Deliver future events to `handler`; returns it for convenience"""
+        self._subscriptions[id(handler)] = _Subscription(handler, self.max_batch)
+        return handler
+
+    def unsubscribe(self, handler: Subscriber) -> None:
+        subscription = self._subscriptions.pop(id(handler), None)
+        if subscription and subscription.task:
+            subscription.task.cancel()
+
+    def publish(self, event: PlanEvent) -> None:
+        """Queue `event` for every subscriber; must be called from the event loop"""
+        for subscription in self._subscriptions.values():
+            subscription.put(event)
+
+    async def flush(self) -> None:
+        """Wait until subscribers have handled every event published so far"""
+        for subscription in list(self._subscriptions.values()):
+            await subscription.queue.join()
+
+    async def close(self) -> None:
+        """Deliver what is queued, then stop the delivery tasks"""
+        await self.flush()
+        for handler in [s.handler for s in self._subscriptions.values()]:
+            self.unsubscribe(handler)
+
+
+class JsonlEventSink:
+    """Appends events to a JSON Lines file, one write per batch"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def __call__(self, events: List[PlanEvent]) -> None:
+        lines = "".join(event.model_dump_json() + "\n" for event in events)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(lines)
+
+    def __repr__(self) -> str:
+        return f"JsonlEventSink({str(self.path)!r})"
+
+
+class PlanMetrics:
+    """Counts events by type and times steps from start to completion or failure"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.step_seconds: Dict[int, float] = {}
+        self._started: Dict[int, float] = {}
+
+    def __call__(self, events: List[PlanEvent]) -> None:
+        for event in events:
+            self.counts[event.type.value] = self.counts.get(event.type.value, 0) + 1
+            if event.step_index is None:
+                continue
+            if event.type == PlanEventType.STEP_STARTED:
+                self._started[event.step_index] = event.timestamp
+            elif event.step_index in self._started and event.type in (
+                PlanEventType.STEP_COMPLETED,
+                PlanEventType.STEP_FAILED,
+            ):
+                started = self._started.pop(event.step_index)
+                self.step_seconds[event.step_index] = event.timestamp - started
+
+    def summary(self) -> str:
+        counts = ", ".join(f"{count} {name}" for name, count in self.counts.items())
+        if not self.step_seconds:
+            return counts
+        mean = sum(self.step_seconds.values()) / len(self.step_seconds)
+        return f"{counts}; {mean:.1f}s per step"
+
+    def __repr__(self) -> str:
+        return f"PlanMetrics({json.dumps(self.counts)})"
@@ -0,0 +1,265 @@
+"""A flow that maps over a collection of inputs and reduces the results.
+
+Each input (a file, or every file matching a glob pattern) is handed to the
+map step: a tool, a pool of warm agents, or the flow's own agents, one item
+per agent at a time. At most `max_concurrency` items are mapped at once. A
+failing item is retried up to `max_retries` times and then recorded as failed
+without stopping the others.
+
+Results stream into the reducer as they complete. It folds them, in batches
+of up to `reduce_batch_size`, into a running result using the flow's LLM (or
+a custom `reducer`), so most of the reduction is done by the time the last
+item is mapped.
+"""
+
+import asyncio
+import glob
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.agent.base import BaseAgent
+from app.agent.pool import AgentPool
+from app.flow.base import BaseFlow
+from app.llm import LLM
+from app.logger import logger
+from app.schema import Message
+from app.tool.base import BaseTool
+
+
+class MapResult(BaseModel):
+    """Outcome of the map step for one input item"""
+
+    item: str
+    output: Optional[str] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    seconds: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+# Folds a batch of results into the reduction so far (None before the first)
+Reducer = Callable[[Optional[str], List[MapResult]], Awaitable[str]]
+
+
+class MapReduceFlow(BaseFlow):
+    """Runs the map step on every input concurrently and reduces the results."""
+
+    llm: LLM = Field(default_factory=lambda: LLM())
+    # File paths or glob patterns; `**` matches directories recursively
+    inputs: List[str] = Field(default_factory=list)
+
+    # The map step: a tool called with the item as `map_tool_arg`, else a pool
+    # of warm agents, else the flow's executor agents
+    map_tool: Optional[BaseTool] = None
+    map_tool_arg: str = "path"
+    map_pool: Optional[AgentPool] = None
+    executor_keys: List[str] = Field(default_factory=list)
+    # Agent prompt; `{task}` is the flow input and `{item}` the input item
+    map_prompt: str = "{task}\n\nWork on this item only: {item}"
+
+    max_concurrency: int = 4
+    max_retries: int = 1
+    retry_delay: float = 1.0
+    map_timeout: Optional[float] = None
+
+    reducer: Optional[Reducer] = None
+    reduce_batch_size: int = 5
+    reduce_instruction: str = (
+        "Merge the new results into the result so far. Keep every finding and "
+        "note which item it came from."
+    )
+
+    def __init__(self, agents=None, **data):
+        if "executors" in data:
+            data["executor_keys"] = data.pop("executors")
+        super().__init__(agents if agents is not None else {}, **data)
+        if not self.executor_keys:
+            self.executor_keys = list(self.agents.keys())
+
+    def expand_inputs(self) -> List[str]:
+        """Input items with glob patterns expanded, in order and without duplicates"""
+        items: List[str] = []
+        for entry in self.inputs:
+            if glob.has_magic(entry):
+                matches = sorted(glob.glob(entry, recursive=True))
+                if not matches:
+                    logger.warning(f"No inputs match '{entry}'")
+                items.extend(matches)
+            else:
+                items.append(entry)
+        return list(dict.fromkeys(items))
+
+    def _map_agents(self) -> List[BaseAgent]:
+        return [self.agents[key] for key in self.executor_keys if key in self.agents]
+
+    async def execute(self, input_text: str) -> str:
+        """Map `input_text`, the task for each item, over the inputs and reduce"""
+        items = self.expand_inputs()
+        if not items:
+            return "No inputs to map over."
+
+        agents: List[BaseAgent] = []
+        if self.map_tool is None and self.map_pool is None:
+            agents = self._map_agents()[: self.max_concurrency]
+            if not agents:
+                raise ValueError("MapReduceFlow needs a map tool, pool or agent")
+        workers = len(agents) or min(self.max_concurrency, len(items))
+
+        if self.budget:
+            self.budget.start([self.llm] + [agent.llm for agent in agents if agent.llm])
+        if self.map_pool:
+            await self.map_pool.start()
+
+        pending: asyncio.Queue = asyncio.Queue()
+        for item in items:
+            pending.put_nowait(item)
+        results: asyncio.Queue = asyncio.Queue()
+        reduce_task = asyncio.create_task(self._reduce(input_text, results))
+        map_tasks = [
+            asyncio.create_task(self._map_worker(input_text, pending, results, agent))
+            for agent in (agents or [None] * workers)
+        ]
+        try:
+            await asyncio.gather(*map_tasks)
+            await results.put(None)
+            reduction, mapped = await reduce_task
+        finally:
+            for task in map_tasks + [reduce_task]:
+                task.cancel()
+            for agent in agents:
+                agent.cleanup_after_run = True
+                if hasattr(agent, "cleanup"):
+                    await agent.cleanup()
+            if self.map_pool:
+                await self.map_pool.close()
+
+        failed = [result for result in mapped if not result.ok]
+        logger.info(
+            f"Mapped {len(mapped) - len(failed)}/{len(mapped)} items "
+            f"({len(failed)} failed)"
+        )
+        output = reduction or "No results."
+        if failed:
+            output += f"\n\nFailed items ({len(failed)}):\n" + "\n".join(
+                f"- {result.item}: {result.error}" for result in failed
+            )
+        return output
+
+    async def _map_worker(
+        self,
+        task: str,
+        pending: asyncio.Queue,
+        results: asyncio.Queue,
+        agent: Optional[BaseAgent],
+    ) -> None:
+        if agent is not None:
+            # Tools stay open until every item is mapped
+            agent.cleanup_after_run = False
+        while not pending.empty():
+            item = pending.get_nowait()
+            if self.budget and self.budget.exhausted:
+                await results.put(
+                    MapResult(item=item, error="Skipped: flow budget exhausted")
+                )
+                continue
+            await results.put(await self._map_item(task, item, agent))
+
+    async def _map_item(
+        self, task: str, item: str, agent: Optional[BaseAgent]
+    ) -> MapResult:
+        """Map one item, retrying failures; never raises"""
+        result = MapResult(item=item)
+        started_at = time.monotonic()
+        while result.attempts <= self.max_retries:
+            result.attempts += 1
+            try:
+                result.output = await asyncio.wait_for(
+                    self._map_once(task, item, agent), timeout=self.map_timeout
+                )
+                result.error = None
+                break
+            except Exception as e:
+                result.error = str(e) or type(e).__name__
+                logger.warning(
+                    f"Map step failed for {item} "
+                    f"(attempt {result.attempts}): {result.error}"
+                )
+                if result.attempts <= self.max_retries:
+                    await asyncio.sleep(self.retry_delay * result.attempts)
+        result.seconds = time.monotonic() - started_at
+        return result
+
+    async def _map_once(self, task: str, item: str, agent: Optional[BaseAgent]) -> str:
+        if self.map_tool is not None:
+            output = await self.map_tool.execute(**{self.map_tool_arg: item})
+            if getattr(output, "error", None):
+                raise RuntimeError(output.error)
+            return str(output)
+        prompt = self.map_prompt.format(task=task, item=item)
+        if self.map_pool is not None:
+            return await self.map_pool.run(prompt)
+        try:
+            return await agent.run(prompt)
+        finally:
+            # The next item starts with fresh memory
+            agent.reset()
+
+    async def _reduce(
+        self, task: str, results: asyncio.Queue
+    ) -> tuple[Optional[str], List[MapResult]]:
+        """Fold results into the reduction as they arrive, until the None sentinel"""
+        reduction: Optional[str] = None
+        mapped: List[MapResult] = []
+        done = False
+        while not done:
+            batch = [await results.get()]
+            while len(batch) < self.reduce_batch_size and not results.empty():
+                batch.append(results.get_nowait())
+            if batch[-1] is None:
+                batch.pop()
+                done = True
+            mapped.extend(batch)
+            succeeded = [result for result in batch if result.ok]
+            if succeeded:
+                reduction = await self._fold(task, reduction, succeeded)
+        return reduction, mapped
+
+    async def _fold(
+        self, task: str, reduction: Optional[str], batch: List[MapResult]
+    ) -> str:
+        """The reduction with `batch` merged in; falls back to appending"""
+        appended = "\n".join(
+            [reduction or ""]
+            + [f"- {result.item}: {result.output}" for result in batch]
+        ).strip()
+        try:
+            if self.reducer is not None:
+                return await self.reducer(reduction, batch)
+            if self.budget and self.budget.low:
+                return appended
+            new_results = "\n\n".join(
+                f"Item: {result.item}\nResult: {result.output}" for result in batch
+            )
+            return await self.llm.ask(
+                messages=[
+                    Message.user_message(
+                        f"Task for each item: {task}\n\n"
+                        f"Result so far:\n{reduction or '(nothing yet)'}\n\n"
+                        f"New item results:\n{new_results}\n\n{self.reduce_instruction}"
+                    )
+                ],
+                system_msgs=[
+                    Message.system_message(
+                        "You are a reduce step. Your task is to merge the results of "
+                        "many items into one result."
+                    )
+                ],
+            )
+        except Exception as e:
+            logger.error(f"Error reducing {len(batch)} results: {e}")
+            return appended
@@ -0,0 +1,236 @@
+"""Reusable plans for recurring requests.
+
+Requests are reduced to a shape by replacing their variable parts (URLs, paths,
+quoted strings and anything containing a digit, such as bus numbers or dates)
+with numbered placeholders. After the planning LLM drafts a plan, the same
+values are replaced in its title and steps and the result is stored under the
+request's shape. A later request with the same shape, or with one at least
+`fuzzy_threshold` similar, gets that plan filled in with its own values
+instead of another planning call. Similarity is measured on words, and similar
+shapes may only differ in placeholders and filler words ("please", "the"), so
+"inspect bus {0} photos" never matches "inspect bus {0} tires".
+"""
+
+import difflib
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.config import PROJECT_ROOT, PlanTemplateSettings, config
+from app.logger import logger
+
+
+_PARAMETER = re.compile(
+    r"https?://\S+"  # URLs
+    r"|(?:~|\.{1,2})?/[\w.\-/]+|[A-Za-z]:\\[\w.\-\\]+"  # POSIX and Windows paths
+    r"|\"[^\"\n]+\"|`[^`\n]+`"  # quoted strings
+    r"|\b[\w-]*\d[\w-]*\b"  # numbers and identifiers with digits (bus 12, BEB-12)
+)
+_PLACEHOLDER = re.compile(r"\{(\d+)\}")
+# Words that may differ between similar request shapes without changing the task
+_FILLER_WORDS = frozenset(
+    "please kindly can could would you me now then also the a an for".split()
+)
+
+
+def normalize_request(request: str) -> Tuple[str, List[str]]:
+    """Split a request into its shape and the values taken out of it.
+
+    >>> normalize_request("Inspect bus 12 photos in /data/bus12")
+    ('inspect bus {0} photos in {1}', ['12', '/data/bus12'])
+    """
+    params: List[str] = []
+
+    def replace(match: re.Match) -> str:
+        params.append(match.group(0))
+        return f"{{{len(params) - 1}}}"
+
+    shape = _PARAMETER.sub(replace, request.strip())
+    return " ".join(shape.lower().split()), params
+
+
+def _parameterize(text: str, params: List[str]) -> str:
+    """Replace request values in plan text with placeholders, longest first"""
+    for i in sorted(range(len(params)), key=lambda i: -len(params[i])):
+        value = params[i]
+        start = r"(?<!\w)" if value[0].isalnum() else ""
+        end = r"(?!\w)" if value[-1].isalnum() else ""
+        text = re.sub(start + re.escape(value) + end, f"{{{i}}}", text)
+    return text
+
+
+def _similarity(shape: str, candidate: str) -> float:
+    """Word-level similarity of two shapes, or 0 if they differ in a word that
+    is neither a placeholder nor filler"""
+    words, other = shape.split(), candidate.split()
+    matcher = difflib.SequenceMatcher(None, words, other, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        for word in words[i1:i2] + other[j1:j2]:
+            if word not in _FILLER_WORDS and not _PLACEHOLDER.fullmatch(word):
+                return 0.0
+    return matcher.ratio()
+
+
+def _instantiate(text: str, params: List[str]) -> str:
+    return _PLACEHOLDER.sub(
+        lambda m: params[int(m.group(1))] if int(m.group(1)) < len(params) else "",
+        text,
+    )
+
+
+class PlanTemplateCache:
+    """Plan templates keyed by request shape, stored in a JSON file.
+
+    Attributes:
+        path: JSON file holding the templates, or None to keep them in memory.
+        fuzzy_threshold: Minimum shape similarity for a non-exact match, or
+            None to require identical shapes.
+        max_templates: Templates kept; the least used are dropped first.
+        hits: Requests served from a template, including fuzzy hits.
+        fuzzy_hits: Hits on a similar rather than identical shape.
+        misses: Requests that needed a planning call.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        fuzzy_threshold: Optional[float] = 0.9,
+        max_templates: int = 200,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.path = Path(path) if path else None
+        self.fuzzy_threshold = fuzzy_threshold
+        self.max_templates = max_templates
+        self._templates: Optional[Dict[str, dict]] = None
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(
+        cls, settings: Optional[PlanTemplateSettings]
+    ) -> "PlanTemplateCache":
+        settings = settings or PlanTemplateSettings()
+        path = Path(settings.path)
+        if not path.is_absolute():
+            path = PROJECT_ROOT / path
+        return cls(
+            path, settings.fuzzy_threshold, settings.max_templates, settings.enabled
+        )
+
+    @property
+    def templates(self) -> Dict[str, dict]:
+        if self._templates is None:
+            self._templates = {}
+            if self.path and self.path.exists():
+                try:
+                    self._templates = json.loads(self.path.read_text(encoding="utf-8"))
+                except (OSError, ValueError) as e:
+                    logger.warning(
+                        f"Ignoring unreadable plan templates {self.path}: {e}"
+                    )
+        return self._templates
+
+    def _find(self, shape: str, param_count: int) -> Tuple[Optional[str], bool]:
+        """Key of the template for `shape`, and whether the match is fuzzy"""
+        template = self.templates.get(shape)
+        if template and template["params"] == param_count:
+            return shape, False
+        if self.fuzzy_threshold is None:
+            return None, False
+
+        best, best_ratio = None, self.fuzzy_threshold
+        for candidate, template in self.templates.items():
+            if template["params"] != param_count:
+                continue
+            ratio = _similarity(shape, candidate)
+            if ratio and ratio >= best_ratio:
+                best, best_ratio = candidate, ratio
+        return best, best is not None
+
+    def lookup(self, request: str) -> Optional[dict]:
+        """A plan for `request` built from a stored template, or None.
+
+        Returns:
+            dict with `title`, `steps` and `step_dependencies` (possibly None).
+        """
+        if not self.enabled:
+            return None
+        shape, params = normalize_request(request)
+        key, fuzzy = self._find(shape, len(params))
+        if key is None:
+            self.misses += 1
+            return None
+
+        template = self.templates[key]
+        template["hits"] = template.get("hits", 0) + 1
+        template["last_used"] = time.time()
+        self._save()
+        self.hits += 1
+        self.fuzzy_hits += fuzzy
+        logger.info(
+            f"Plan template {'fuzzy ' if fuzzy else ''}hit for request shape '{key}' "
+            f"({self.summary()})"
+        )
+        return {
+            "title": _instantiate(template["title"], params),
+            "steps": [_instantiate(step, params) for step in template["steps"]],
+            "step_dependencies": template.get("step_dependencies"),
+        }
+
+    def store(
+        self,
+        request: str,
+        title: str,
+        steps: List[str],
+        step_dependencies: Optional[List[List[int]]] = None,
+    ) -> None:
+        """Remember the plan drafted for `request` as a template for its shape"""
+        if not self.enabled:
+            return
+        shape, params = normalize_request(request)
+        self.templates[shape] = {
+            "title": _parameterize(title, params),
+            "steps": [_parameterize(step, params) for step in steps],
+            "step_dependencies": step_dependencies,
+            "params": len(params),
+            "hits": 0,
+            "last_used": time.time(),
+        }
+        while len(self.templates) > self.max_templates:
+            least_used = min(
+                self.templates,
+                key=lambda k: (
+                    self.templates[k]["hits"],
+                    self.templates[k]["last_used"],
+                ),
+            )
+            del self.templates[least_used]
+        self._save()
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.path.write_text(
+                json.dumps(self.templates, indent=2, ensure_ascii=False),
+                encoding="utf-8",
+            )
+        except OSError as e:
+            logger.warning(f"Failed to save plan templates to {self.path}: {e}")
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        return (
+            f"{self.hits}/{lookups} hits, {self.fuzzy_hits} fuzzy, "
+            f"{len(self.templates)} templates"
+        )
+
+
+plan_templates = PlanTemplateCache.from_settings(config.plan_templates)
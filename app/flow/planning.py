@@ -1,15 +1,23 @@
+import asyncio
 import json
+import re
 import time
 from enum import Enum
-from typing import Dict, List, Optional, Union
+from typing import Awaitable, Callable, Dict, List, Literal, Optional, Set, Union
 
-from pydantic import Field
+from pydantic import Field, PrivateAttr
 
 from app.agent.base import BaseAgent
+from app.agent.pool import AgentPool
+from app.checkpoint import CheckpointStore
+from app.exceptions import ToolError
 from app.flow.base import BaseFlow
+from app.flow.events import PlanEvent, PlanEventBus, PlanEventType
+from app.flow.plan_templates import PlanTemplateCache, plan_templates
 from app.llm import LLM
 from app.logger import logger
-from app.schema import AgentState, Message, ToolChoice
+from app.sandbox.client import SANDBOX_CLIENT
+from app.schema import AgentState, Message, Role, ToolChoice
 from app.tool import PlanningTool
 
 
@@ -42,6 +50,13 @@ class PlanStepStatus(str, Enum):
         }
 
 
+_STATUS_EVENTS = {
+    PlanStepStatus.IN_PROGRESS.value: PlanEventType.STEP_STARTED,
+    PlanStepStatus.COMPLETED.value: PlanEventType.STEP_COMPLETED,
+    PlanStepStatus.BLOCKED.value: PlanEventType.STEP_FAILED,
+}
+
+
 class PlanningFlow(BaseFlow):
     """A flow that manages planning and execution of tasks using agents."""
 
@@ -50,6 +65,50 @@ class PlanningFlow(BaseFlow):
     executor_keys: List[str] = Field(default_factory=list)
     active_plan_id: str = Field(default_factory=lambda: f"plan_{int(time.time())}")
     current_step_index: Optional[int] = None
+    checkpoint: Optional[CheckpointStore] = None
+
+    # Steps whose dependencies are completed run concurrently, up to this many
+    max_parallel_steps: int = 1
+    # Creates extra executors when every suitable agent is busy with another step
+    executor_factory: Optional[Callable[[], Awaitable[BaseAgent]]] = None
+    # Step type -> pool of warm agents that keep their tools between steps and
+    # start each step with fresh memory; "default" serves steps no agent or pool
+    # is tagged for. Pools are started with the flow and closed when it ends.
+    executor_pools: Dict[str, AgentPool] = Field(default_factory=dict)
+    # Plans reused for requests of a known shape instead of a planning LLM call
+    template_cache: Optional[PlanTemplateCache] = Field(
+        default_factory=lambda: plan_templates
+    )
+    # Receives step started/completed/failed/skipped events, e.g. for a UI
+    events: Optional[PlanEventBus] = None
+
+    # "full" embeds the whole plan text in every step prompt; "compact" sends the
+    # current step, a summary of recent step results and the remaining steps
+    step_context: Literal["full", "compact"] = "full"
+    # Completed steps summarized in compact prompts, and characters kept of each
+    summary_steps: int = 3
+    summary_chars: int = 300
+    # Remaining steps listed by title in compact prompts; the rest are counted
+    remaining_steps: int = 10
+    # Fold each completed step into a running summary while the next step runs,
+    # so the plan is finalized from that summary instead of a last LLM call
+    speculative: bool = False
+    # Longest finalization waits for the running summary to catch up; steps it
+    # has not folded in by then are appended to it as they are
+    summary_wait: float = 10.0
+
+    # Seq of the checkpoint record written when the interrupted step started
+    _resume_after: Optional[int] = PrivateAttr(default=None)
+    # Shortened result of each completed step, for compact step prompts
+    _step_summaries: Dict[int, str] = PrivateAttr(default_factory=dict)
+    # Executors adjusted to the budget, with their original max_steps and LLM
+    _budget_defaults: Dict[int, tuple] = PrivateAttr(default_factory=dict)
+    _flow_llm: Optional[LLM] = PrivateAttr(default=None)
+    # Running summary of completed steps, updated in the background
+    _progress_summary: Optional[asyncio.Task] = PrivateAttr(default=None)
+    _summary_so_far: str = PrivateAttr(default="")
+    # Completed steps not yet folded into the running summary, in order
+    _unfolded_steps: List[int] = PrivateAttr(default_factory=list)
 
     def __init__(
         self, agents: Union[BaseAgent, List[BaseAgent], Dict[str, BaseAgent]], **data
@@ -91,14 +150,44 @@ class PlanningFlow(BaseFlow):
         # Fallback to primary agent
         return self.primary_agent
 
+    def get_pool(self, step_type: Optional[str] = None) -> Optional[AgentPool]:
+        """The warm agent pool for a step type, or None to use `get_executor`"""
+        if step_type and step_type in self.executor_pools:
+            return self.executor_pools[step_type]
+        if step_type and step_type in self.agents:
+            return None
+        return self.executor_pools.get("default")
+
+    def _unique_pools(self) -> List[AgentPool]:
+        return list({id(pool): pool for pool in self.executor_pools.values()}.values())
+
     async def execute(self, input_text: str) -> str:
         """Execute the planning flow with agents."""
+        result = ""
+        self._progress_summary = None
+        self._summary_so_far = ""
+        self._unfolded_steps = []
         try:
             if not self.primary_agent:
                 raise ValueError("No primary agent available")
 
+            for key, agent in self.agents.items():
+                if agent.checkpoint is None:
+                    agent.checkpoint = self.checkpoint
+                # Agents may share a name; their flow keys tell their records apart
+                if agent.checkpoint is not None and agent.checkpoint_id is None:
+                    agent.checkpoint_id = key
+            resumed = self._restore_checkpoint()
+            for pool in self._unique_pools():
+                await pool.start()
+            if self.budget:
+                self.budget.start(
+                    [self.llm]
+                    + [agent.llm for agent in self.agents.values() if agent.llm]
+                )
+
             # Create initial plan if input provided
-            if input_text:
+            if input_text and resumed is None:
                 await self._create_initial_plan(input_text)
 
                 # Verify plan was created successfully
@@ -107,9 +196,20 @@ class PlanningFlow(BaseFlow):
                         f"Plan creation failed. Plan ID {self.active_plan_id} not found in planning tool."
                     )
                     return f"Failed to create plan for: {input_text}"
+                plan = self.planning_tool.plans[self.active_plan_id]
+                self._publish(
+                    PlanEventType.PLAN_CREATED, title=plan.title, steps=plan["steps"]
+                )
+
+            result = resumed.get("result", "") if resumed else ""
+            if self.max_parallel_steps > 1:
+                return await self._execute_parallel(result)
 
-            result = ""
             while True:
+                if self.budget and self.budget.exhausted:
+                    result += await self._finalize_partial("budget exhausted")
+                    break
+
                 # Get current step to execute
                 self.current_step_index, step_info = await self._get_current_step_info()
 
@@ -118,11 +218,22 @@ class PlanningFlow(BaseFlow):
                     result += await self._finalize_plan()
                     break
 
+                skipped = await self._skip_for_budget(step_info)
+                if skipped:
+                    result += skipped + "\n"
+                    continue
+
                 # Execute current step with appropriate agent
                 step_type = step_info.get("type") if step_info else None
-                executor = self.get_executor(step_type)
-                step_result = await self._execute_step(executor, step_info)
+                pool = self.get_pool(step_type)
+                executor = None if pool else self.get_executor(step_type)
+                self._save_checkpoint("step_started", result)
+                if pool:
+                    step_result = await self._execute_pooled_step(pool, step_info)
+                else:
+                    step_result = await self._execute_step(executor, step_info)
                 result += step_result + "\n"
+                self._save_checkpoint("step_done", result)
 
                 # Check if agent wants to terminate
                 if hasattr(executor, "state") and executor.state == AgentState.FINISHED:
@@ -131,34 +242,226 @@ class PlanningFlow(BaseFlow):
             return result
         except Exception as e:
             logger.error(f"Error in PlanningFlow: {str(e)}")
-            return f"Execution failed: {str(e)}"
+            # Keep the results of steps that did finish
+            return f"{result}Execution failed: {str(e)}"
+        finally:
+            if self._progress_summary and not self._progress_summary.done():
+                self._progress_summary.cancel()
+            for pool in self._unique_pools():
+                await pool.close()
+            self._restore_executors()
+            if self.budget:
+                logger.info(f"Flow budget used: {self.budget.summary()}")
+            if self.events:
+                if self.active_plan_id in self.planning_tool.plans:
+                    statuses = self.planning_tool.plans[self.active_plan_id][
+                        "step_statuses"
+                    ]
+                    self._publish(
+                        PlanEventType.PLAN_FINISHED,
+                        statuses={s: statuses.count(s) for s in set(statuses)},
+                    )
+                await self.events.flush()
+
+    async def _execute_parallel(self, result: str) -> str:
+        """Run every step whose dependencies are completed, up to `max_parallel_steps`.
+
+        Results are appended in completion order. Steps are marked completed here,
+        once their task is collected, so a finished step and the steps it unblocks
+        are saved in one write even when several steps finish together.
+        """
+        plan = self.planning_tool.plans[self.active_plan_id]
+        # Steps left in progress by an interrupted run are started again
+        for i, step in enumerate(plan.steps):
+            if step.status == PlanStepStatus.IN_PROGRESS.value:
+                plan.set_status(i, PlanStepStatus.NOT_STARTED.value)
+
+        running: Dict[asyncio.Task, tuple[int, Optional[BaseAgent]]] = {}
+        done: Set[asyncio.Task] = set()
+        busy: Set[int] = set()
+        used: List[BaseAgent] = []
+        extra: List[BaseAgent] = []
+        stop = False
+        out_of_budget = False
+        try:
+            while True:
+                # Finished steps and the steps they unblock are saved in one write
+                with self.planning_tool.plans.batch():
+                    for task in sorted(done, key=lambda t: running[t][0]):
+                        index, executor = running.pop(task)
+                        busy.discard(id(executor))
+                        self.current_step_index = index
+                        step_result, completed = task.result()
+                        result += step_result + "\n"
+                        # A failed step blocks its dependents instead of being retried
+                        if completed:
+                            await self._mark_step_completed(index)
+                        else:
+                            plan.set_status(index, PlanStepStatus.BLOCKED.value)
+                        self._save_checkpoint("step_done", result)
+                        if executor and executor.state == AgentState.FINISHED:
+                            stop = True
+
+                    for index in self.planning_tool.get_ready_steps(
+                        self.active_plan_id
+                    ):
+                        if stop or len(running) >= self.max_parallel_steps:
+                            break
+                        if self.budget and self.budget.exhausted:
+                            stop = out_of_budget = True
+                            break
+                        step_info = self._build_step_info(index, plan.steps[index].text)
+                        skipped = await self._skip_for_budget(step_info)
+                        if skipped:
+                            result += skipped + "\n"
+                            continue
+                        # Pools queue their own steps; agents run one step at a time
+                        pool = self.get_pool(step_info.get("type"))
+                        executor = None
+                        if pool is None:
+                            executor = await self._acquire_executor(
+                                step_info.get("type"), busy, extra
+                            )
+                            if executor is None:
+                                break
+                            if executor not in used:
+                                used.append(executor)
+                                # Shared resources are released once all steps are done
+                                executor.cleanup_after_run = False
+                            busy.add(id(executor))
+                        self._set_step_status(index, PlanStepStatus.IN_PROGRESS.value)
+                        if pool:
+                            logger.info(f"Starting step {index} in an agent pool")
+                            step = self._run_pooled_step(pool, step_info)
+                        else:
+                            logger.info(
+                                f"Starting step {index} with agent {executor.name}"
+                            )
+                            step = self._run_step(executor, step_info)
+                        running[asyncio.create_task(step)] = (index, executor)
+
+                if not running:
+                    break
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+
+            if out_of_budget:
+                result += await self._finalize_partial("budget exhausted")
+            elif not stop:
+                result += await self._finalize_plan()
+            return result
+        finally:
+            for task in running:
+                task.cancel()
+            for agent in used:
+                agent.cleanup_after_run = True
+                if hasattr(agent, "cleanup"):
+                    await agent.cleanup()
+            await SANDBOX_CLIENT.cleanup()
+
+    async def _acquire_executor(
+        self, step_type: Optional[str], busy: Set[int], extra: List[BaseAgent]
+    ) -> Optional[BaseAgent]:
+        """An idle executor for the step, creating one if all are busy and possible"""
+        preferred = self.get_executor(step_type)
+        if id(preferred) not in busy:
+            return preferred
+        for agent in extra:
+            if id(agent) not in busy:
+                return agent
+        if self.executor_factory is None:
+            return None
+        agent = await self.executor_factory()
+        # Extra executors are not restored on resume, so they are not checkpointed
+        agent.checkpoint = None
+        extra.append(agent)
+        return agent
+
+    def _save_checkpoint(self, phase: str, result: str) -> None:
+        """Record plan progress and the result so far"""
+        if not self.checkpoint:
+            return
+        self.checkpoint.save_flow(
+            phase=phase,
+            plan_id=self.active_plan_id,
+            step_index=self.current_step_index,
+            planning=self.planning_tool.dump_state(),
+            result=result,
+        )
+
+    def _restore_checkpoint(self) -> Optional[dict]:
+        """Restore plan and agent state from the latest flow checkpoint, if any"""
+        record = self.checkpoint.load_flow() if self.checkpoint else None
+        if record is None:
+            return None
+
+        self.planning_tool.load_state(record["planning"])
+        self.active_plan_id = record["plan_id"]
+        for agent in self.agents.values():
+            agent.restore_checkpoint()
+        # An agent that checkpointed after its step started can pick up mid-step
+        if record["phase"] == "step_started":
+            self._resume_after = record["seq"]
+        logger.info(
+            f"Resuming plan {self.active_plan_id} at step {record['step_index']}"
+        )
+        return record
 
     async def _create_initial_plan(self, request: str) -> None:
         """Create an initial plan based on the request using the flow's LLM and PlanningTool."""
         logger.info(f"Creating initial plan with ID: {self.active_plan_id}")
 
+        template = self.template_cache.lookup(request) if self.template_cache else None
+        if template:
+            try:
+                await self.planning_tool.execute(
+                    command="create", plan_id=self.active_plan_id, **template
+                )
+                return
+            except ToolError as e:
+                logger.warning(f"Plan template did not apply, planning anew: {e}")
+
         # Create a system message for plan creation
-        system_message = Message.system_message(
+        planning_prompt = (
             "You are a planning assistant. Create a concise, actionable plan with clear steps. "
             "Focus on key milestones rather than detailed sub-steps. "
             "Optimize for clarity and efficiency."
         )
+        if self.budget:
+            planning_prompt += (
+                " Tag steps that are useful but not required with [OPTIONAL]; "
+                "they are skipped when time or tokens run low."
+            )
+        if self.max_parallel_steps > 1:
+            planning_prompt += (
+                " Set step_dependencies to the earlier steps each step needs, "
+                "so that independent steps can run in parallel."
+            )
+        system_message = Message.system_message(planning_prompt)
 
         # Create a user message with the request
         user_message = Message.user_message(
             f"Create a reasonable plan with clear steps to accomplish the task: {request}"
         )
 
-        # Call LLM with PlanningTool
-        response = await self.llm.ask_tool(
-            messages=[user_message],
-            system_msgs=[system_message],
-            tools=[self.planning_tool.to_param()],
-            tool_choice=ToolChoice.AUTO,
-        )
+        # Call LLM with PlanningTool, within what the budget leaves for steps
+        try:
+            response = await asyncio.wait_for(
+                self.llm.ask_tool(
+                    messages=[user_message],
+                    system_msgs=[system_message],
+                    tools=[self.planning_tool.to_param()],
+                    tool_choice=ToolChoice.AUTO,
+                ),
+                timeout=self.budget.remaining_seconds() if self.budget else None,
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Planning ran out of the time budget")
+            response = None
 
         # Process tool calls if present
-        if response.tool_calls:
+        if response and response.tool_calls:
             for tool_call in response.tool_calls:
                 if tool_call.function.name == "planning":
                     # Parse the arguments
@@ -177,6 +480,13 @@ class PlanningFlow(BaseFlow):
                     result = await self.planning_tool.execute(**args)
 
                     logger.info(f"Plan creation result: {str(result)}")
+                    if self.template_cache and (
+                        self.active_plan_id in self.planning_tool.plans
+                    ):
+                        plan = self.planning_tool.plans[self.active_plan_id]
+                        self.template_cache.store(
+                            request, plan.title, plan["steps"], plan.dependencies
+                        )
                     return
 
         # If execution reached here, create a default plan
@@ -192,6 +502,21 @@ class PlanningFlow(BaseFlow):
             }
         )
 
+    @staticmethod
+    def _build_step_info(index: int, step: str) -> dict:
+        """Step text, index and type, e.g. "search" for a step tagged [SEARCH].
+
+        Steps tagged [OPTIONAL] are marked as optional; the tag is not a type.
+        """
+        step_info = {"index": index, "text": step}
+        tags = re.findall(r"\[([A-Z_]+)\]", step)
+        if "OPTIONAL" in tags:
+            step_info["optional"] = True
+            tags.remove("OPTIONAL")
+        if tags:
+            step_info["type"] = tags[0].lower()
+        return step_info
+
     async def _get_current_step_info(self) -> tuple[Optional[int], Optional[dict]]:
         """
         Parse the current plan to identify the first non-completed step's index and info.
@@ -205,52 +530,18 @@ class PlanningFlow(BaseFlow):
             return None, None
 
         try:
-            # Direct access to plan data from planning tool storage
+            # The plan keeps a cursor at its first active step
             plan_data = self.planning_tool.plans[self.active_plan_id]
-            steps = plan_data.get("steps", [])
-            step_statuses = plan_data.get("step_statuses", [])
+            i = plan_data.next_active_step()
+            if i is None:
+                return None, None  # No active step found
 
-            # Find first non-completed step
-            for i, step in enumerate(steps):
-                if i >= len(step_statuses):
-                    status = PlanStepStatus.NOT_STARTED.value
-                else:
-                    status = step_statuses[i]
-
-                if status in PlanStepStatus.get_active_statuses():
-                    # Extract step type/category if available
-                    step_info = {"text": step}
-
-                    # Try to extract step type from the text (e.g., [SEARCH] or [CODE])
-                    import re
-
-                    type_match = re.search(r"\[([A-Z_]+)\]", step)
-                    if type_match:
-                        step_info["type"] = type_match.group(1).lower()
-
-                    # Mark current step as in_progress
-                    try:
-                        await self.planning_tool.execute(
-                            command="mark_step",
-                            plan_id=self.active_plan_id,
-                            step_index=i,
-                            step_status=PlanStepStatus.IN_PROGRESS.value,
-                        )
-                    except Exception as e:
-                        logger.warning(f"Error marking step as in_progress: {e}")
-                        # Update step status directly if needed
-                        if i < len(step_statuses):
-                            step_statuses[i] = PlanStepStatus.IN_PROGRESS.value
-                        else:
-                            while len(step_statuses) < i:
-                                step_statuses.append(PlanStepStatus.NOT_STARTED.value)
-                            step_statuses.append(PlanStepStatus.IN_PROGRESS.value)
+            step_info = self._build_step_info(i, plan_data.steps[i].text)
 
-                        plan_data["step_statuses"] = step_statuses
+            # Mark current step as in_progress
+            self._set_step_status(i, PlanStepStatus.IN_PROGRESS.value)
 
-                    return i, step_info
-
-            return None, None  # No active step found
+            return i, step_info
 
         except Exception as e:
             logger.warning(f"Error finding current step index: {e}")
@@ -258,71 +549,398 @@ class PlanningFlow(BaseFlow):
 
     async def _execute_step(self, executor: BaseAgent, step_info: dict) -> str:
         """Execute the current step with the specified agent using agent.run()."""
+        step_result, completed = await self._run_step(executor, step_info)
+        if completed:
+            # Mark the step as completed after successful execution
+            await self._mark_step_completed(step_info.get("index"))
+        return step_result
+
+    async def _execute_pooled_step(self, pool: AgentPool, step_info: dict) -> str:
+        """Execute a step on a warm agent from `pool`, which resets it afterwards."""
+        step_result, completed = await self._run_pooled_step(pool, step_info)
+        if completed:
+            await self._mark_step_completed(step_info.get("index"))
+        return step_result
+
+    async def _run_step(self, executor: BaseAgent, step_info: dict) -> tuple[str, bool]:
+        """Run a step on `executor`; returns its result and whether it completed"""
+        step_index = step_info.get("index", self.current_step_index)
+        step_prompt = await self._build_step_prompt(step_info)
+
+        # Continue an interrupted step from the agent's checkpoint instead of restarting it
+        resume = self._resume_after is not None and bool(
+            executor.checkpoint
+            and executor.checkpoint.load_agent(
+                executor.checkpoint_key, self._resume_after
+            )
+        )
+        self._resume_after = None
+
+        if not resume:
+            self._apply_budget(executor)
+        started_at = time.monotonic()
+        tokens_before = self.budget.tokens_spent if self.budget else 0
+
+        # Use agent.run() to execute the step
+        try:
+            step_result = await asyncio.wait_for(
+                executor.run(None if resume else step_prompt),
+                timeout=self._step_timeout(),
+            )
+            self._step_summaries[step_index] = self._summarize_step(
+                executor, step_result
+            )
+            return step_result, True
+        except asyncio.TimeoutError:
+            return await self._stop_step(step_index, executor), False
+        except Exception as e:
+            logger.error(f"Error executing step {step_index}: {e}")
+            self._publish(PlanEventType.STEP_FAILED, step_index, error=str(e))
+            return f"Error executing step {step_index}: {str(e)}", False
+        finally:
+            if self.budget:
+                # A run cut short at max_steps resets the counter to 0
+                steps = executor.current_step or executor.max_steps
+                self.budget.record_agent_steps(
+                    steps,
+                    self.budget.tokens_spent - tokens_before,
+                    time.monotonic() - started_at,
+                )
+
+    async def _run_pooled_step(
+        self, pool: AgentPool, step_info: dict
+    ) -> tuple[str, bool]:
+        """Run a step on a warm agent from `pool`, which resets it afterwards;
+        returns its result and whether it completed"""
+        step_index = step_info.get("index", self.current_step_index)
+        step_prompt = await self._build_step_prompt(step_info)
+        # Pooled agents are not checkpointed, so interrupted steps start over
+        self._resume_after = None
+
+        started_at = time.monotonic()
+        tokens_before = self.budget.tokens_spent if self.budget else 0
+
+        def apply_budget(agent: BaseAgent) -> None:
+            nonlocal started_at, tokens_before
+            # The agent the pool hands out gets the same share as any executor
+            self._apply_budget(agent)
+            started_at = time.monotonic()
+            tokens_before = self.budget.tokens_spent if self.budget else 0
+
+        def record_summary(agent: BaseAgent, result: str) -> None:
+            self._step_summaries[step_index] = self._summarize_step(agent, result)
+            if self.budget:
+                # A run cut short at max_steps resets the counter to 0
+                steps = agent.current_step or agent.max_steps
+                self.budget.record_agent_steps(
+                    steps,
+                    self.budget.tokens_spent - tokens_before,
+                    time.monotonic() - started_at,
+                )
+
+        try:
+            step_result = await asyncio.wait_for(
+                pool.run(step_prompt, on_finish=record_summary, on_start=apply_budget),
+                timeout=self._step_timeout(),
+            )
+            return step_result, True
+        except asyncio.TimeoutError:
+            return await self._stop_step(step_index), False
+        except Exception as e:
+            logger.error(f"Error executing step {step_index}: {e}")
+            self._publish(PlanEventType.STEP_FAILED, step_index, error=str(e))
+            return f"Error executing step {step_index}: {str(e)}", False
+
+    def _remaining_step_count(self) -> int:
+        plan = self.planning_tool.plans[self.active_plan_id]
+        active = PlanStepStatus.get_active_statuses()
+        return sum(1 for step in plan.steps if step.status in active)
+
+    def _step_timeout(self) -> Optional[float]:
+        """The next step's share of the time budget, or None without one"""
+        if not self.budget:
+            return None
+        return self.budget.step_timeout(self._remaining_step_count())
+
+    def _apply_budget(self, executor: BaseAgent) -> None:
+        """Fit the executor's `max_steps` to its share of the budget and switch it
+        to the fallback LLM once the budget is low."""
+        budget = self.budget
+        if not budget:
+            return
+        if id(executor) not in self._budget_defaults:
+            self._budget_defaults[id(executor)] = (
+                executor,
+                executor.max_steps,
+                executor.llm,
+            )
+        _, default_steps, _ = self._budget_defaults[id(executor)]
+        executor.max_steps = budget.max_agent_steps(
+            default_steps, self._remaining_step_count()
+        )
+        executor.current_step = 0
+
+        if budget.low and budget.fallback_llm:
+            fallback = LLM(config_name=budget.fallback_llm)
+            budget.track(fallback)
+            if executor.llm is not fallback:
+                logger.warning(
+                    f"Budget low ({budget.summary()}), switching {executor.name} "
+                    f"to the '{budget.fallback_llm}' model"
+                )
+                executor.llm = fallback
+                # The context budgeter is sized for the previous model
+                if getattr(executor, "context_budgeter", None):
+                    executor.context_budgeter = None
+            if self._flow_llm is None:
+                self._flow_llm = self.llm
+            self.llm = fallback
+
+    def _restore_executors(self) -> None:
+        """Undo budget adjustments to executors once the flow ends"""
+        for executor, max_steps, llm in self._budget_defaults.values():
+            executor.max_steps = max_steps
+            executor.llm = llm
+            if getattr(executor, "context_budgeter", None):
+                executor.context_budgeter = None
+        self._budget_defaults.clear()
+        if self._flow_llm is not None:
+            self.llm = self._flow_llm
+            self._flow_llm = None
+
+    async def _skip_for_budget(self, step_info: dict) -> Optional[str]:
+        """Skip an optional step once the budget is low; returns a note if skipped"""
+        if not (self.budget and step_info.get("optional") and self.budget.low):
+            return None
+        index = step_info["index"]
+        self._set_step_status(
+            index,
+            PlanStepStatus.BLOCKED.value,
+            notes="Skipped to stay within the flow budget",
+            event=PlanEventType.STEP_SKIPPED,
+        )
+        logger.warning(f"Budget low ({self.budget.summary()}), skipping step {index}")
+        return f"Skipped optional step {index}: {step_info['text']}"
+
+    async def _stop_step(
+        self, step_index: int, executor: Optional[BaseAgent] = None
+    ) -> str:
+        """Record a step cut off by its time budget, keeping what it reported"""
+        logger.warning(f"Step {step_index} ran out of its time budget")
+        partial = self._summarize_step(executor, "") if executor else ""
+        self._set_step_status(
+            step_index,
+            PlanStepStatus.BLOCKED.value,
+            notes=f"Stopped at its time budget. {partial}".strip(),
+        )
+        return f"Step {step_index} stopped at its time budget. Partial result: {partial or 'none'}"
+
+    async def _build_step_prompt(self, step_info: dict) -> str:
+        """Prompt asking an executor to carry out the step"""
+        step_index = step_info.get("index", self.current_step_index)
+        step_text = step_info.get("text", f"Step {step_index}")
+
+        if self.step_context == "compact":
+            return self._compact_step_prompt(step_index, step_text)
+
         # Prepare context for the agent with current plan status
         plan_status = await self._get_plan_text()
-        step_text = step_info.get("text", f"Step {self.current_step_index}")
 
         # Create a prompt for the agent to execute the current step
-        step_prompt = f"""
+        return f"""
         CURRENT PLAN STATUS:
         {plan_status}
 
         YOUR CURRENT TASK:
-        You are now working on step {self.current_step_index}: "{step_text}"
+        You are now working on step {step_index}: "{step_text}"
 
         Please execute this step using the appropriate tools. When you're done, provide a summary of what you accomplished.
         """
 
-        # Use agent.run() to execute the step
-        try:
-            step_result = await executor.run(step_prompt)
-
-            # Mark the step as completed after successful execution
-            await self._mark_step_completed()
-
-            return step_result
-        except Exception as e:
-            logger.error(f"Error executing step {self.current_step_index}: {e}")
-            return f"Error executing step {self.current_step_index}: {str(e)}"
+    def _summarize_step(self, executor: BaseAgent, result: str) -> str:
+        """The executor's last remark on the step, as asked for in the step prompt,
+        shortened to `summary_chars`; falls back to the end of the step result."""
+        text = next(
+            (
+                message.content
+                for message in reversed(executor.memory.messages)
+                if message.role == Role.ASSISTANT and message.content
+            ),
+            result,
+        )
+        text = " ".join(text.split())
+        if len(text) <= self.summary_chars:
+            return text
+        return "..." + text[len(text) - self.summary_chars :]
+
+    def _compact_step_prompt(self, step_index: int, step_text: str) -> str:
+        """Step prompt with recent results and remaining steps instead of the full plan"""
+        plan = self.planning_tool.plans[self.active_plan_id]
+        completed = plan.count(PlanStepStatus.COMPLETED.value)
+        lines = [f"PLAN: {plan.title} ({completed}/{len(plan.steps)} steps completed)"]
+
+        recent = plan.recently_completed(self.summary_steps)
+        if recent:
+            lines.append("\nCOMPLETED STEPS:")
+            if completed > len(recent):
+                lines.append(f"({completed - len(recent)} earlier steps omitted)")
+            for i in recent:
+                summary = self._step_summaries.get(i) or plan.steps[i].notes
+                lines.append(f"{i}. {plan.steps[i].text}")
+                if summary:
+                    lines.append(f"   Result: {summary}")
+
+        active = PlanStepStatus.get_active_statuses()
+        remaining = plan.upcoming_steps(self.remaining_steps, skip=step_index)
+        if remaining:
+            lines.append("\nREMAINING STEPS:")
+            lines.extend(f"{i}. {plan.steps[i].text}" for i in remaining)
+            more = plan.count(*active) - len(remaining)
+            if plan.steps[step_index].status in active:
+                more -= 1
+            if more > 0:
+                lines.append(f"(and {more} more steps)")
+
+        lines.append(
+            f'\nYOUR CURRENT TASK:\nYou are now working on step {step_index}: "{step_text}"'
+            "\n\nPlease execute this step using the appropriate tools. When you're "
+            "done, provide a summary of what you accomplished."
+        )
+        return "\n".join(lines)
 
-    async def _mark_step_completed(self) -> None:
-        """Mark the current step as completed."""
-        if self.current_step_index is None:
+    async def _mark_step_completed(self, step_index: Optional[int] = None) -> None:
+        """Mark a step (by default the current one) as completed."""
+        if step_index is None:
+            step_index = self.current_step_index
+        if step_index is None:
             return
 
+        self._set_step_status(step_index, PlanStepStatus.COMPLETED.value)
+        logger.info(
+            f"Marked step {step_index} as completed in plan {self.active_plan_id}"
+        )
+        if self.speculative:
+            # Chained so steps are folded in completion order
+            self._unfolded_steps.append(step_index)
+            self._progress_summary = asyncio.create_task(
+                self._summarize_progress(self._progress_summary, step_index)
+            )
+
+    async def _summarize_progress(
+        self, previous: Optional[asyncio.Task], step_index: int
+    ) -> str:
+        """The running summary with `step_index` folded in"""
+        summary = await previous if previous else ""
+        step = self.planning_tool.plans[self.active_plan_id].steps[step_index]
+        step_result = self._step_summaries.get(step_index) or step.notes
+        folded = f"{summary}\n{self._step_line(step_index)}".strip()
+        if not (self.budget and self.budget.low):
+            try:
+                folded = await self.llm.ask(
+                    messages=[
+                        Message.user_message(
+                            f"Summary so far:\n{summary or '(nothing yet)'}\n\n"
+                            f'Step {step_index} "{step.text}" is now completed. '
+                            f"Its result: {step_result or 'not reported'}\n\n"
+                            "Rewrite the summary so that it includes this step. "
+                            "Keep it brief and keep the facts from earlier steps."
+                        )
+                    ],
+                    system_msgs=[
+                        Message.system_message(
+                            "You are a planning assistant. Your task is to keep a "
+                            "running summary of what a plan has accomplished."
+                        )
+                    ],
+                )
+            except Exception as e:
+                logger.warning(f"Error updating the progress summary: {e}")
+        self._summary_so_far = folded
+        self._unfolded_steps.remove(step_index)
+        return folded
+
+    def _step_line(self, step_index: int) -> str:
+        """A completed step and its result as a plain summary line"""
+        step = self.planning_tool.plans[self.active_plan_id].steps[step_index]
+        step_result = self._step_summaries.get(step_index) or step.notes
+        return f"- {step.text}: {step_result}"
+
+    async def _merged_summary(self) -> Optional[str]:
+        """The running summary merged with the plan's final status, or None
+        when speculation is off or nothing was summarized"""
+        if not (self.speculative and self._progress_summary):
+            return None
+        timeout = self.summary_wait
+        if self.budget and self.budget.reserve_seconds() is not None:
+            timeout = min(timeout, self.budget.reserve_seconds())
         try:
-            # Mark the step as completed
-            await self.planning_tool.execute(
-                command="mark_step",
-                plan_id=self.active_plan_id,
-                step_index=self.current_step_index,
-                step_status=PlanStepStatus.COMPLETED.value,
+            summary = await asyncio.wait_for(self._progress_summary, timeout=timeout)
+        except asyncio.TimeoutError:
+            # The pending folds are cancelled; their steps go in unfolded
+            logger.warning(
+                f"Progress summary not done after {timeout:.1f}s, appending "
+                f"{len(self._unfolded_steps)} step results as they are"
             )
-            logger.info(
-                f"Marked step {self.current_step_index} as completed in plan {self.active_plan_id}"
+            summary = "\n".join(
+                [self._summary_so_far]
+                + [self._step_line(index) for index in self._unfolded_steps]
+            ).strip()
+        plan = self.planning_tool.plans[self.active_plan_id]
+        statuses = plan["step_statuses"]
+        completed = statuses.count(PlanStepStatus.COMPLETED.value)
+        lines = [f"{completed}/{len(statuses)} steps completed.", "", summary]
+        blocked = [
+            f"- Step {i}: {step.text}" + (f" ({step.notes})" if step.notes else "")
+            for i, step in enumerate(plan.steps)
+            if step.status == PlanStepStatus.BLOCKED.value
+        ]
+        if blocked:
+            lines += ["", "Not completed:"] + blocked
+        return "\n".join(lines)
+
+    def _set_step_status(
+        self,
+        step_index: int,
+        status: str,
+        notes: Optional[str] = None,
+        event: Optional[PlanEventType] = None,
+    ) -> None:
+        """Update a step in place, without re-rendering the plan, and publish the
+        change; `event` overrides the event type implied by the status."""
+        plan = self.planning_tool.plans[self.active_plan_id]
+        with self.planning_tool.plans.batch():
+            plan.set_status(step_index, status)
+            if notes is not None:
+                plan.set_notes(step_index, notes)
+        event = event or _STATUS_EVENTS.get(status)
+        if event:
+            detail = {"notes": notes} if notes else {}
+            self._publish(event, step_index, **detail)
+
+    def _publish(
+        self, event_type: PlanEventType, step_index: Optional[int] = None, **detail
+    ) -> None:
+        if not self.events:
+            return
+        step_text = None
+        if step_index is not None and self.active_plan_id in self.planning_tool.plans:
+            step_text = (
+                self.planning_tool.plans[self.active_plan_id].steps[step_index].text
             )
-        except Exception as e:
-            logger.warning(f"Failed to update plan status: {e}")
-            # Update step status directly in planning tool storage
-            if self.active_plan_id in self.planning_tool.plans:
-                plan_data = self.planning_tool.plans[self.active_plan_id]
-                step_statuses = plan_data.get("step_statuses", [])
-
-                # Ensure the step_statuses list is long enough
-                while len(step_statuses) <= self.current_step_index:
-                    step_statuses.append(PlanStepStatus.NOT_STARTED.value)
-
-                # Update the status
-                step_statuses[self.current_step_index] = PlanStepStatus.COMPLETED.value
-                plan_data["step_statuses"] = step_statuses
+        self.events.publish(
+            PlanEvent(
+                type=event_type,
+                plan_id=self.active_plan_id,
+                step_index=step_index,
+                step_text=step_text,
+                detail=detail,
+            )
+        )
 
     async def _get_plan_text(self) -> str:
-        """Get the current plan as formatted text."""
+        """Get the current plan as formatted text, cached until the plan changes."""
         try:
-            result = await self.planning_tool.execute(
-                command="get", plan_id=self.active_plan_id
-            )
-            return result.output if hasattr(result, "output") else str(result)
+            return self.planning_tool.plans[self.active_plan_id].render()
         except Exception as e:
             logger.error(f"Error getting plan: {e}")
             return self._generate_plan_text_from_storage()
@@ -385,8 +1003,49 @@ class PlanningFlow(BaseFlow):
             logger.error(f"Error generating plan text from storage: {e}")
             return f"Error: Unable to retrieve plan with ID {self.active_plan_id}"
 
+    async def _finalize_partial(self, reason: str) -> str:
+        """Summarize an unfinished plan; never fails and never exceeds the budget"""
+        if self._progress_summary and self._progress_summary.done():
+            return f"Plan stopped early ({reason}):\n\n{await self._merged_summary()}"
+        plan_text = await self._get_plan_text()
+        if not (self.budget and self.budget.over_limit):
+            try:
+                response = await asyncio.wait_for(
+                    self.llm.ask(
+                        messages=[
+                            Message.user_message(
+                                f"The plan was stopped early ({reason}). Here is its status:\n\n{plan_text}\n\n"
+                                "Please summarize what was accomplished and what remains."
+                            )
+                        ],
+                        system_msgs=[
+                            Message.system_message(
+                                "You are a planning assistant. Your task is to summarize a partially completed plan."
+                            )
+                        ],
+                    ),
+                    timeout=self.budget.reserve_seconds() if self.budget else None,
+                )
+                return f"Plan stopped early ({reason}):\n\n{response}"
+            except Exception as e:
+                logger.error(f"Error summarizing partial plan with LLM: {e}")
+
+        return (
+            f"Plan stopped early ({reason}). Status:\n\n{plan_text}\n"
+            f"{self._step_results()}"
+        )
+
+    def _step_results(self) -> str:
+        return "\n".join(
+            f"- Step {index}: {summary}"
+            for index, summary in sorted(self._step_summaries.items())
+        )
+
     async def _finalize_plan(self) -> str:
         """Finalize the plan and provide a summary using the flow's LLM directly."""
+        merged = await self._merged_summary()
+        if merged is not None:
+            return f"Plan completed:\n\n{merged}"
         plan_text = await self._get_plan_text()
 
         # Create a summary using the flow's LLM directly
@@ -399,13 +1058,17 @@ class PlanningFlow(BaseFlow):
                 f"The plan has been completed. Here is the final plan status:\n\n{plan_text}\n\nPlease provide a summary of what was accomplished and any final thoughts."
             )
 
-            response = await self.llm.ask(
-                messages=[user_message], system_msgs=[system_message]
+            response = await asyncio.wait_for(
+                self.llm.ask(messages=[user_message], system_msgs=[system_message]),
+                timeout=self.budget.reserve_seconds() if self.budget else None,
             )
 
             return f"Plan completed:\n\n{response}"
         except Exception as e:
-            logger.error(f"Error finalizing plan with LLM: {e}")
+            logger.error(f"Error finalizing plan with LLM: {e!r}")
+            if self.budget:
+                # The budget leaves no time for a second attempt with an agent
+                return f"Plan completed. Status:\n\n{plan_text}\n{self._step_results()}"
 
             # Fallback to using an agent for the summary
             try:
@@ -0,0 +1,161 @@
+"""Content-addressed store for base64 images referenced by messages.
+
+Messages keep a short reference (the SHA-256 of the image data) instead of the
+base64 payload. Each distinct image is held once in a bounded in-memory LRU;
+images evicted from memory are spilled to a temporary directory and loaded
+back on demand. The spill directory is bounded too: past `max_disk_bytes` the
+least recently used spilled images are deleted, and spill directories left
+behind by runs that did not exit cleanly are removed once they go stale.
+"""
+
+import atexit
+import hashlib
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from app.logger import logger
+
+
+DEFAULT_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 512 * 1024 * 1024
+# Spill directories untouched for this long belong to runs that have ended
+STALE_SPILL_SECONDS = 24 * 60 * 60
+SPILL_DIR_PREFIX = "openmanus-images-"
+
+
+class ImageStore:
+    """Bounded LRU of base64 images keyed by content hash, with disk spill.
+
+    Attributes:
+        max_memory_bytes: Total size of base64 data kept in memory.
+        max_disk_bytes: Total size of base64 data kept in the spill directory.
+        spills: Number of images written to disk after eviction.
+        loads: Number of images read back from disk.
+        drops: Number of spilled images deleted to stay within `max_disk_bytes`.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+        spill_dir: Optional[Path] = None,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._spill_dir = Path(spill_dir) if spill_dir else None
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._memory_bytes = 0
+        # Spilled refs and their sizes, least recently used first
+        self._spilled: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.spills = 0
+        self.loads = 0
+        self.drops = 0
+
+    @staticmethod
+    def ref_for(data: str) -> str:
+        """Content address of a base64 image"""
+        return hashlib.sha256(data.encode("ascii")).hexdigest()
+
+    def put(self, data: str) -> str:
+        """Store a base64 image and return its reference"""
+        ref = self.ref_for(data)
+        with self._lock:
+            if ref in self._memory:
+                self._memory.move_to_end(ref)
+            elif ref not in self._spilled:
+                self._memory[ref] = data
+                self._memory_bytes += len(data)
+                self._evict()
+        return ref
+
+    def get(self, ref: str) -> Optional[str]:
+        """Return the base64 data for `ref`, loading it from disk if spilled"""
+        with self._lock:
+            data = self._memory.get(ref)
+            if data is not None:
+                self._memory.move_to_end(ref)
+                return data
+            if ref not in self._spilled:
+                return None
+            try:
+                data = self._spill_path(ref).read_text(encoding="ascii")
+            except OSError as e:
+                logger.warning(f"Spilled image {ref[:12]} is gone: {e}")
+                self._disk_bytes -= self._spilled.pop(ref)
+                return None
+            self._spilled.move_to_end(ref)
+            self.loads += 1
+            return data
+
+    def __contains__(self, ref: str) -> bool:
+        return ref in self._memory or ref in self._spilled
+
+    def __len__(self) -> int:
+        return len(self._memory) + len(self._spilled)
+
+    def clear(self) -> None:
+        """Drop all images, including spilled ones"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for ref in self._spilled:
+                self._spill_path(ref).unlink(missing_ok=True)
+            self._spilled.clear()
+            self._disk_bytes = 0
+
+    def _spill_path(self, ref: str) -> Path:
+        if self._spill_dir is None:
+            remove_stale_spill_dirs()
+            self._spill_dir = Path(tempfile.mkdtemp(prefix=SPILL_DIR_PREFIX))
+            atexit.register(shutil.rmtree, self._spill_dir, ignore_errors=True)
+        return self._spill_dir / f"{ref}.b64"
+
+    def _evict(self) -> None:
+        """Spill least recently used images until memory is within bounds"""
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            ref, data = self._memory.popitem(last=False)
+            self._memory_bytes -= len(data)
+            path = self._spill_path(ref)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(data, encoding="ascii")
+            self._spilled[ref] = len(data)
+            self._disk_bytes += len(data)
+            self.spills += 1
+            logger.debug(f"Spilled image {ref[:12]} to {path}")
+
+        while self._disk_bytes > self.max_disk_bytes and len(self._spilled) > 1:
+            ref, size = self._spilled.popitem(last=False)
+            self._spill_path(ref).unlink(missing_ok=True)
+            self._disk_bytes -= size
+            self.drops += 1
+            logger.debug(f"Deleted spilled image {ref[:12]} to stay within disk bound")
+
+
+def remove_stale_spill_dirs(max_age: float = STALE_SPILL_SECONDS) -> int:
+    """Remove spill directories of earlier runs that were not cleaned up at exit.
+
+    A directory counts as stale when nothing was spilled to it or deleted from
+    it for `max_age` seconds. Returns the number of directories removed.
+    """
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in Path(tempfile.gettempdir()).glob(f"{SPILL_DIR_PREFIX}*"):
+        try:
+            if path.is_dir() and path.stat().st_mtime < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            continue
+    if removed:
+        logger.info(f"Removed {removed} stale image spill directories")
+    return removed
+
+
+image_store = ImageStore()
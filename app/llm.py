@@ -1,3 +1,4 @@
+import json
 import math
 from typing import Dict, List, Optional, Union
 
@@ -22,13 +23,17 @@ from app.bedrock import BedrockClient
 from app.config import LLMSettings, config
 from app.exceptions import TokenLimitExceeded
 from app.logger import logger  # Assuming a logger is set up in your app
+from app.replay import RecordReplayTransport, ReplayClient
 from app.schema import (
     ROLE_VALUES,
     TOOL_CHOICE_TYPE,
     TOOL_CHOICE_VALUES,
     Message,
     ToolChoice,
+    recent_image_indices,
 )
+from app.singleflight import SingleFlight
+from app.tracing import tracer
 
 
 REASONING_MODELS = ["o1", "o3-mini"]
@@ -41,6 +46,41 @@ MULTIMODAL_MODELS = [
     "claude-3-haiku-20240307",
 ]
 
+# Context window sizes (input + output tokens), matched by model name prefix
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4-vision-preview": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "o1": 200000,
+    "o3-mini": 200000,
+    "claude": 200000,
+    "us.anthropic.claude": 200000,
+    "anthropic.claude": 200000,
+    "llama3": 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 32000
+
+# Cache breakpoint marker; BedrockClient sends it on as a `cachePoint` block
+CACHE_CONTROL = {"type": "ephemeral"}
+# Bedrock models that accept cache points on system prompts and tools; others
+# reject requests containing them
+BEDROCK_CACHE_MODELS = [
+    "claude-3-5-haiku",
+    "claude-3-7-sonnet",
+    "claude-sonnet-4",
+    "claude-opus-4",
+]
+
+
+def get_context_window(model: str) -> int:
+    """Look up the context window of a model by longest matching name prefix"""
+    matches = [prefix for prefix in MODEL_CONTEXT_WINDOWS if model.startswith(prefix)]
+    if not matches:
+        return DEFAULT_CONTEXT_WINDOW
+    return MODEL_CONTEXT_WINDOWS[max(matches, key=len)]
+
 
 class TokenCounter:
     # Token constants
@@ -196,15 +236,23 @@ class LLM:
             self.api_key = llm_config.api_key
             self.api_version = llm_config.api_version
             self.base_url = llm_config.base_url
+            self.prompt_cache = getattr(llm_config, "prompt_cache", True)
+            self.coalesce_requests = getattr(llm_config, "coalesce_requests", True)
+            self.max_inline_images = getattr(llm_config, "max_inline_images", 3)
+            self.single_flight = SingleFlight()
 
             # Add token counting related attributes
             self.total_input_tokens = 0
             self.total_completion_tokens = 0
+            self.total_cached_tokens = 0
             self.max_input_tokens = (
                 llm_config.max_input_tokens
                 if hasattr(llm_config, "max_input_tokens")
                 else None
             )
+            self.context_window = getattr(
+                llm_config, "context_window", None
+            ) or get_context_window(self.model)
 
             # Initialize tokenizer
             try:
@@ -213,7 +261,12 @@ class LLM:
                 # If the model is not in tiktoken's presets, use cl100k_base as default
                 self.tokenizer = tiktoken.get_encoding("cl100k_base")
 
-            if self.api_type == "azure":
+            transport = RecordReplayTransport.from_settings(llm_config)
+
+            if transport and transport.mode == "replay":
+                # Serve recorded responses only, no network client needed
+                self.client = None
+            elif self.api_type == "azure":
                 self.client = AsyncAzureOpenAI(
                     base_url=self.base_url,
                     api_key=self.api_key,
@@ -224,6 +277,10 @@ class LLM:
             else:
                 self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
 
+            if transport:
+                logger.info(f"LLM '{config_name}' in {transport.mode} mode")
+                self.client = ReplayClient(self.client, transport)
+
             self.token_counter = TokenCounter(self.tokenizer)
 
     def count_tokens(self, text: str) -> int:
@@ -235,16 +292,125 @@ class LLM:
     def count_message_tokens(self, messages: List[dict]) -> int:
         return self.token_counter.count_message_tokens(messages)
 
-    def update_token_count(self, input_tokens: int, completion_tokens: int = 0) -> None:
-        """Update token counts"""
+    def update_token_count(
+        self, input_tokens: int, completion_tokens: int = 0, cached_tokens: int = 0
+    ) -> None:
+        """Update token counts, including input tokens served from the prompt cache"""
         # Only track tokens if max_input_tokens is set
         self.total_input_tokens += input_tokens
         self.total_completion_tokens += completion_tokens
+        self.total_cached_tokens += cached_tokens
         logger.info(
             f"Token usage: Input={input_tokens}, Completion={completion_tokens}, "
             f"Cumulative Input={self.total_input_tokens}, Cumulative Completion={self.total_completion_tokens}, "
             f"Total={input_tokens + completion_tokens}, Cumulative Total={self.total_input_tokens + self.total_completion_tokens}"
         )
+        if cached_tokens:
+            logger.info(
+                f"Prompt cache: Read={cached_tokens} ({cached_tokens / max(input_tokens, 1):.0%} of input), "
+                f"Cumulative Read={self.total_cached_tokens}"
+            )
+
+    async def _create(self, params: dict):
+        """Send a non-streaming request, joining an identical one already in flight.
+
+        Returns:
+            The response and whether this call made the request; token usage is
+            only counted by the caller that made it.
+        """
+        with tracer.span("llm.request", model=self.model) as span:
+            if not self.coalesce_requests:
+                response = await self.client.chat.completions.create(**params)
+                owner = True
+            else:
+                key = self.single_flight.request_key(params)
+                response, owner = await self.single_flight.do(
+                    key, lambda: self.client.chat.completions.create(**params)
+                )
+                if not owner:
+                    logger.info(
+                        f"Coalesced identical in-flight request "
+                        f"({self.single_flight.coalesced} API calls saved so far)"
+                    )
+
+            usage = getattr(response, "usage", None)
+            if span.recording:
+                span.set_attributes(
+                    request_bytes=len(json.dumps(params["messages"], default=str)),
+                    coalesced=not owner,
+                )
+                if usage and owner:
+                    span.set_attributes(
+                        input_tokens=usage.prompt_tokens,
+                        completion_tokens=usage.completion_tokens,
+                        cached_tokens=self.get_cached_tokens(usage),
+                    )
+            return response, owner
+
+    @staticmethod
+    def get_cached_tokens(usage) -> int:
+        """Extract the number of prompt tokens read from the provider cache"""
+        if usage is None:
+            return 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details else None
+        if cached is None:
+            # Anthropic-style usage block
+            cached = getattr(usage, "cache_read_input_tokens", None)
+        return cached or 0
+
+    @property
+    def supports_cache_control(self) -> bool:
+        """Whether requests need explicit cache breakpoints.
+
+        Only Bedrock reads them, and only for models with prompt caching.
+        OpenAI-compatible endpoints (Anthropic's included) ignore `cache_control`
+        on tools and system content.
+        """
+        model = self.model.lower()
+        return self.api_type == "aws" and any(
+            name in model for name in BEDROCK_CACHE_MODELS
+        )
+
+    def apply_prompt_cache(
+        self, messages: List[dict], tools: Optional[List[dict]] = None
+    ) -> tuple[List[dict], Optional[List[dict]]]:
+        """
+        Mark the stable prompt prefix (system messages and tool schemas) as cacheable.
+
+        OpenAI-compatible endpoints cache prefixes automatically, so they only need
+        the prefix to stay byte-identical between calls (system messages first,
+        memoized tool list) and get no markers. Bedrock needs an explicit
+        breakpoint at the end of the prefix, for the models that support one.
+        The inputs are not mutated; the memoized tool list is shared between steps.
+        """
+        if not self.prompt_cache or not self.supports_cache_control:
+            return messages, tools
+
+        last_system = None
+        for i, message in enumerate(messages):
+            if message.get("role") != "system":
+                break
+            last_system = i
+
+        if last_system is not None:
+            message = dict(messages[last_system])
+            content = message.get("content")
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            elif isinstance(content, list):
+                content = [dict(item) for item in content]
+            if content:
+                content[-1]["cache_control"] = CACHE_CONTROL
+                message["content"] = content
+                messages = (
+                    messages[:last_system] + [message] + messages[last_system + 1 :]
+                )
+
+        if tools:
+            tools = tools[:-1] + [{**tools[-1], "cache_control": CACHE_CONTROL}]
+
+        return messages, tools
 
     def check_token_limit(self, input_tokens: int) -> bool:
         """Check if token limits are exceeded"""
@@ -265,7 +431,9 @@ class LLM:
 
     @staticmethod
     def format_messages(
-        messages: List[Union[dict, Message]], supports_images: bool = False
+        messages: List[Union[dict, Message]],
+        supports_images: bool = False,
+        max_images: Optional[int] = None,
     ) -> List[dict]:
         """
         Format messages for LLM by converting them to OpenAI message format.
@@ -273,6 +441,7 @@ class LLM:
         Args:
             messages: List of messages that can be either dict or Message objects
             supports_images: Flag indicating if the target model supports image inputs
+            max_images: Inline only the most recent N images (None for all)
 
         Returns:
             List[dict]: List of formatted messages in OpenAI format
@@ -291,10 +460,21 @@ class LLM:
         """
         formatted_messages = []
 
-        for message in messages:
+        inline_images = recent_image_indices(messages, max_images)
+
+        for index, message in enumerate(messages):
             # Convert Message objects to dictionaries
             if isinstance(message, Message):
-                message = message.to_dict()
+                message = message.to_dict(
+                    include_image=supports_images and index in inline_images
+                )
+            elif isinstance(message, dict):
+                # Copy so the caller's dict is not modified when inlining the image
+                message = {
+                    k: v
+                    for k, v in message.items()
+                    if k != "base64_image" or index in inline_images
+                }
 
             if isinstance(message, dict):
                 # If message is a dict, ensure it has required fields
@@ -351,6 +531,7 @@ class LLM:
 
         return formatted_messages
 
+    @tracer.traced("llm.ask")
     @retry(
         wait=wait_random_exponential(min=1, max=60),
         stop=stop_after_attempt(6),
@@ -389,10 +570,18 @@ class LLM:
 
             # Format system and user messages with image support check
             if system_msgs:
-                system_msgs = self.format_messages(system_msgs, supports_images)
-                messages = system_msgs + self.format_messages(messages, supports_images)
+                system_msgs = self.format_messages(
+                    system_msgs, supports_images, self.max_inline_images
+                )
+                messages = system_msgs + self.format_messages(
+                    messages, supports_images, self.max_inline_images
+                )
             else:
-                messages = self.format_messages(messages, supports_images)
+                messages = self.format_messages(
+                    messages, supports_images, self.max_inline_images
+                )
+
+            messages, _ = self.apply_prompt_cache(messages)
 
             # Calculate input token count
             input_tokens = self.count_message_tokens(messages)
@@ -418,17 +607,18 @@ class LLM:
 
             if not stream:
                 # Non-streaming request
-                response = await self.client.chat.completions.create(
-                    **params, stream=False
-                )
+                response, owner = await self._create({**params, "stream": False})
 
                 if not response.choices or not response.choices[0].message.content:
                     raise ValueError("Empty or invalid response from LLM")
 
                 # Update token counts
-                self.update_token_count(
-                    response.usage.prompt_tokens, response.usage.completion_tokens
-                )
+                if owner:
+                    self.update_token_count(
+                        response.usage.prompt_tokens,
+                        response.usage.completion_tokens,
+                        self.get_cached_tokens(response.usage),
+                    )
 
                 return response.choices[0].message.content
 
@@ -478,6 +668,7 @@ class LLM:
             logger.exception(f"Unexpected error in ask")
             raise
 
+    @tracer.traced("llm.ask_with_images")
     @retry(
         wait=wait_random_exponential(min=1, max=60),
         stop=stop_after_attempt(6),
@@ -521,7 +712,9 @@ class LLM:
                 )
 
             # Format messages with image support
-            formatted_messages = self.format_messages(messages, supports_images=True)
+            formatted_messages = self.format_messages(
+                messages, supports_images=True, max_images=self.max_inline_images
+            )
 
             # Ensure the last message is from the user to attach images
             if not formatted_messages or formatted_messages[-1]["role"] != "user":
@@ -561,7 +754,11 @@ class LLM:
             # Add system messages if provided
             if system_msgs:
                 all_messages = (
-                    self.format_messages(system_msgs, supports_images=True)
+                    self.format_messages(
+                        system_msgs,
+                        supports_images=True,
+                        max_images=self.max_inline_images,
+                    )
                     + formatted_messages
                 )
             else:
@@ -590,12 +787,16 @@ class LLM:
 
             # Handle non-streaming request
             if not stream:
-                response = await self.client.chat.completions.create(**params)
+                response, owner = await self._create(params)
 
                 if not response.choices or not response.choices[0].message.content:
                     raise ValueError("Empty or invalid response from LLM")
 
-                self.update_token_count(response.usage.prompt_tokens)
+                if owner:
+                    self.update_token_count(
+                        response.usage.prompt_tokens,
+                        cached_tokens=self.get_cached_tokens(response.usage),
+                    )
                 return response.choices[0].message.content
 
             # Handle streaming request
@@ -634,6 +835,7 @@ class LLM:
             logger.error(f"Unexpected error in ask_with_images: {e}")
             raise
 
+    @tracer.traced("llm.ask_tool")
     @retry(
         wait=wait_random_exponential(min=1, max=60),
         stop=stop_after_attempt(6),
@@ -681,22 +883,30 @@ class LLM:
             supports_images = self.model in MULTIMODAL_MODELS
 
             # Format messages
-            if system_msgs:
-                system_msgs = self.format_messages(system_msgs, supports_images)
-                messages = system_msgs + self.format_messages(messages, supports_images)
-            else:
-                messages = self.format_messages(messages, supports_images)
+            with tracer.span("llm.format_messages", messages=len(messages)) as span:
+                if system_msgs:
+                    system_msgs = self.format_messages(
+                        system_msgs, supports_images, self.max_inline_images
+                    )
+                    messages = system_msgs + self.format_messages(
+                        messages, supports_images, self.max_inline_images
+                    )
+                else:
+                    messages = self.format_messages(
+                        messages, supports_images, self.max_inline_images
+                    )
 
-            # Calculate input token count
-            input_tokens = self.count_message_tokens(messages)
+                # Calculate input token count
+                input_tokens = self.count_message_tokens(messages)
 
-            # If there are tools, calculate token count for tool descriptions
-            tools_tokens = 0
-            if tools:
-                for tool in tools:
-                    tools_tokens += self.count_tokens(str(tool))
+                # If there are tools, calculate token count for tool descriptions
+                tools_tokens = 0
+                if tools:
+                    for tool in tools:
+                        tools_tokens += self.count_tokens(str(tool))
 
-            input_tokens += tools_tokens
+                input_tokens += tools_tokens
+                span.set_attribute("estimated_input_tokens", input_tokens)
 
             # Check if token limits are exceeded
             if not self.check_token_limit(input_tokens):
@@ -710,6 +920,9 @@ class LLM:
                     if not isinstance(tool, dict) or "type" not in tool:
                         raise ValueError("Each tool must be a dict with 'type' field")
 
+            # Mark the system prompt + tool schemas prefix as cacheable
+            messages, tools = self.apply_prompt_cache(messages, tools)
+
             # Set up the completion request
             params = {
                 "model": self.model,
@@ -729,9 +942,7 @@ class LLM:
                 )
 
             params["stream"] = False  # Always use non-streaming for tool requests
-            response: ChatCompletion = await self.client.chat.completions.create(
-                **params
-            )
+            response, owner = await self._create(params)
 
             # Check if response is valid
             if not response.choices or not response.choices[0].message:
@@ -740,9 +951,12 @@ class LLM:
                 return None
 
             # Update token counts
-            self.update_token_count(
-                response.usage.prompt_tokens, response.usage.completion_tokens
-            )
+            if owner:
+                self.update_token_count(
+                    response.usage.prompt_tokens,
+                    response.usage.completion_tokens,
+                    self.get_cached_tokens(response.usage),
+                )
 
             return response.choices[0].message
 
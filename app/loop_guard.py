@@ -0,0 +1,152 @@
+"""Loop detection with escalating intervention for tool-calling agents.
+
+Every step is fingerprinted by its tool calls (name plus canonical JSON
+arguments), the hashes of the observations they produced and, for steps without
+tool calls, the assistant text. A tool call only counts as repeated when the
+same call already produced the same observation: scrolling a page that keeps
+changing, or viewing a file again after editing it, is progress. A step whose
+calls all repeat, that only produces observations already seen, or that
+restates earlier text counts as a strike; a step that does something new
+clears them. Consecutive strikes
+escalate from a strategy hint, to removing the repeated tools from the next
+request, to stopping the run early with what it has so far.
+"""
+
+import hashlib
+import json
+from collections import Counter
+from enum import Enum
+from typing import List, Optional, Set
+
+from app.schema import ToolCall
+
+
+class LoopAction(str, Enum):
+    """Intervention requested by the loop guard after a step"""
+
+    NONE = "none"
+    HINT = "hint"
+    RESTRICT_TOOLS = "restrict_tools"
+    TERMINATE = "terminate"
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _call_fingerprint(call: ToolCall) -> str:
+    """Tool name plus arguments, insensitive to key order and whitespace"""
+    arguments = call.function.arguments or ""
+    try:
+        arguments = json.dumps(json.loads(arguments), sort_keys=True)
+    except (TypeError, ValueError):
+        arguments = arguments.strip()
+    return _digest(f"{call.function.name}:{arguments}")
+
+
+class LoopGuard:
+    """Tracks step fingerprints and escalates on consecutive repeats.
+
+    Attributes:
+        hint_after: Consecutive repeated steps before a strategy hint.
+        restrict_after: Consecutive repeated steps before the repeated tools
+            are withheld from the next request.
+        terminate_after: Consecutive repeated steps before the run is stopped.
+        strikes: Current number of consecutive repeated steps.
+        blocked_tools: Tools withheld from the next request.
+        min_observation_chars: Shorter observations (e.g. bare success
+            messages) are too generic to signal a loop and are ignored.
+        steps_flagged: Total repeated steps seen since the last reset.
+    """
+
+    def __init__(
+        self,
+        hint_after: int = 1,
+        restrict_after: int = 2,
+        terminate_after: int = 4,
+        min_observation_chars: int = 64,
+    ):
+        if not 0 < hint_after <= restrict_after <= terminate_after:
+            raise ValueError(
+                "Expected 0 < hint_after <= restrict_after <= terminate_after"
+            )
+        self.hint_after = hint_after
+        self.restrict_after = restrict_after
+        self.terminate_after = terminate_after
+        self.min_observation_chars = min_observation_chars
+        self.reset()
+
+    def reset(self) -> None:
+        self._actions: Counter = Counter()
+        self._observations: Counter = Counter()
+        self._texts: Counter = Counter()
+        self.strikes = 0
+        self.blocked_tools: Set[str] = set()
+        self.steps_flagged = 0
+        self.last_action = LoopAction.NONE
+
+    def record_step(
+        self,
+        tool_calls: List[ToolCall],
+        observations: List[str],
+        content: Optional[str] = None,
+    ) -> LoopAction:
+        """Record one step and return the intervention it calls for.
+
+        Args:
+            tool_calls: Tool calls made in the step.
+            observations: Results returned by those tool calls.
+            content: Assistant text, used when the step made no tool calls.
+        """
+        repeated_tools = set()
+        repeated_calls = 0
+        for i, call in enumerate(tool_calls):
+            # The same call with a different result means the state moved on
+            observation = observations[i] if i < len(observations) else ""
+            fingerprint = _digest(
+                f"{_call_fingerprint(call)}:{_digest(observation or '')}"
+            )
+            if self._actions[fingerprint]:
+                repeated_tools.add(call.function.name)
+                repeated_calls += 1
+            self._actions[fingerprint] += 1
+
+        observation_hashes = [
+            _digest(text)
+            for text in observations
+            if text and len(text) >= self.min_observation_chars
+        ]
+        stale_observations = bool(observation_hashes) and all(
+            self._observations[digest] for digest in observation_hashes
+        )
+        self._observations.update(observation_hashes)
+
+        repeated_text = False
+        if not tool_calls and content:
+            text_hash = _digest(content.strip())
+            repeated_text = bool(self._texts[text_hash])
+            self._texts[text_hash] += 1
+
+        repeated = (
+            (tool_calls and repeated_calls == len(tool_calls))
+            or stale_observations
+            or repeated_text
+        )
+        if not repeated:
+            self.strikes = 0
+            self.blocked_tools.clear()
+            self.last_action = LoopAction.NONE
+            return self.last_action
+
+        self.strikes += 1
+        self.steps_flagged += 1
+        if self.strikes >= self.terminate_after:
+            self.last_action = LoopAction.TERMINATE
+        elif self.strikes >= self.restrict_after:
+            self.blocked_tools |= repeated_tools or {
+                call.function.name for call in tool_calls
+            }
+            self.last_action = LoopAction.RESTRICT_TOOLS
+        elif self.strikes >= self.hint_after:
+            self.last_action = LoopAction.HINT
+        return self.last_action
@@ -0,0 +1,178 @@
+"""Content-aware compression of tool observations.
+
+Large tool outputs are reduced before they enter the agent's memory, with a
+reducer chosen by content type: HTML is converted to text, delimited tables
+keep their schema plus head and tail rows, and logs have repeated lines
+collapsed. Anything still over the limit keeps its head and tail. When an
+output is reduced, the full text is written to a file under the workspace and
+the observation says where, so the agent can page through it with the editor's
+`view_range` or read it with Python.
+"""
+
+import csv
+import hashlib
+import io
+import re
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+from app.config import config
+from app.logger import logger
+
+
+SPILL_NOTE = (
+    "\n[Output reduced from {original} to {compressed} characters ({kind}). "
+    "Full output ({lines} lines) saved to {path}; page through it with "
+    "str_replace_editor `view` and `view_range`.]"
+)
+
+_HTML_PATTERN = re.compile(
+    r"<(html|body|div|p|table|span|a|head|script)[\s>]", re.IGNORECASE
+)
+_NUMBERS = re.compile(r"\d+")
+
+
+def _head_tail(text: str, limit: int) -> str:
+    """Keep the start and end of `text` within `limit` characters"""
+    if len(text) <= limit:
+        return text
+    marker = f"\n...[{len(text) - limit} characters omitted]...\n"
+    keep = max(limit - len(marker), 0)
+    head = keep * 2 // 3
+    return text[:head] + marker + text[len(text) - (keep - head) :]
+
+
+def html_to_text(text: str) -> str:
+    """Visible text of an HTML document, one block per line"""
+    soup = BeautifulSoup(text, "html.parser")
+    for element in soup(["script", "style", "noscript", "svg", "head"]):
+        element.extract()
+    lines = (line.strip() for line in soup.get_text(separator="\n").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _sniff_table(text: str) -> Optional[str]:
+    """Return the delimiter if most lines split into the same number of fields"""
+    lines = [line for line in text.splitlines()[:50] if line.strip()]
+    if len(lines) < 5:
+        return None
+    for delimiter in (",", "\t", "|", ";"):
+        counts = [line.count(delimiter) for line in lines]
+        width = max(set(counts), key=counts.count)
+        if width and counts.count(width) >= 0.8 * len(counts):
+            return delimiter
+    return None
+
+
+def _column_type(values: List[str]) -> str:
+    values = [v.strip() for v in values if v.strip()]
+    if not values:
+        return "empty"
+    for name, cast in (("int", int), ("float", float)):
+        try:
+            for value in values:
+                cast(value.replace(",", ""))
+            return name
+        except ValueError:
+            continue
+    return "text"
+
+
+def reduce_table(text: str, head: int = 10, tail: int = 5) -> str:
+    """Schema, row count and the first and last rows of a delimited table"""
+    delimiter = _sniff_table(text) or ","
+    rows = [row for row in csv.reader(io.StringIO(text), delimiter=delimiter) if row]
+    if len(rows) <= head + tail + 1:
+        return text
+    header, body = rows[0], rows[1:]
+    columns = []
+    for i, name in enumerate(header):
+        sample = [row[i] for row in body[:200] if i < len(row)]
+        columns.append(f"{name.strip() or f'column_{i}'} ({_column_type(sample)})")
+    lines = text.splitlines()
+    return "\n".join(
+        [
+            f"Table with {len(body)} rows and {len(header)} columns: "
+            + ", ".join(columns),
+            *lines[: head + 1],
+            f"...[{len(body) - head - tail} rows omitted]...",
+            *lines[-tail:],
+        ]
+    )
+
+
+def reduce_log(text: str) -> str:
+    """Collapse runs of lines that differ only in numbers (timestamps, counters)"""
+    result: List[str] = []
+    previous_key, repeats = None, 0
+    for line in text.splitlines():
+        key = _NUMBERS.sub("#", line.strip())
+        if key == previous_key:
+            repeats += 1
+            continue
+        if repeats:
+            result.append(f"  ...[previous line repeated {repeats} more times]")
+        result.append(line)
+        previous_key, repeats = key, 0
+    if repeats:
+        result.append(f"  ...[previous line repeated {repeats} more times]")
+    return "\n".join(result)
+
+
+class ObservationCompressor:
+    """Reduces tool outputs over `max_chars` and spills the full text to disk.
+
+    Attributes:
+        max_chars: Size an observation is reduced to.
+        spill_dir: Where full outputs are written; defaults to the workspace.
+    """
+
+    def __init__(self, max_chars: int = 10000, spill_dir: Optional[Path] = None):
+        self.max_chars = max_chars
+        self.spill_dir = Path(spill_dir or config.workspace_root / ".observations")
+
+    def _reducer(self, text: str) -> Tuple[str, Callable[[str], str]]:
+        if _HTML_PATTERN.search(text[:2000]):
+            return "html as text", html_to_text
+        if _sniff_table(text):
+            return "table head and tail", reduce_table
+        return "repeated lines collapsed", reduce_log
+
+    def compress(self, text: str, tool_name: str = "tool") -> str:
+        """Return `text`, or a reduced form with a pointer to the full output"""
+        if len(text) <= self.max_chars:
+            return text
+
+        kind, reducer = self._reducer(text)
+        try:
+            reduced = reducer(text)
+        except Exception as e:
+            logger.warning(f"Failed to reduce {tool_name} output as {kind}: {e}")
+            kind, reduced = "truncated", text
+
+        try:
+            path = self._spill(text, tool_name)
+        except OSError as e:
+            logger.warning(f"Failed to save full {tool_name} output: {e}")
+            return _head_tail(reduced, self.max_chars)
+
+        note_size = len(SPILL_NOTE) + len(str(path)) + 40
+        reduced = _head_tail(reduced, max(self.max_chars - note_size, 0))
+        return reduced + SPILL_NOTE.format(
+            original=len(text),
+            compressed=len(reduced),
+            kind=kind,
+            lines=text.count("\n") + 1,
+            path=path,
+        )
+
+    def _spill(self, text: str, tool_name: str) -> Path:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+        safe_name = re.sub(r"[^\w.-]", "_", tool_name)
+        path = self.spill_dir / f"{safe_name}_{digest}.txt"
+        if not path.exists():
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            path.write_text(text, encoding="utf-8")
+        return path
@@ -0,0 +1,270 @@
+"""Deterministic record/replay transport for LLM calls.
+
+In ``record`` mode every request is forwarded to the real client and the
+request/response pair (including streamed chunks) is appended to a JSONL file.
+In ``replay`` mode responses are served from that file without touching the
+network, optionally with simulated latency, so agents and flows can be
+profiled reproducibly offline.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Union
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from app.bedrock import OpenAIResponse
+from app.config import PROJECT_ROOT, LLMSettings
+from app.exceptions import ReplayMissError
+from app.logger import logger
+from app.singleflight import SingleFlight
+
+
+REPLAY_MODES = ("record", "replay")
+
+
+def _to_jsonable(obj: Any) -> Any:
+    """Convert SDK response objects into plain JSON-compatible data"""
+    if isinstance(obj, OpenAIResponse):
+        return {key: _to_jsonable(value) for key, value in obj.__dict__.items()}
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, dict):
+        return {key: _to_jsonable(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_to_jsonable(item) for item in obj]
+    return obj
+
+
+def _compact_request(obj: Any, limit: int = 2000) -> Any:
+    """Shorten long strings (base64 images) in the stored copy of a request"""
+    if isinstance(obj, str) and len(obj) > limit:
+        digest = hashlib.sha256(obj.encode("utf-8")).hexdigest()[:12]
+        return f"{obj[:64]}...<{len(obj)} chars sha256:{digest}>"
+    if isinstance(obj, dict):
+        return {key: _compact_request(value, limit) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_compact_request(item, limit) for item in obj]
+    return obj
+
+
+def _from_jsonable(data: dict, model: Optional[type] = None) -> Any:
+    """Rebuild a response object, preferring the typed SDK model when it validates"""
+    if model is not None:
+        try:
+            return model.model_validate(data)
+        except Exception:
+            pass
+    return OpenAIResponse(data)
+
+
+class ReplayStore:
+    """Append-only JSONL store of request -> response records keyed by request hash.
+
+    Identical requests are served in the order they were recorded, so a run that
+    issues the same prompt twice replays both responses.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._records: Dict[str, Deque[dict]] = defaultdict(deque)
+        self._ordered: List[dict] = []
+        self._cursor = 0
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self._records[record["key"]].append(record)
+                self._ordered.append(record)
+        logger.info(
+            f"Loaded {sum(len(v) for v in self._records.values())} replay records from {self.path}"
+        )
+
+    @staticmethod
+    def request_key(params: Dict[str, Any]) -> str:
+        """Hash the request the same way in-flight requests are coalesced"""
+        return SingleFlight.request_key(_to_jsonable(params))
+
+    def append(self, record: dict) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def pop(self, key: str) -> Optional[dict]:
+        """Take the next unused record recorded for this exact request"""
+        records = self._records.get(key)
+        while records:
+            record = records.popleft()
+            if not record.get("_used"):
+                record["_used"] = True
+                return record
+        return None
+
+    def pop_next(self) -> Optional[dict]:
+        """Take the next unused record in recording order, regardless of its key"""
+        while self._cursor < len(self._ordered):
+            record = self._ordered[self._cursor]
+            self._cursor += 1
+            if not record.get("_used"):
+                record["_used"] = True
+                return record
+        return None
+
+
+class RecordReplayTransport:
+    """Wraps an LLM client call in record or replay mode"""
+
+    def __init__(
+        self,
+        mode: str,
+        path: Union[str, Path],
+        latency: Optional[float] = None,
+        strict: bool = False,
+    ):
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Invalid replay mode: {mode}. Use one of {REPLAY_MODES}")
+        self.mode = mode
+        self.latency = latency
+        self.strict = strict
+        self.store = ReplayStore(path)
+
+    @classmethod
+    def from_settings(cls, settings: LLMSettings) -> Optional["RecordReplayTransport"]:
+        """Build a transport from LLM settings, or None if record/replay is off"""
+        if not settings.replay_mode:
+            return None
+        path = (
+            settings.replay_path or PROJECT_ROOT / f"logs/replay_{settings.model}.jsonl"
+        )
+        return cls(
+            settings.replay_mode,
+            path,
+            latency=settings.replay_latency,
+            strict=settings.replay_strict,
+        )
+
+    def _take(self, key: str) -> dict:
+        record = self.store.pop(key)
+        if record is None and not self.strict:
+            # Requests can drift between runs (timestamps in plan ids, temp paths);
+            # fall back to recording order so the replay stays deterministic.
+            record = self.store.pop_next()
+            if record is not None:
+                logger.warning(
+                    f"Replay request {key[:12]} not recorded, serving next record in order"
+                )
+        if record is None:
+            raise ReplayMissError(f"No recorded response for request {key[:12]}")
+        return record
+
+    async def _simulate_latency(self, recorded: float) -> None:
+        delay = recorded if self.latency is None else self.latency
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def invoke(
+        self,
+        params: Dict[str, Any],
+        call: Callable[[], Union[Any, Awaitable[Any]]],
+        response_model: Optional[type] = None,
+    ) -> Any:
+        """Record or replay a single non-streaming call.
+
+        Args:
+            params: The request parameters, used to key the record
+            call: Zero-argument callable performing the real request (record mode)
+            response_model: Optional pydantic model used to rebuild the response
+        """
+        key = self.store.request_key(params)
+
+        if self.mode == "replay":
+            record = self._take(key)
+            await self._simulate_latency(record.get("elapsed", 0.0))
+            return _from_jsonable(record["response"], response_model)
+
+        start = time.perf_counter()
+        response = call()
+        if asyncio.iscoroutine(response):
+            response = await response
+        self.store.append(
+            {
+                "key": key,
+                "request": _compact_request(_to_jsonable(params)),
+                "response": _to_jsonable(response),
+                "elapsed": time.perf_counter() - start,
+            }
+        )
+        return response
+
+    async def invoke_stream(
+        self,
+        params: Dict[str, Any],
+        call: Callable[[], Awaitable[Any]],
+    ):
+        """Record or replay a streaming call, yielding chunks as they arrive"""
+        key = self.store.request_key(params)
+
+        if self.mode == "replay":
+            record = self._take(key)
+            chunks = record.get("chunks", [])
+            await self._simulate_latency(record.get("elapsed", 0.0))
+            for chunk in chunks:
+                yield _from_jsonable(chunk, ChatCompletionChunk)
+            return
+
+        start = time.perf_counter()
+        chunks: List[dict] = []
+        async for chunk in await call():
+            chunks.append(_to_jsonable(chunk))
+            yield chunk
+        self.store.append(
+            {
+                "key": key,
+                "request": _compact_request(_to_jsonable(params)),
+                "chunks": chunks,
+                "elapsed": time.perf_counter() - start,
+            }
+        )
+
+
+class ReplayClient:
+    """OpenAI-compatible client wrapper exposing `chat.completions.create`"""
+
+    def __init__(self, client: Optional[Any], transport: RecordReplayTransport):
+        self.client = client
+        self.transport = transport
+        self.chat = _ReplayChat(self)
+
+
+class _ReplayChat:
+    def __init__(self, owner: ReplayClient):
+        self.completions = _ReplayCompletions(owner)
+
+
+class _ReplayCompletions:
+    def __init__(self, owner: ReplayClient):
+        self.owner = owner
+
+    async def create(self, **params) -> Any:
+        transport = self.owner.transport
+        client = self.owner.client
+
+        if params.get("stream"):
+            return transport.invoke_stream(
+                params, lambda: client.chat.completions.create(**params)
+            )
+        return await transport.invoke(
+            params,
+            lambda: client.chat.completions.create(**params),
+            response_model=ChatCompletion,
+        )
@@ -1,7 +1,12 @@
+from collections import Counter, deque
 from enum import Enum
-from typing import Any, List, Literal, Optional, Union
+from itertools import islice
+from typing import Any, Iterable, List, Literal, Optional, Set, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, GetCoreSchemaHandler, model_validator
+from pydantic_core import core_schema
+
+from app.image_store import image_store
 
 
 class Role(str, Enum):
@@ -59,7 +64,28 @@ class Message(BaseModel):
     tool_calls: Optional[List[ToolCall]] = Field(default=None)
     name: Optional[str] = Field(default=None)
     tool_call_id: Optional[str] = Field(default=None)
-    base64_image: Optional[str] = Field(default=None)
+    # Reference into the image store; the base64 data is held there once
+    image_ref: Optional[str] = Field(default=None)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _store_image(cls, data: Any) -> Any:
+        """Move an inline `base64_image` into the image store"""
+        if isinstance(data, dict) and "base64_image" in data:
+            data = dict(data)
+            base64_image = data.pop("base64_image")
+            if base64_image:
+                data["image_ref"] = image_store.put(base64_image)
+        return data
+
+    @property
+    def base64_image(self) -> Optional[str]:
+        """The message image as base64, resolved from the image store"""
+        return image_store.get(self.image_ref) if self.image_ref else None
+
+    @base64_image.setter
+    def base64_image(self, value: Optional[str]) -> None:
+        self.image_ref = image_store.put(value) if value else None
 
     def __add__(self, other) -> List["Message"]:
         """支持 Message + list 或 Message + Message 的操作"""
@@ -81,7 +107,7 @@ class Message(BaseModel):
                 f"unsupported operand type(s) for +: '{type(other).__name__}' and '{type(self).__name__}'"
             )
 
-    def to_dict(self) -> dict:
+    def to_dict(self, include_image: bool = True) -> dict:
         """Convert message to dictionary format"""
         message = {"role": self.role}
         if self.content is not None:
@@ -92,8 +118,11 @@ class Message(BaseModel):
             message["name"] = self.name
         if self.tool_call_id is not None:
             message["tool_call_id"] = self.tool_call_id
-        if self.base64_image is not None:
-            message["base64_image"] = self.base64_image
+        if include_image and self.image_ref is not None:
+            # None once the store has dropped the image to bound its disk use
+            base64_image = self.base64_image
+            if base64_image:
+                message["base64_image"] = base64_image
         return message
 
     @classmethod
@@ -156,23 +185,174 @@ class Message(BaseModel):
         )
 
 
+def recent_image_indices(
+    messages: List[Union[dict, Message]], max_images: Optional[int] = None
+) -> Set[int]:
+    """Indices of the messages whose images are sent inline.
+
+    Only the most recent `max_images` images are kept (all of them if None);
+    older ones stay in the image store and are not re-sent.
+    """
+    indices = [
+        i
+        for i, message in enumerate(messages)
+        if (
+            message.image_ref
+            if isinstance(message, Message)
+            else isinstance(message, dict) and message.get("base64_image")
+        )
+    ]
+    if max_images is not None:
+        indices = indices[max(len(indices) - max_images, 0) :]
+    return set(indices)
+
+
+class MessageBuffer(deque):
+    """Ring buffer of messages with O(1) append/evict.
+
+    Keeps a count of assistant message contents so repeated responses can be
+    detected without scanning the history. Slicing returns a plain list, so the
+    buffer can stand in for the list previously used by `Memory.messages`.
+    """
+
+    def __init__(self, messages: Iterable[Message] = (), maxlen: Optional[int] = None):
+        super().__init__(maxlen=maxlen)
+        self._assistant_contents: Counter = Counter()
+        self.extend(messages)
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        return core_schema.no_info_after_validator_function(
+            cls,
+            handler.generate_schema(List[Message]),
+            serialization=core_schema.plain_serializer_function_ser_schema(
+                lambda buffer: [m.model_dump() for m in buffer]
+            ),
+        )
+
+    def _track(self, message: Message, delta: int) -> None:
+        if message.role == Role.ASSISTANT and message.content:
+            self._assistant_contents[message.content] += delta
+            if self._assistant_contents[message.content] <= 0:
+                del self._assistant_contents[message.content]
+
+    def assistant_content_count(self, content: str) -> int:
+        """Number of assistant messages in the buffer with exactly this content"""
+        return self._assistant_contents.get(content, 0)
+
+    def append(self, message: Message) -> None:
+        if self.maxlen is not None and len(self) == self.maxlen:
+            self.popleft()
+        super().append(message)
+        self._track(message, 1)
+
+    def appendleft(self, message: Message) -> None:
+        if self.maxlen is not None and len(self) == self.maxlen:
+            self.pop()
+        super().appendleft(message)
+        self._track(message, 1)
+
+    def extend(self, messages: Iterable[Message]) -> None:
+        for message in list(messages):
+            self.append(message)
+
+    def extendleft(self, messages: Iterable[Message]) -> None:
+        for message in list(messages):
+            self.appendleft(message)
+
+    def __iadd__(self, messages: Iterable[Message]) -> "MessageBuffer":
+        self.extend(messages)
+        return self
+
+    def __add__(self, other: Iterable[Message]) -> List[Message]:
+        return list(self) + list(other)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, list):
+            return list(self) == other
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def pop(self) -> Message:
+        message = super().pop()
+        self._track(message, -1)
+        return message
+
+    def popleft(self) -> Message:
+        message = super().popleft()
+        self._track(message, -1)
+        return message
+
+    def insert(self, index: int, message: Message) -> None:
+        if self.maxlen is not None and len(self) == self.maxlen:
+            raise IndexError("MessageBuffer is full")
+        super().insert(index, message)
+        self._track(message, 1)
+
+    def remove(self, message: Message) -> None:
+        super().remove(message)
+        self._track(message, -1)
+
+    def clear(self) -> None:
+        super().clear()
+        self._assistant_contents.clear()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return list(islice(self, start, stop))
+            return list(self)[index]
+        return super().__getitem__(index)
+
+    def __setitem__(self, index, message: Message) -> None:
+        if isinstance(index, slice):
+            raise TypeError("MessageBuffer does not support slice assignment")
+        self._track(self[index], -1)
+        super().__setitem__(index, message)
+        self._track(message, 1)
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice):
+            raise TypeError("MessageBuffer does not support slice deletion")
+        self._track(self[index], -1)
+        super().__delitem__(index)
+
+    def __reduce__(self):
+        return type(self), (list(self), self.maxlen)
+
+    def __copy__(self) -> "MessageBuffer":
+        return type(self)(self, self.maxlen)
+
+
 class Memory(BaseModel):
-    messages: List[Message] = Field(default_factory=list)
+    messages: MessageBuffer = Field(default_factory=MessageBuffer)
     max_messages: int = Field(default=100)
 
+    @model_validator(mode="after")
+    def _bound_messages(self) -> "Memory":
+        """Size the ring buffer to `max_messages`, keeping the most recent ones"""
+        self.messages = self.messages
+        return self
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        # Plain lists assigned to `messages` are wrapped in a bounded ring buffer
+        if name == "messages" and not (
+            isinstance(value, MessageBuffer) and value.maxlen == self.max_messages
+        ):
+            value = MessageBuffer(value, maxlen=self.max_messages)
+        super().__setattr__(name, value)
+
     def add_message(self, message: Message) -> None:
-        """Add a message to memory"""
+        """Add a message to memory, evicting the oldest one when full"""
         self.messages.append(message)
-        # Optional: Implement message limit
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
 
     def add_messages(self, messages: List[Message]) -> None:
-        """Add multiple messages to memory"""
+        """Add multiple messages to memory, evicting the oldest ones when full"""
         self.messages.extend(messages)
-        # Optional: Implement message limit
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
 
     def clear(self) -> None:
         """Clear all messages"""
@@ -0,0 +1,81 @@
+"""Single-flight coalescing for identical concurrent requests.
+
+When several coroutines issue the same request while one is already in flight,
+they await the in-flight call's result instead of sending a duplicate request.
+Results are only shared between overlapping calls; nothing is cached afterwards.
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Iterable, Tuple
+
+
+# Request fields that do not influence the response
+_IGNORED_PARAMS = ("timeout",)
+
+
+class SingleFlight:
+    """Shares one in-flight call between callers using the same key.
+
+    Attributes:
+        calls: Calls actually executed.
+        coalesced: Calls served from another caller's in-flight request.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def request_key(
+        params: Dict[str, Any], ignored: Iterable[str] = _IGNORED_PARAMS
+    ) -> str:
+        """Hash the normalized request parameters"""
+        normalized = {k: v for k, v in params.items() if k not in ignored}
+        payload = json.dumps(
+            normalized, sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def do(
+        self, key: str, call: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, bool]:
+        """Run `call`, or join an identical call already in flight.
+
+        Returns:
+            Tuple[Any, bool]: The result and whether this caller executed the call
+            (False when the result was shared from another caller).
+        """
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                result = await asyncio.shield(inflight)
+                self.coalesced += 1
+                return result, False
+            except asyncio.CancelledError:
+                # Only fall back to our own call if the leader was cancelled, not us
+                if not inflight.cancelled() or asyncio.current_task().cancelling():
+                    raise
+            return await self.do(key, call)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.calls += 1
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved so a lone failure is not logged twice
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, True
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
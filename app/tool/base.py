@@ -1,17 +1,47 @@
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, Field
 
 
+class CachePolicy(BaseModel):
+    """How long the result of a read-only tool call may be reused"""
+
+    ttl: Optional[float] = Field(
+        None, description="Seconds a result stays valid (None: until invalidated)"
+    )
+    files: List[str] = Field(
+        default_factory=list,
+        description="Paths whose mtime and size must be unchanged for a hit",
+    )
+    persist: bool = Field(False, description="Also keep the result in the disk store")
+
+
 class BaseTool(ABC, BaseModel):
     name: str
     description: str
     parameters: Optional[dict] = None
+    # Side-effect-free tools can run concurrently with other safe tool calls
+    concurrency_safe: bool = False
 
     class Config:
         arbitrary_types_allowed = True
 
+    def is_concurrency_safe(self, **kwargs) -> bool:
+        """Whether a call with these arguments may run alongside other safe calls."""
+        return self.concurrency_safe
+
+    def cache_policy(self, **kwargs) -> Optional[CachePolicy]:
+        """Cache policy for a call with these arguments, or None to always execute."""
+        return None
+
+    def dump_state(self) -> Optional[Dict[str, Any]]:
+        """JSON-serializable tool state for checkpoints, or None if stateless."""
+        return None
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        """Restore state produced by `dump_state`."""
+
     async def __call__(self, **kwargs) -> Any:
         """Execute the tool with given parameters."""
         return await self.execute(**kwargs)
@@ -0,0 +1,198 @@
+"""Memoization of deterministic, read-only tool calls.
+
+Tools opt in by returning a `CachePolicy` from `BaseTool.cache_policy` for the
+calls that are safe to reuse. Results are keyed by tool name and canonical
+arguments, kept in an in-memory LRU and, for policies marked `persist`,
+written to an optional on-disk store shared across runs. An entry is stale once
+its TTL has passed or any file it depends on has a different mtime or size.
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import PROJECT_ROOT, ToolCacheSettings, config
+from app.logger import logger
+from app.tool.base import CachePolicy, ToolResult
+
+
+FileStamp = Optional[Tuple[int, int]]
+
+
+def _file_stamp(path: str) -> FileStamp:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _encode(result: Any) -> Optional[dict]:
+    """Serialize a result for the disk store; subclasses are stored as ToolResult"""
+    if isinstance(result, ToolResult):
+        return {"type": "tool_result", "data": result.model_dump()}
+    if isinstance(result, str):
+        return {"type": "str", "data": result}
+    return None
+
+
+def _decode(payload: dict) -> Any:
+    if payload["type"] == "tool_result":
+        return ToolResult(**payload["data"])
+    return payload["data"]
+
+
+class ToolResultCache:
+    """LRU of tool results with TTL and file-based invalidation.
+
+    Attributes:
+        max_entries: Results kept in memory.
+        disk_dir: Directory of the persistent store, or None to disable it.
+        hits: Lookups served from the cache.
+        misses: Lookups that ran the tool, including stale entries.
+        stale: Entries dropped because they expired or a file changed.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        disk_dir: Optional[Path] = None,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @classmethod
+    def from_settings(cls, settings: Optional[ToolCacheSettings]) -> "ToolResultCache":
+        settings = settings or ToolCacheSettings()
+        disk_dir = None
+        if settings.disk_dir:
+            disk_dir = Path(settings.disk_dir)
+            if not disk_dir.is_absolute():
+                disk_dir = PROJECT_ROOT / disk_dir
+        return cls(settings.max_entries, disk_dir, settings.enabled)
+
+    @staticmethod
+    def key_for(name: str, tool_input: Optional[Dict[str, Any]]) -> str:
+        payload = json.dumps(
+            [name, tool_input or {}], sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _valid(self, entry: dict, policy: CachePolicy) -> bool:
+        ttl = policy.ttl
+        if ttl is not None and time.time() - entry["created"] > ttl:
+            return False
+        stamps = entry["files"]
+        return set(stamps) == set(policy.files) and all(
+            _file_stamp(path) == (tuple(stamp) if stamp else None)
+            for path, stamp in stamps.items()
+        )
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def get(
+        self, name: str, tool_input: Optional[Dict[str, Any]], policy: CachePolicy
+    ) -> Optional[Any]:
+        """Return a valid cached result, or None"""
+        key = self.key_for(name, tool_input)
+        entry = self._entries.get(key)
+        if entry is None and policy.persist and self.disk_dir:
+            entry = self._read_disk(key)
+            if entry is not None:
+                entry["result"] = _decode(entry["result"])
+                self._remember(key, entry)
+
+        if entry is not None and not self._valid(entry, policy):
+            self.stale += 1
+            self._forget(key)
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry["result"]
+
+    def put(
+        self,
+        name: str,
+        tool_input: Optional[Dict[str, Any]],
+        policy: CachePolicy,
+        result: Any,
+    ) -> None:
+        """Store a successful result; failures are never cached"""
+        if getattr(result, "error", None):
+            return
+        key = self.key_for(name, tool_input)
+        entry = {
+            "created": time.time(),
+            "files": {path: _file_stamp(path) for path in policy.files},
+            "result": result,
+        }
+        self._remember(key, entry)
+
+        payload = _encode(result)
+        if policy.persist and self.disk_dir and payload is not None:
+            try:
+                path = self._disk_path(key)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_text(
+                    json.dumps({**entry, "result": payload}, default=str),
+                    encoding="utf-8",
+                )
+            except OSError as e:
+                logger.warning(f"Failed to persist cached {name} result: {e}")
+
+    def _remember(self, key: str, entry: dict) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _forget(self, key: str) -> None:
+        self._entries.pop(key, None)
+        if self.disk_dir:
+            self._disk_path(key).unlink(missing_ok=True)
+
+    def _read_disk(self, key: str) -> Optional[dict]:
+        path = self._disk_path(key)
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable tool cache entry {path}: {e}")
+            return None
+
+    def clear(self) -> None:
+        """Drop in-memory entries; the disk store is left in place"""
+        self._entries.clear()
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.hits}/{self.lookups} hits ({self.hit_rate:.0%}), "
+            f"{self.stale} stale, {len(self._entries)} entries"
+        )
+
+
+tool_cache = ToolResultCache.from_settings(config.tool_cache)
@@ -0,0 +1,484 @@
+"""Typed plan storage for the planning tool.
+
+A `Plan` keeps its steps as `PlanStep` records, a cursor at the first step that
+is not yet completed or blocked, a status index (step counts per status and the
+completed steps in completion order, updated on every status change) and its
+rendered text, which is only rebuilt after a mutation. Plans still support the
+dict-style access used by flows (`plan["steps"]`, `plan["step_statuses"]`,
+...), returning fresh lists.
+
+`PlanStore` maps plan ids to plans. Given a path, it also writes every change
+to SQLite and reloads a plan when another process has saved a newer version,
+so several flow workers can share plans. Writes are compare-and-swap on the
+plan version: when another worker saved first, the plan is reloaded and this
+worker's step changes are applied on top before writing again. Inside
+`with store.batch():` changes are applied in memory right away but written
+once, when the block ends.
+"""
+
+import json
+import sqlite3
+import threading
+from collections import Counter
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+from pydantic import BaseModel
+
+
+STEP_STATUSES = ("not_started", "in_progress", "completed", "blocked")
+ACTIVE_STATUSES = ("not_started", "in_progress")
+STATUS_MARKS = {
+    "not_started": "[ ]",
+    "in_progress": "[→]",
+    "completed": "[✓]",
+    "blocked": "[!]",
+}
+
+
+class PlanStep(BaseModel):
+    """A single plan step"""
+
+    text: str
+    status: str = "not_started"
+    notes: str = ""
+
+
+class Plan:
+    """A plan with typed steps, a cursor at the next active step and cached text"""
+
+    def __init__(
+        self,
+        plan_id: str,
+        title: str,
+        steps: List[PlanStep],
+        dependencies: Optional[List[List[int]]] = None,
+        version: int = 0,
+    ):
+        self.plan_id = plan_id
+        self.title = title
+        self.steps = steps
+        self.dependencies = dependencies
+        self.version = version
+        self._cursor = 0
+        self._rendered: Optional[str] = None
+        self._on_change: Optional[Callable[["Plan"], None]] = None
+        # Version last read from or written to the store, None if never saved
+        self._stored_version: Optional[int] = None
+        # Step fields and plan structure changed since then, to merge on conflict
+        self._changed_steps: Dict[int, Dict[str, str]] = {}
+        self._structure_changed = False
+        self._status_counts: Dict[str, int] = {}
+        self._completed: Dict[int, None] = {}
+        self._reindex()
+        self._advance()
+
+    @classmethod
+    def create(
+        cls,
+        plan_id: str,
+        title: str,
+        steps: List[str],
+        dependencies: Optional[List[List[int]]] = None,
+    ) -> "Plan":
+        return cls(
+            plan_id, title, [PlanStep(text=text) for text in steps], dependencies
+        )
+
+    # Cursor
+
+    def _advance(self) -> None:
+        while (
+            self._cursor < len(self.steps)
+            and self.steps[self._cursor].status not in ACTIVE_STATUSES
+        ):
+            self._cursor += 1
+
+    def next_active_step(self) -> Optional[int]:
+        """Index of the first step that is not started or in progress"""
+        return self._cursor if self._cursor < len(self.steps) else None
+
+    def upcoming_steps(self, limit: int, skip: Optional[int] = None) -> List[int]:
+        """Indices of the first `limit` active steps other than `skip`"""
+        indices: List[int] = []
+        index = self._cursor
+        while len(indices) < limit and index < len(self.steps):
+            if index != skip and self.steps[index].status in ACTIVE_STATUSES:
+                indices.append(index)
+            index += 1
+        return indices
+
+    # Status index
+
+    def _reindex(self) -> None:
+        self._status_counts = dict(Counter(step.status for step in self.steps))
+        self._completed = {
+            index: None
+            for index, step in enumerate(self.steps)
+            if step.status == "completed"
+        }
+
+    def count(self, *statuses: str) -> int:
+        """Number of steps in any of `statuses`"""
+        return sum(self._status_counts.get(status, 0) for status in statuses)
+
+    def recently_completed(self, limit: int) -> List[int]:
+        """Indices of the last `limit` steps completed, in completion order"""
+        return list(islice(reversed(self._completed), limit))[::-1]
+
+    # Mutation
+
+    def _changed(self) -> None:
+        self.version += 1
+        self._rendered = None
+        if self._on_change:
+            self._on_change(self)
+
+    def set_status(self, index: int, status: str) -> None:
+        previous = self.steps[index].status
+        self.steps[index].status = status
+        self._status_counts[previous] -= 1
+        self._status_counts[status] = self._status_counts.get(status, 0) + 1
+        self._completed.pop(index, None)
+        if status == "completed":
+            self._completed[index] = None
+        self._changed_steps.setdefault(index, {})["status"] = status
+        if status in ACTIVE_STATUSES:
+            self._cursor = min(self._cursor, index)
+        self._advance()
+        self._changed()
+
+    def set_notes(self, index: int, notes: str) -> None:
+        self.steps[index].notes = notes
+        self._changed_steps.setdefault(index, {})["notes"] = notes
+        self._changed()
+
+    def update(
+        self,
+        title: Optional[str] = None,
+        steps: Optional[List[PlanStep]] = None,
+        dependencies: Optional[List[List[int]]] = None,
+    ) -> None:
+        if title:
+            self.title = title
+        if steps is not None:
+            self.steps = steps
+            self._reindex()
+            self._cursor = 0
+            self._advance()
+        if dependencies is not None:
+            self.dependencies = dependencies
+        self._structure_changed = True
+        self._changed()
+
+    def _rebase(self, stored: "Plan", stored_version: int) -> None:
+        """Adopt a newer stored copy and reapply the changes made since the last
+        save; a changed structure (title, steps, dependencies) wins over it"""
+        if not self._structure_changed:
+            self.title = stored.title
+            self.steps = stored.steps
+            self.dependencies = stored.dependencies
+            for index, fields in self._changed_steps.items():
+                if index < len(self.steps):
+                    for field, value in fields.items():
+                        setattr(self.steps[index], field, value)
+        self._stored_version = stored_version
+        self.version = stored_version + 1
+        self._reindex()
+        self._cursor = 0
+        self._advance()
+        self._rendered = None
+
+    def _mark_saved(self) -> None:
+        self._stored_version = self.version
+        self._changed_steps = {}
+        self._structure_changed = False
+
+    # Dict-style access kept for flows and checkpoints
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "plan_id":
+            return self.plan_id
+        if key == "title":
+            return self.title
+        if key == "steps":
+            return [step.text for step in self.steps]
+        if key == "step_statuses":
+            return [step.status for step in self.steps]
+        if key == "step_notes":
+            return [step.notes for step in self.steps]
+        if key == "step_dependencies" and self.dependencies is not None:
+            return self.dependencies
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key == "title":
+            self.update(title=value)
+        elif key == "step_statuses":
+            for index, status in enumerate(value[: len(self.steps)]):
+                self.steps[index].status = status
+                self._changed_steps.setdefault(index, {})["status"] = status
+            self._reindex()
+            self._cursor = 0
+            self._advance()
+            self._changed()
+        elif key == "step_notes":
+            for index, notes in enumerate(value[: len(self.steps)]):
+                self.steps[index].notes = notes
+                self._changed_steps.setdefault(index, {})["notes"] = notes
+            self._changed()
+        elif key == "step_dependencies":
+            self.update(dependencies=value)
+        else:
+            raise KeyError(f"Plan field '{key}' cannot be assigned")
+
+    def __contains__(self, key: str) -> bool:
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "plan_id": self.plan_id,
+            "title": self.title,
+            "steps": self["steps"],
+            "step_statuses": self["step_statuses"],
+            "step_notes": self["step_notes"],
+            "version": self.version,
+        }
+        if self.dependencies is not None:
+            data["step_dependencies"] = self.dependencies
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Plan":
+        statuses = data.get("step_statuses") or []
+        notes = data.get("step_notes") or []
+        steps = [
+            PlanStep(
+                text=text,
+                status=statuses[i] if i < len(statuses) else "not_started",
+                notes=notes[i] if i < len(notes) else "",
+            )
+            for i, text in enumerate(data["steps"])
+        ]
+        return cls(
+            data["plan_id"],
+            data["title"],
+            steps,
+            data.get("step_dependencies"),
+            data.get("version", 0),
+        )
+
+    # Rendering
+
+    def render(self) -> str:
+        """Plan text for prompts and tool output, cached until the next mutation"""
+        if self._rendered is None:
+            self._rendered = self._render()
+        return self._rendered
+
+    def _render(self) -> str:
+        output = f"Plan: {self.title} (ID: {self.plan_id})\n"
+        output += "=" * len(output) + "\n\n"
+
+        counts = {status: 0 for status in STEP_STATUSES}
+        counts.update(self._status_counts)
+        total_steps = len(self.steps)
+        completed = counts["completed"]
+
+        output += f"Progress: {completed}/{total_steps} steps completed "
+        if total_steps > 0:
+            percentage = (completed / total_steps) * 100
+            output += f"({percentage:.1f}%)\n"
+        else:
+            output += "(0%)\n"
+
+        output += f"Status: {completed} completed, {counts['in_progress']} in progress, {counts['blocked']} blocked, {counts['not_started']} not started\n\n"
+        output += "Steps:\n"
+
+        for i, step in enumerate(self.steps):
+            output += f"{i}. {STATUS_MARKS.get(step.status, '[ ]')} {step.text}\n"
+            if self.dependencies and self.dependencies[i]:
+                output += (
+                    f"   Depends on: {', '.join(map(str, self.dependencies[i]))}\n"
+                )
+            if step.notes:
+                output += f"   Notes: {step.notes}\n"
+
+        return output
+
+
+class PlanStore(MutableMapping):
+    """Plans by id, optionally persisted to a SQLite database shared by workers"""
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        self.path = Path(path) if path else None
+        self._plans: Dict[str, Plan] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._batch_depth = 0
+        self._pending: Dict[str, Plan] = {}
+        if self.path:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS plans "
+                "(plan_id TEXT PRIMARY KEY, version INTEGER, data TEXT)"
+            )
+            self._db.commit()
+
+    def _attach(self, plan: Plan) -> Plan:
+        plan._on_change = self._save
+        return plan
+
+    def _save(self, plan: Plan) -> None:
+        """Write the plan if the stored version is the one it was based on;
+        otherwise merge it into the stored plan and try again"""
+        if self._db is None:
+            return
+        if self._batch_depth:
+            self._pending[plan.plan_id] = plan
+            return
+        with self._lock:
+            while True:
+                if plan._stored_version is None:
+                    written = self._db.execute(
+                        "INSERT OR IGNORE INTO plans (plan_id, version, data) "
+                        "VALUES (?, ?, ?)",
+                        (plan.plan_id, plan.version, json.dumps(plan.to_dict())),
+                    ).rowcount
+                else:
+                    written = self._db.execute(
+                        "UPDATE plans SET version = ?, data = ? "
+                        "WHERE plan_id = ? AND version = ?",
+                        (
+                            plan.version,
+                            json.dumps(plan.to_dict()),
+                            plan.plan_id,
+                            plan._stored_version,
+                        ),
+                    ).rowcount
+                self._db.commit()
+                if written:
+                    plan._mark_saved()
+                    return
+                row = self._db.execute(
+                    "SELECT version, data FROM plans WHERE plan_id = ?",
+                    (plan.plan_id,),
+                ).fetchone()
+                if row is None:
+                    # Deleted by another worker; write it back as new
+                    plan._stored_version = None
+                    continue
+                plan._rebase(Plan.from_dict(json.loads(row[1])), row[0])
+
+    def _replace(self, plan: Plan) -> None:
+        """Write the plan whatever is stored, e.g. for a newly created plan"""
+        if self._db is None:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO plans (plan_id, version, data) VALUES (?, ?, ?) "
+                "ON CONFLICT(plan_id) DO UPDATE SET version = excluded.version, "
+                "data = excluded.data",
+                (plan.plan_id, plan.version, json.dumps(plan.to_dict())),
+            )
+            self._db.commit()
+        plan._mark_saved()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Hold back database writes until the block ends, then save each
+        changed plan once"""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                pending, self._pending = self._pending, {}
+                for plan in pending.values():
+                    self._save(plan)
+
+    def _refresh(self, plan_id: str) -> None:
+        """Load the plan from the database if another worker saved a newer version"""
+        if self._db is None:
+            return
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version, data FROM plans WHERE plan_id = ?", (plan_id,)
+            ).fetchone()
+        if row is None:
+            self._plans.pop(plan_id, None)
+            return
+        plan = self._plans.get(plan_id)
+        if plan is None or (
+            # Unsaved changes are merged into the stored plan when saved
+            plan_id not in self._pending
+            and plan._stored_version != row[0]
+        ):
+            stored = Plan.from_dict(json.loads(row[1]))
+            stored._mark_saved()
+            self._plans[plan_id] = self._attach(stored)
+
+    def __getitem__(self, plan_id: str) -> Plan:
+        self._refresh(plan_id)
+        return self._plans[plan_id]
+
+    def __setitem__(self, plan_id: str, plan: Union[Plan, Dict[str, Any]]) -> None:
+        if not isinstance(plan, Plan):
+            plan = Plan.from_dict(plan)
+        self._plans[plan_id] = self._attach(plan)
+        self._replace(plan)
+
+    def __delitem__(self, plan_id: str) -> None:
+        self._refresh(plan_id)
+        del self._plans[plan_id]
+        self._pending.pop(plan_id, None)
+        if self._db is not None:
+            with self._lock:
+                self._db.execute("DELETE FROM plans WHERE plan_id = ?", (plan_id,))
+                self._db.commit()
+
+    def _ids(self) -> List[str]:
+        if self._db is None:
+            return list(self._plans)
+        with self._lock:
+            return [
+                row[0]
+                for row in self._db.execute("SELECT plan_id FROM plans ORDER BY rowid")
+            ]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids())
+
+    def __len__(self) -> int:
+        return len(self._ids())
+
+    def __contains__(self, plan_id: object) -> bool:
+        if self._db is None:
+            return plan_id in self._plans
+        return plan_id in self._ids()
+
+    def dump(self) -> Dict[str, Dict[str, Any]]:
+        """All plans as plain dicts, e.g. for checkpoints"""
+        return {plan_id: self[plan_id].to_dict() for plan_id in self}
+
+    def load(self, plans: Dict[str, Dict[str, Any]]) -> None:
+        """Replace all plans with the given plain dicts"""
+        for plan_id in list(self):
+            del self[plan_id]
+        for plan_id, data in plans.items():
+            self[plan_id] = data
@@ -1,8 +1,11 @@
 # tool/planning.py
 from typing import Dict, List, Literal, Optional
 
+from pydantic import Field
+
 from app.exceptions import ToolError
 from app.tool.base import BaseTool, ToolResult
+from app.tool.plan_store import STEP_STATUSES, Plan, PlanStep, PlanStore
 
 
 _PLANNING_TOOL_DESCRIPTION = """
@@ -48,6 +51,11 @@ class PlanningTool(BaseTool):
                 "type": "array",
                 "items": {"type": "string"},
             },
+            "step_dependencies": {
+                "description": "For each step, the indices of earlier steps it depends on. Steps whose dependencies are completed can run in parallel. Optional for create and update command; by default each step depends on the previous one.",
+                "type": "array",
+                "items": {"type": "array", "items": {"type": "integer"}},
+            },
             "step_index": {
                 "description": "Index of the step to update (0-based). Required for mark_step command.",
                 "type": "integer",
@@ -66,9 +74,17 @@ class PlanningTool(BaseTool):
         "additionalProperties": False,
     }
 
-    plans: dict = {}  # Dictionary to store plans by plan_id
+    # Plans by plan_id; pass PlanStore(path) to share them through SQLite
+    plans: PlanStore = Field(default_factory=PlanStore)
     _current_plan_id: Optional[str] = None  # Track the current active plan
 
+    def dump_state(self) -> Optional[Dict]:
+        return {"plans": self.plans.dump(), "current_plan_id": self._current_plan_id}
+
+    def load_state(self, state: Dict) -> None:
+        self.plans.load(state.get("plans", {}))
+        self._current_plan_id = state.get("current_plan_id")
+
     async def execute(
         self,
         *,
@@ -78,6 +94,7 @@ class PlanningTool(BaseTool):
         plan_id: Optional[str] = None,
         title: Optional[str] = None,
         steps: Optional[List[str]] = None,
+        step_dependencies: Optional[List[List[int]]] = None,
         step_index: Optional[int] = None,
         step_status: Optional[
             Literal["not_started", "in_progress", "completed", "blocked"]
@@ -93,15 +110,16 @@ class PlanningTool(BaseTool):
         - plan_id: Unique identifier for the plan
         - title: Title for the plan (used with create command)
         - steps: List of steps for the plan (used with create command)
+        - step_dependencies: Earlier steps each step depends on (used with create and update commands)
         - step_index: Index of the step to update (used with mark_step command)
         - step_status: Status to set for a step (used with mark_step command)
         - step_notes: Additional notes for a step (used with mark_step command)
         """
 
         if command == "create":
-            return self._create_plan(plan_id, title, steps)
+            return self._create_plan(plan_id, title, steps, step_dependencies)
         elif command == "update":
-            return self._update_plan(plan_id, title, steps)
+            return self._update_plan(plan_id, title, steps, step_dependencies)
         elif command == "list":
             return self._list_plans()
         elif command == "get":
@@ -117,8 +135,49 @@ class PlanningTool(BaseTool):
                 f"Unrecognized command: {command}. Allowed commands are: create, update, list, get, set_active, mark_step, delete"
             )
 
+    @staticmethod
+    def _validate_dependencies(
+        dependencies: List[List[int]], step_count: int
+    ) -> List[List[int]]:
+        """Check that each step only depends on earlier steps, which keeps plans acyclic."""
+        if len(dependencies) != step_count:
+            raise ToolError(
+                f"Parameter `step_dependencies` must have one entry per step ({step_count})"
+            )
+        for i, deps in enumerate(dependencies):
+            if not isinstance(deps, list) or not all(
+                isinstance(dep, int) and 0 <= dep < i for dep in deps
+            ):
+                raise ToolError(
+                    f"Invalid dependencies for step {i}: {deps}. Steps can only depend on earlier steps."
+                )
+        return [sorted(set(deps)) for deps in dependencies]
+
+    @staticmethod
+    def get_dependencies(plan: Dict) -> List[List[int]]:
+        """Dependencies of each step; plans without them run steps in order."""
+        dependencies = plan.get("step_dependencies")
+        if dependencies is None:
+            return [[i - 1] if i else [] for i in range(len(plan["steps"]))]
+        return dependencies
+
+    def get_ready_steps(self, plan_id: str) -> List[int]:
+        """Indices of not-started steps whose dependencies are all completed."""
+        plan = self.plans[plan_id]
+        steps = plan.steps
+        return [
+            i
+            for i, deps in enumerate(self.get_dependencies(plan))
+            if steps[i].status == "not_started"
+            and all(steps[dep].status == "completed" for dep in deps)
+        ]
+
     def _create_plan(
-        self, plan_id: Optional[str], title: Optional[str], steps: Optional[List[str]]
+        self,
+        plan_id: Optional[str],
+        title: Optional[str],
+        steps: Optional[List[str]],
+        step_dependencies: Optional[List[List[int]]] = None,
     ) -> ToolResult:
         """Create a new plan with the given ID, title, and steps."""
         if not plan_id:
@@ -141,15 +200,12 @@ class PlanningTool(BaseTool):
                 "Parameter `steps` must be a non-empty list of strings for command: create"
             )
 
-        # Create a new plan with initialized step statuses
-        plan = {
-            "plan_id": plan_id,
-            "title": title,
-            "steps": steps,
-            "step_statuses": ["not_started"] * len(steps),
-            "step_notes": [""] * len(steps),
-        }
+        if step_dependencies is not None:
+            step_dependencies = self._validate_dependencies(
+                step_dependencies, len(steps)
+            )
 
+        plan = Plan.create(plan_id, title, steps, step_dependencies)
         self.plans[plan_id] = plan
         self._current_plan_id = plan_id  # Set as active plan
 
@@ -158,7 +214,11 @@ class PlanningTool(BaseTool):
         )
 
     def _update_plan(
-        self, plan_id: Optional[str], title: Optional[str], steps: Optional[List[str]]
+        self,
+        plan_id: Optional[str],
+        title: Optional[str],
+        steps: Optional[List[str]],
+        step_dependencies: Optional[List[List[int]]] = None,
     ) -> ToolResult:
         """Update an existing plan with new title or steps."""
         if not plan_id:
@@ -168,9 +228,7 @@ class PlanningTool(BaseTool):
             raise ToolError(f"No plan found with ID: {plan_id}")
 
         plan = self.plans[plan_id]
-
-        if title:
-            plan["title"] = title
+        new_steps = None
 
         if steps:
             if not isinstance(steps, list) or not all(
@@ -180,27 +238,36 @@ class PlanningTool(BaseTool):
                     "Parameter `steps` must be a list of strings for command: update"
                 )
 
-            # Preserve existing step statuses for unchanged steps
-            old_steps = plan["steps"]
-            old_statuses = plan["step_statuses"]
-            old_notes = plan["step_notes"]
-
-            # Create new step statuses and notes
-            new_statuses = []
-            new_notes = []
-
-            for i, step in enumerate(steps):
-                # If the step exists at the same position in old steps, preserve status and notes
-                if i < len(old_steps) and step == old_steps[i]:
-                    new_statuses.append(old_statuses[i])
-                    new_notes.append(old_notes[i])
-                else:
-                    new_statuses.append("not_started")
-                    new_notes.append("")
+            # Preserve status and notes of steps unchanged at the same position
+            old_steps = plan.steps
+            new_steps = [
+                (
+                    old_steps[i].model_copy()
+                    if i < len(old_steps) and text == old_steps[i].text
+                    else PlanStep(text=text)
+                )
+                for i, text in enumerate(steps)
+            ]
+
+            # Keep dependencies of unchanged steps; new steps follow the previous one
+            if step_dependencies is None and plan.dependencies is not None:
+                step_dependencies = [
+                    (
+                        plan.dependencies[i]
+                        if i < len(old_steps) and text == old_steps[i].text
+                        else [i - 1]
+                        if i
+                        else []
+                    )
+                    for i, text in enumerate(steps)
+                ]
+
+        if step_dependencies is not None:
+            step_dependencies = self._validate_dependencies(
+                step_dependencies, len(new_steps or plan.steps)
+            )
 
-            plan["steps"] = steps
-            plan["step_statuses"] = new_statuses
-            plan["step_notes"] = new_notes
+        plan.update(title=title, steps=new_steps, dependencies=step_dependencies)
 
         return ToolResult(
             output=f"Plan updated successfully: {plan_id}\n\n{self._format_plan(plan)}"
@@ -216,12 +283,9 @@ class PlanningTool(BaseTool):
         output = "Available plans:\n"
         for plan_id, plan in self.plans.items():
             current_marker = " (active)" if plan_id == self._current_plan_id else ""
-            completed = sum(
-                1 for status in plan["step_statuses"] if status == "completed"
-            )
-            total = len(plan["steps"])
-            progress = f"{completed}/{total} steps completed"
-            output += f"• {plan_id}{current_marker}: {plan['title']} - {progress}\n"
+            completed = sum(1 for step in plan.steps if step.status == "completed")
+            progress = f"{completed}/{len(plan.steps)} steps completed"
+            output += f"• {plan_id}{current_marker}: {plan.title} - {progress}\n"
 
         return ToolResult(output=output)
 
@@ -278,26 +342,21 @@ class PlanningTool(BaseTool):
 
         plan = self.plans[plan_id]
 
-        if step_index < 0 or step_index >= len(plan["steps"]):
+        if step_index < 0 or step_index >= len(plan.steps):
             raise ToolError(
-                f"Invalid step_index: {step_index}. Valid indices range from 0 to {len(plan['steps'])-1}."
+                f"Invalid step_index: {step_index}. Valid indices range from 0 to {len(plan.steps)-1}."
             )
 
-        if step_status and step_status not in [
-            "not_started",
-            "in_progress",
-            "completed",
-            "blocked",
-        ]:
+        if step_status and step_status not in STEP_STATUSES:
             raise ToolError(
                 f"Invalid step_status: {step_status}. Valid statuses are: not_started, in_progress, completed, blocked"
             )
 
         if step_status:
-            plan["step_statuses"][step_index] = step_status
+            plan.set_status(step_index, step_status)
 
         if step_notes:
-            plan["step_notes"][step_index] = step_notes
+            plan.set_notes(step_index, step_notes)
 
         return ToolResult(
             output=f"Step {step_index} updated in plan '{plan_id}'.\n\n{self._format_plan(plan)}"
@@ -319,45 +378,6 @@ class PlanningTool(BaseTool):
 
         return ToolResult(output=f"Plan '{plan_id}' has been deleted.")
 
-    def _format_plan(self, plan: Dict) -> str:
-        """Format a plan for display."""
-        output = f"Plan: {plan['title']} (ID: {plan['plan_id']})\n"
-        output += "=" * len(output) + "\n\n"
-
-        # Calculate progress statistics
-        total_steps = len(plan["steps"])
-        completed = sum(1 for status in plan["step_statuses"] if status == "completed")
-        in_progress = sum(
-            1 for status in plan["step_statuses"] if status == "in_progress"
-        )
-        blocked = sum(1 for status in plan["step_statuses"] if status == "blocked")
-        not_started = sum(
-            1 for status in plan["step_statuses"] if status == "not_started"
-        )
-
-        output += f"Progress: {completed}/{total_steps} steps completed "
-        if total_steps > 0:
-            percentage = (completed / total_steps) * 100
-            output += f"({percentage:.1f}%)\n"
-        else:
-            output += "(0%)\n"
-
-        output += f"Status: {completed} completed, {in_progress} in progress, {blocked} blocked, {not_started} not started\n\n"
-        output += "Steps:\n"
-
-        # Add each step with its status and notes
-        for i, (step, status, notes) in enumerate(
-            zip(plan["steps"], plan["step_statuses"], plan["step_notes"])
-        ):
-            status_symbol = {
-                "not_started": "[ ]",
-                "in_progress": "[→]",
-                "completed": "[✓]",
-                "blocked": "[!]",
-            }.get(status, "[ ]")
-
-            output += f"{i}. {status_symbol} {step}\n"
-            if notes:
-                output += f"   Notes: {notes}\n"
-
-        return output
+    def _format_plan(self, plan: Plan) -> str:
+        """Format a plan for display; the text is cached until the plan changes."""
+        return plan.render()
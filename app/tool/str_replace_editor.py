@@ -2,12 +2,12 @@
 
 from collections import defaultdict
 from pathlib import Path
-from typing import Any, DefaultDict, List, Literal, Optional, get_args
+from typing import Any, DefaultDict, Dict, List, Literal, Optional, get_args
 
 from app.config import config
 from app.exceptions import ToolError
 from app.tool import BaseTool
-from app.tool.base import CLIResult, ToolResult
+from app.tool.base import CachePolicy, CLIResult, ToolResult
 from app.tool.file_operators import (
     FileOperator,
     LocalFileOperator,
@@ -111,6 +111,32 @@ class StrReplaceEditor(BaseTool):
             else self._local_operator
         )
 
+    def dump_state(self) -> Optional[Dict[str, Any]]:
+        """Undo history per file, so `undo_edit` survives a resumed run."""
+        history = {str(path): texts for path, texts in self._file_history.items()}
+        return {"file_history": history} if history else None
+
+    def load_state(self, state: Dict[str, Any]) -> None:
+        self._file_history = defaultdict(list, state.get("file_history", {}))
+
+    def is_concurrency_safe(self, command: str = None, **kwargs) -> bool:
+        """Only `view` is read-only; edits must keep their order."""
+        return command == "view"
+
+    def cache_policy(
+        self, command: str = None, path: str = None, **kwargs
+    ) -> Optional[CachePolicy]:
+        """Local file `view` calls are reused until the file changes.
+
+        Directory listings are not cached: they go two levels deep, and a new
+        file in a subdirectory does not change the directory's own mtime.
+        """
+        if command != "view" or not path or config.sandbox.use_sandbox:
+            return None
+        if Path(path).is_dir():
+            return None
+        return CachePolicy(files=[path])
+
     async def execute(
         self,
         *,
@@ -1,9 +1,12 @@
 """Collection classes for managing multiple tools."""
-from typing import Any, Dict, List
+import json
+from typing import Any, Dict, List, Optional
 
 from app.exceptions import ToolError
 from app.logger import logger
 from app.tool.base import BaseTool, ToolFailure, ToolResult
+from app.tool.cache import ToolResultCache, tool_cache
+from app.tracing import tracer
 
 
 class ToolCollection:
@@ -15,12 +18,23 @@ class ToolCollection:
     def __init__(self, *tools: BaseTool):
         self.tools = tools
         self.tool_map = {tool.name: tool for tool in tools}
+        self._params: Optional[List[Dict[str, Any]]] = None
+        self._params_source: Optional[tuple] = None
+        self.cache: ToolResultCache = tool_cache
 
     def __iter__(self):
         return iter(self.tools)
 
     def to_params(self) -> List[Dict[str, Any]]:
-        return [tool.to_param() for tool in self.tools]
+        """Return the function call schemas of all tools.
+
+        The list is memoized and only rebuilt when `tools` is reassigned, so
+        repeated agent steps send a byte-identical (cacheable) tool prefix.
+        """
+        if self._params is None or self._params_source is not self.tools:
+            self._params = [tool.to_param() for tool in self.tools]
+            self._params_source = self.tools
+        return self._params
 
     async def execute(
         self, *, name: str, tool_input: Dict[str, Any] = None
@@ -28,11 +42,37 @@ class ToolCollection:
         tool = self.tool_map.get(name)
         if not tool:
             return ToolFailure(error=f"Tool {name} is invalid")
-        try:
-            result = await tool(**tool_input)
+        with tracer.span("tool.execute", tool=name) as span:
+            policy = (
+                tool.cache_policy(**(tool_input or {})) if self.cache.enabled else None
+            )
+            cached = self.cache.get(name, tool_input, policy) if policy else None
+            if cached is not None:
+                span.set_attribute("cache_hits", 1)
+                return cached
+
+            try:
+                result = await tool(**tool_input)
+            except ToolError as e:
+                result = ToolFailure(error=e.message)
+            if policy:
+                self.cache.put(name, tool_input, policy, result)
+            if span.recording:
+                error = getattr(result, "error", None)
+                output = error or getattr(result, "output", result)
+                span.set_attributes(
+                    input_bytes=len(json.dumps(tool_input or {}, default=str)),
+                    output_bytes=len(str(output)) if output is not None else 0,
+                    error=bool(error),
+                )
             return result
-        except ToolError as e:
-            return ToolFailure(error=e.message)
+
+    def is_concurrency_safe(
+        self, *, name: str, tool_input: Dict[str, Any] = None
+    ) -> bool:
+        """Whether the named tool call may run concurrently with other safe calls."""
+        tool = self.tool_map.get(name)
+        return bool(tool and tool.is_concurrency_safe(**(tool_input or {})))
 
     async def execute_all(self) -> List[ToolResult]:
         """Execute all tools in the collection sequentially."""
@@ -8,7 +8,7 @@ from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.config import config
 from app.logger import logger
-from app.tool.base import BaseTool, ToolResult
+from app.tool.base import BaseTool, CachePolicy, ToolResult
 from app.tool.search import (
     BaiduSearchEngine,
     BingSearchEngine,
@@ -190,6 +190,7 @@ class WebSearch(BaseTool):
         },
         "required": ["query"],
     }
+    concurrency_safe: bool = True
     _search_engine: dict[str, WebSearchEngine] = {
         "google": GoogleSearchEngine(),
         "baidu": BaiduSearchEngine(),
@@ -198,6 +199,10 @@ class WebSearch(BaseTool):
     }
     content_fetcher: WebContentFetcher = WebContentFetcher()
 
+    def cache_policy(self, **kwargs) -> Optional[CachePolicy]:
+        """Identical queries reuse results for an hour, also across runs."""
+        return CachePolicy(ttl=3600, persist=True)
+
     async def execute(
         self,
         query: str,
@@ -0,0 +1,274 @@
+"""Lightweight span tracing for agent runs.
+
+Spans follow the OpenTelemetry data model (trace/span ids, parent links, start
+and end times, attributes, status) and nest through a context variable, so
+concurrent tasks get the right parent. When a root span ends, its trace is
+written locally (OTLP-style JSONL and/or a Chrome trace viewable in
+chrome://tracing or Perfetto) and a per-span-name summary table is logged.
+No collector is required.
+
+Typical nesting: agent.run > agent.step > agent.think > llm.ask_tool >
+llm.request, and agent.act > tool.execute.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import secrets
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import PROJECT_ROOT, TracingSettings, config
+from app.logger import logger
+
+
+# Numeric attributes summed per span name in the summary table
+SUMMARY_ATTRIBUTES = ("cache_hits", "input_tokens", "completion_tokens", "output_bytes")
+
+
+class Span:
+    """A timed operation with attributes, linked to its parent span."""
+
+    recording = True
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attributes):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.root: "Span" = parent.root if parent else self
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.status = "OK"
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        task = asyncio.current_task() if _has_running_loop() else None
+        self.thread = id(task) if task else 0
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, key: str, amount: float) -> None:
+        """Increment a numeric attribute"""
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def record_error(self, error: BaseException) -> None:
+        self.status = "ERROR"
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_otel(self) -> dict:
+        """Serialize in the OTLP JSON span layout"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [
+                {"key": key, "value": _otel_value(value)}
+                for key, value in self.attributes.items()
+            ],
+            "status": {
+                "code": f"STATUS_CODE_{self.status}",
+                "message": self.status_message,
+            },
+        }
+
+    def to_chrome(self, lanes: Dict[int, int]) -> dict:
+        """Serialize as a Chrome trace complete event"""
+        return {
+            "name": self.name,
+            "cat": self.name.split(".")[0],
+            "ph": "X",
+            "ts": self.start_ns / 1000,
+            "dur": ((self.end_ns or self.start_ns) - self.start_ns) / 1000,
+            "pid": os.getpid(),
+            "tid": lanes.setdefault(self.thread, len(lanes)),
+            "args": {**self.attributes, "status": self.status},
+        }
+
+
+class _NoopSpan(Span):
+    """Returned when tracing is disabled; ignores all writes."""
+
+    recording = False
+
+    def __init__(self):
+        self.name = ""
+        self.attributes = {}
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes) -> None:
+        pass
+
+    def add(self, key: str, amount: float) -> None:
+        pass
+
+    def record_error(self, error: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def _has_running_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def _otel_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Tracer:
+    """Creates spans and exports each finished trace to local files."""
+
+    def __init__(self, settings: Optional[TracingSettings] = None):
+        settings = settings or TracingSettings()
+        self.enabled = settings.enabled
+        self.output_dir = Path(settings.output_dir)
+        if not self.output_dir.is_absolute():
+            self.output_dir = PROJECT_ROOT / self.output_dir
+        self.formats = settings.formats
+        self.summary = settings.summary
+        self._finished: Dict[str, List[Span]] = defaultdict(list)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """Open a span as a child of the current one"""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        span = Span(name, _current_span.get(), **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.end()
+            _current_span.reset(token)
+            self._finish(span)
+
+    def traced(self, name: Optional[str] = None) -> Callable:
+        """Decorator running an async function inside a span"""
+
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _finish(self, span: Span) -> None:
+        if span.root is not span and span.root.end_ns is not None:
+            # Its trace was exported when the root ended, e.g. a cancelled prefetch
+            logger.debug(f"Dropping span {span.name} that ended after its trace")
+            return
+        self._finished[span.trace_id].append(span)
+        if span.parent_id is None:
+            spans = self._finished.pop(span.trace_id)
+            try:
+                self.export(spans)
+            except Exception as e:
+                logger.warning(f"Failed to export trace {span.trace_id}: {e}")
+            if self.summary:
+                logger.info(f"Trace summary for {span.name}:\n{summarize(spans)}")
+
+    def export(self, spans: List[Span]) -> None:
+        """Write a finished trace to the configured local formats"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        trace_id = spans[0].trace_id
+        if "jsonl" in self.formats:
+            with (self.output_dir / "spans.jsonl").open("a", encoding="utf-8") as f:
+                for span in spans:
+                    f.write(json.dumps(span.to_otel(), default=str) + "\n")
+        if "chrome" in self.formats:
+            lanes: Dict[int, int] = {}
+            events = [span.to_chrome(lanes) for span in spans]
+            path = (
+                self.output_dir
+                / f"trace_{time.strftime('%Y%m%d%H%M%S')}_{trace_id[:8]}.json"
+            )
+            path.write_text(
+                json.dumps({"traceEvents": events}, default=str), encoding="utf-8"
+            )
+            logger.info(f"Chrome trace written to {path}")
+
+
+def summarize(spans: List[Span]) -> str:
+    """Aggregate spans by name into a plain-text table"""
+    rows: Dict[str, Dict[str, float]] = {}
+    for span in spans:
+        row = rows.setdefault(
+            span.name,
+            {"count": 0, "total": 0.0, "max": 0.0, "errors": 0}
+            | {key: 0 for key in SUMMARY_ATTRIBUTES},
+        )
+        row["count"] += 1
+        row["total"] += span.duration_ms
+        row["max"] = max(row["max"], span.duration_ms)
+        row["errors"] += span.status == "ERROR"
+        for key in SUMMARY_ATTRIBUTES:
+            value = span.attributes.get(key)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                row[key] += value
+
+    header = (
+        f"{'span':<24}{'count':>7}{'total ms':>12}{'mean ms':>10}{'max ms':>10}"
+        f"{'errors':>8}{'hits':>6}{'in tok':>10}{'out tok':>10}{'out bytes':>12}"
+    )
+    lines = [header, "-" * len(header)]
+    for name, row in sorted(rows.items(), key=lambda item: -item[1]["total"]):
+        lines.append(
+            f"{name:<24}{row['count']:>7}{row['total']:>12.1f}"
+            f"{row['total'] / row['count']:>10.1f}{row['max']:>10.1f}"
+            f"{row['errors']:>8}{row['cache_hits']:>6}{row['input_tokens']:>10}"
+            f"{row['completion_tokens']:>10}{row['output_bytes']:>12}"
+        )
+    return "\n".join(lines)
+
+
+def current_span() -> Span:
+    """The active span, or a no-op span outside any trace"""
+    return _current_span.get() or NOOP_SPAN
+
+
+tracer = Tracer(config.tracing)
@@ -0,0 +1,250 @@
+"""Orchestration overhead benchmark for the planning flow.
+
+Runs `PlanningFlow` with a stub executor agent and a stub planning LLM whose
+latency is drawn from a configurable distribution (zero by default), so what
+remains of the wall time is the flow's own work: picking the next step,
+building its prompt, updating the plan and finalizing. For each plan length
+and step context the benchmark reports
+
+- overhead: wall time minus the stub latencies, in total and per step, and
+  the gap between one step ending and the next one starting (p50/p95/max);
+- prompt sizes: characters of the first, last, mean and largest step prompt;
+- memory: peak and retained allocations and growth per step, measured with
+  tracemalloc in a separate run so it does not skew the timings.
+
+Results are printed and, with --output, written as JSON for regression
+tracking.
+
+Latency distributions: `0` or `fixed:S`, `uniform:LOW:HIGH`, `exp:MEAN` and
+`lognormal:MU:SIGMA`, all in seconds.
+
+Usage:
+    python -m examples.benchmarks.flow_overhead --steps 10 100 1000
+    python -m examples.benchmarks.flow_overhead --steps 50 \\
+        --agent-latency uniform:0:0.01 --output logs/flow_overhead.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+from app.agent.base import BaseAgent
+from app.flow.planning import PlanningFlow
+from app.schema import AgentState
+
+
+Latency = Callable[[], float]
+
+
+def parse_latency(spec: str, rng: random.Random) -> Latency:
+    """A sampler for a latency spec such as `uniform:0:0.01`"""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(":") if value]
+    if kind in ("0", "fixed"):
+        seconds = values[0] if values else 0.0
+        return lambda: seconds
+    if kind == "uniform":
+        return lambda: rng.uniform(*values)
+    if kind == "exp":
+        return lambda: rng.expovariate(1 / values[0])
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(*values)
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class StubAgent(BaseAgent):
+    """Finishes every step after a sampled latency, recording what it was sent"""
+
+    name: str = "stub"
+    max_steps: int = 1
+    latency: Optional[Latency] = None
+    trace_memory: bool = False
+    spent: float = 0.0
+    prompt_chars: List[int] = []
+    started: List[float] = []
+    ended: List[float] = []
+    memory_samples: List[int] = []
+
+    async def step(self) -> str:
+        self.started.append(time.perf_counter())
+        if self.trace_memory:
+            self.memory_samples.append(tracemalloc.get_traced_memory()[0])
+        self.prompt_chars.append(len(self.memory.messages[-1].content or ""))
+        delay = self.latency() if self.latency else 0.0
+        self.spent += delay
+        await asyncio.sleep(delay)
+        self.update_memory("assistant", "Done.")
+        self.state = AgentState.FINISHED
+        self.ended.append(time.perf_counter())
+        return "done"
+
+
+class StubPlanner:
+    """Stands in for the flow's LLM: plans `steps` steps and summarizes instantly"""
+
+    def __init__(self, steps: int, latency: Latency):
+        self.steps = steps
+        self.latency = latency
+        self.spent = 0.0
+
+    async def _wait(self) -> None:
+        delay = self.latency()
+        self.spent += delay
+        await asyncio.sleep(delay)
+
+    async def ask_tool(self, **kwargs):
+        await self._wait()
+        arguments = {
+            "command": "create",
+            "title": "Synthetic plan",
+            "steps": [f"Do part {i} of the task" for i in range(self.steps)],
+        }
+        call = SimpleNamespace(
+            function=SimpleNamespace(name="planning", arguments=json.dumps(arguments))
+        )
+        return SimpleNamespace(tool_calls=[call], content=None)
+
+    async def ask(self, **kwargs) -> str:
+        await self._wait()
+        return "All parts are done."
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_once(
+    steps: int,
+    step_context: str,
+    agent_latency: Latency,
+    planner_latency: Latency,
+    trace_memory: bool = False,
+) -> tuple[StubAgent, StubPlanner, float]:
+    # Prompts and memory are per run; the defaults would be shared between runs
+    agent = StubAgent(
+        latency=agent_latency,
+        trace_memory=trace_memory,
+        prompt_chars=[],
+        started=[],
+        ended=[],
+        memory_samples=[],
+    )
+    flow = PlanningFlow(agent, step_context=step_context, template_cache=None)
+    planner = StubPlanner(steps, planner_latency)
+    flow.llm = planner
+
+    start = time.perf_counter()
+    await flow.execute("Synthetic task")
+    return agent, planner, time.perf_counter() - start
+
+
+async def measure(
+    steps: int, step_context: str, agent_latency: Latency, planner_latency: Latency
+) -> Dict:
+    agent, planner, wall = await run_once(
+        steps, step_context, agent_latency, planner_latency
+    )
+    overhead = wall - agent.spent - planner.spent
+    gaps = [(start - end) * 1000 for end, start in zip(agent.ended, agent.started[1:])]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    traced, _, _ = await run_once(
+        steps, step_context, agent_latency, planner_latency, trace_memory=True
+    )
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    samples = traced.memory_samples
+    growth = (samples[-1] - samples[0]) / (len(samples) - 1) if len(samples) > 1 else 0
+
+    prompts = agent.prompt_chars
+    return {
+        "steps": steps,
+        "step_context": step_context,
+        "completed_steps": len(agent.ended),
+        "wall_s": round(wall, 4),
+        "agent_latency_s": round(agent.spent, 4),
+        "planner_latency_s": round(planner.spent, 4),
+        "overhead_s": round(overhead, 4),
+        "overhead_per_step_ms": round(1000 * overhead / steps, 3),
+        "step_gap_ms": {
+            "p50": round(_percentile(gaps, 0.5), 3),
+            "p95": round(_percentile(gaps, 0.95), 3),
+            "max": round(max(gaps, default=0.0), 3),
+        },
+        "prompt_chars": {
+            "first": prompts[0] if prompts else 0,
+            "last": prompts[-1] if prompts else 0,
+            "mean": round(statistics.fmean(prompts)) if prompts else 0,
+            "max": max(prompts, default=0),
+        },
+        "memory": {
+            "peak_kb": round((peak - before) / 1024, 1),
+            "retained_kb": round((retained - before) / 1024, 1),
+            "growth_bytes_per_step": round(growth),
+        },
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    agent_latency = parse_latency(args.agent_latency, rng)
+    planner_latency = parse_latency(args.planner_latency, rng)
+
+    results = []
+    for steps in args.steps:
+        for step_context in args.step_context:
+            result = await measure(steps, step_context, agent_latency, planner_latency)
+            results.append(result)
+            print(
+                f"{steps:>5} steps, {step_context:<7}: "
+                f"{result['overhead_per_step_ms']:.3f} ms overhead per step, "
+                f"p95 gap {result['step_gap_ms']['p95']:.3f} ms, "
+                f"mean prompt {result['prompt_chars']['mean']} chars, "
+                f"{result['memory']['growth_bytes_per_step']} B/step"
+            )
+
+    report = {
+        "benchmark": "flow_overhead",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "agent_latency": args.agent_latency,
+        "planner_latency": args.planner_latency,
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output:
+        path = Path(args.output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote {path}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument(
+        "--step-context",
+        nargs="+",
+        default=["full", "compact"],
+        choices=["full", "compact"],
+    )
+    parser.add_argument("--agent-latency", default="0")
+    parser.add_argument("--planner-latency", default="0")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,126 @@
+"""Replay benchmark for the agent loop guard.
+
+Replays a scripted trajectory in which the model makes a few productive tool
+calls and then repeats the same call until `max_steps`, once with the loop guard
+disabled and once enabled, and reports the LLM calls and input tokens each run
+spent. Responses are served by the record/replay transport, so the
+benchmark runs offline and deterministically.
+
+Usage:
+    python -m examples.benchmarks.loop_guard_replay --productive 3 --max-steps 20
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from app.agent.toolcall import ToolCallAgent
+from app.loop_guard import LoopGuard
+from app.replay import RecordReplayTransport, ReplayClient
+from app.tool import Terminate, ToolCollection
+from app.tool.base import BaseTool
+
+
+class Lookup(BaseTool):
+    name: str = "lookup"
+    description: str = "Look up a topic."
+    parameters: dict = {
+        "type": "object",
+        "properties": {"query": {"type": "string"}},
+        "required": ["query"],
+    }
+
+    async def execute(self, query: str) -> str:
+        return f"Results for '{query}': " + "no new information. " * 8
+
+
+def _response(step: int, query: str) -> dict:
+    return {
+        "id": f"replay-{step}",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "replay",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "tool_calls",
+                "message": {
+                    "role": "assistant",
+                    "content": f"Looking up {query}.",
+                    "tool_calls": [
+                        {
+                            "id": f"call_{step}",
+                            "type": "function",
+                            "function": {
+                                "name": "lookup",
+                                "arguments": json.dumps({"query": query}),
+                            },
+                        }
+                    ],
+                },
+            }
+        ],
+        "usage": {
+            "prompt_tokens": 1500 + 300 * step,
+            "completion_tokens": 40,
+            "total_tokens": 1540 + 300 * step,
+        },
+    }
+
+
+def write_trajectory(path: Path, productive: int, max_steps: int) -> None:
+    """Write a replay file: distinct lookups, then the same lookup repeated"""
+    with path.open("w", encoding="utf-8") as f:
+        for step in range(max_steps):
+            query = f"topic {step}" if step < productive else "topic stuck"
+            record = {"key": "", "response": _response(step, query), "elapsed": 0.0}
+            f.write(json.dumps(record) + "\n")
+
+
+async def run_once(path: Path, max_steps: int, guarded: bool) -> dict:
+    agent = ToolCallAgent(
+        available_tools=ToolCollection(Lookup(), Terminate()),
+        max_steps=max_steps,
+        loop_guard=LoopGuard() if guarded else None,
+        compact_context=False,
+    )
+    agent.llm.client = ReplayClient(None, RecordReplayTransport("replay", path))
+    agent.llm.coalesce_requests = False
+    tokens_before = agent.llm.total_input_tokens
+
+    start = time.perf_counter()
+    await agent.run("Find out what is new.")
+    return {
+        "loop_guard": guarded,
+        "llm_calls": sum(1 for m in agent.memory.messages if m.tool_calls),
+        "input_tokens": agent.llm.total_input_tokens - tokens_before,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+async def main(productive: int, max_steps: int) -> None:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for guarded in (False, True):
+            path = Path(tmp) / f"trajectory_{guarded}.jsonl"
+            write_trajectory(path, productive, max_steps)
+            results.append(await run_once(path, max_steps, guarded))
+
+    baseline, guarded = results
+    print(json.dumps(results, indent=2))
+    print(
+        f"Loop guard saved {baseline['llm_calls'] - guarded['llm_calls']} of "
+        f"{baseline['llm_calls']} LLM calls and "
+        f"{baseline['input_tokens'] - guarded['input_tokens']} input tokens"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--productive", type=int, default=3)
+    parser.add_argument("--max-steps", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.productive, args.max_steps))
@@ -0,0 +1,177 @@
+"""Replay benchmark for compact step prompts in the planning flow.
+
+Runs the same plan twice, once with the full plan text in every step prompt
+(`step_context="full"`) and once with compact prompts that only carry the
+current step, a summary of recent results and the remaining steps. Each step
+makes one lookup and then terminates; responses come from the record/replay
+transport, so only the prompts differ between runs. Input tokens and
+characters are counted locally from the messages each request sends.
+
+Usage:
+    python -m examples.benchmarks.step_context_replay --steps 8
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from app.agent.toolcall import ToolCallAgent
+from app.flow.planning import PlanningFlow
+from app.replay import RecordReplayTransport, ReplayClient
+from app.tool import Terminate, ToolCollection
+from app.tool.base import BaseTool
+
+
+class Lookup(BaseTool):
+    name: str = "lookup"
+    description: str = "Look up a topic."
+    parameters: dict = {
+        "type": "object",
+        "properties": {"query": {"type": "string"}},
+        "required": ["query"],
+    }
+
+    async def execute(self, query: str) -> str:
+        return f"Findings for '{query}': " + "a relevant detail. " * 60
+
+
+class MeasuringTransport(RecordReplayTransport):
+    """Replay transport that measures the messages of every request"""
+
+    def __init__(self, path: Path, llm):
+        super().__init__("replay", path)
+        self.llm = llm
+        self.requests = 0
+        self.input_tokens = 0
+        self.input_chars = 0
+
+    async def invoke(self, params, call, response_model=None):
+        self.requests += 1
+        self.input_tokens += self.llm.count_message_tokens(params["messages"])
+        self.input_chars += sum(
+            len(str(message.get("content") or "")) for message in params["messages"]
+        )
+        return await super().invoke(params, call, response_model)
+
+
+class StepsOnlyFlow(PlanningFlow):
+    """Skips the final summary so only step prompts are measured"""
+
+    async def _finalize_plan(self) -> str:
+        return ""
+
+
+def _response(call_id: str, content: str, name: str, arguments: dict) -> dict:
+    return {
+        "id": f"replay-{call_id}",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "replay",
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "tool_calls",
+                "message": {
+                    "role": "assistant",
+                    "content": content,
+                    "tool_calls": [
+                        {
+                            "id": f"call_{call_id}",
+                            "type": "function",
+                            "function": {
+                                "name": name,
+                                "arguments": json.dumps(arguments),
+                            },
+                        }
+                    ],
+                },
+            }
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def write_trajectory(path: Path, steps: int) -> None:
+    """Write a replay file: each step looks something up, then terminates"""
+    with path.open("w", encoding="utf-8") as f:
+        for step in range(steps):
+            responses = [
+                _response(
+                    f"{step}a",
+                    f"Researching part {step}.",
+                    "lookup",
+                    {"query": f"part {step}"},
+                ),
+                _response(
+                    f"{step}b",
+                    f"Part {step} is covered; the key detail is recorded.",
+                    "terminate",
+                    {"status": "success"},
+                ),
+            ]
+            for response in responses:
+                record = {"key": "", "response": response, "elapsed": 0.0}
+                f.write(json.dumps(record) + "\n")
+
+
+async def run_once(path: Path, steps: int, step_context: str) -> dict:
+    agent = ToolCallAgent(
+        available_tools=ToolCollection(Lookup(), Terminate()),
+        max_steps=4 * steps,
+        compact_context=False,
+    )
+    transport = MeasuringTransport(path, agent.llm)
+    agent.llm.client = ReplayClient(None, transport)
+    agent.llm.coalesce_requests = False
+
+    flow = StepsOnlyFlow(agent, step_context=step_context)
+    await flow.planning_tool.execute(
+        command="create",
+        plan_id=flow.active_plan_id,
+        title="Write a report on the topic",
+        steps=[
+            f"Research part {i} of the topic and note the key findings"
+            for i in range(steps)
+        ],
+    )
+
+    start = time.perf_counter()
+    await flow.execute("")
+    return {
+        "step_context": step_context,
+        "steps": steps,
+        "llm_calls": transport.requests,
+        "input_tokens": transport.input_tokens,
+        "input_tokens_per_step": round(transport.input_tokens / steps),
+        "input_chars": transport.input_chars,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+async def main(steps: int) -> None:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for step_context in ("full", "compact"):
+            path = Path(tmp) / f"trajectory_{step_context}.jsonl"
+            write_trajectory(path, steps)
+            results.append(await run_once(path, steps, step_context))
+
+    full, compact = results
+    print(json.dumps(results, indent=2))
+    saved = full["input_tokens"] - compact["input_tokens"]
+    saved_chars = full["input_chars"] - compact["input_chars"]
+    print(
+        f"Compact step prompts saved {saved} of {full['input_tokens']} input tokens "
+        f"({saved / max(full['input_tokens'], 1):.0%}) and {saved_chars} of "
+        f"{full['input_chars']} characters"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(main(args.steps))
@@ -1,44 +1,143 @@
+import argparse
 import asyncio
 import time
 
 from app.agent.manus import Manus
+from app.agent.pool import AgentPool
+from app.checkpoint import CheckpointStore
+from app.flow.budget import FlowBudget
+from app.flow.events import JsonlEventSink, PlanEventBus, PlanMetrics
 from app.flow.flow_factory import FlowFactory, FlowType
 from app.logger import logger
 
 
-async def run_flow():
+# Time allowed past the budget for the flow to wrap up before it is cancelled
+HARD_CAP_GRACE_SECONDS = 60
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the planning flow")
+    parser.add_argument(
+        "--checkpoint",
+        help="Checkpoint file written after every step, used to resume the run",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume the run saved in --checkpoint instead of asking for a prompt",
+    )
+    parser.add_argument(
+        "--compact-steps",
+        action="store_true",
+        help="Send each step a summary of recent results instead of the full plan",
+    )
+    parser.add_argument(
+        "--speculative",
+        action="store_true",
+        help="Summarize each finished step while the next one runs, so the "
+        "plan is finalized without a last LLM call",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=0,
+        help="Run steps on this many warm agents that keep browser and MCP "
+        "sessions open until the flow ends",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=3600,
+        help="Seconds for the whole run; the flow returns a partial result when "
+        "it runs out (default: 3600)",
+    )
+    parser.add_argument(
+        "--token-budget",
+        type=int,
+        help="Input plus completion tokens for the whole run",
+    )
+    parser.add_argument(
+        "--fallback-llm",
+        help="Name of an [llm.<name>] config to switch to when the budget runs low",
+    )
+    parser.add_argument(
+        "--events",
+        help="JSON Lines file to append plan step events to",
+    )
+    return parser.parse_args()
+
+
+async def run_flow(
+    checkpoint_path: str | None = None,
+    resume: bool = False,
+    compact_steps: bool = False,
+    speculative: bool = False,
+    pool_size: int = 0,
+    budget: FlowBudget | None = None,
+    events_path: str | None = None,
+):
     agents = {
         "manus": Manus(),
     }
 
     try:
-        prompt = input("Enter your prompt: ")
+        checkpoint = CheckpointStore(checkpoint_path) if checkpoint_path else None
+        if resume:
+            if not checkpoint or checkpoint.load_flow() is None:
+                logger.warning("No checkpoint to resume from.")
+                return
+            prompt = ""
+        else:
+            if checkpoint and checkpoint.path.exists():
+                logger.warning(
+                    f"Checkpoint {checkpoint.path} already exists. "
+                    "Pass --resume to continue it or choose another path."
+                )
+                return
 
-        if prompt.strip().isspace() or not prompt:
-            logger.warning("Empty prompt provided.")
-            return
+            prompt = input("Enter your prompt: ")
+
+            if prompt.strip().isspace() or not prompt:
+                logger.warning("Empty prompt provided.")
+                return
+
+        events = PlanEventBus()
+        metrics = events.subscribe(PlanMetrics())
+        if events_path:
+            events.subscribe(JsonlEventSink(events_path))
 
         flow = FlowFactory.create_flow(
             flow_type=FlowType.PLANNING,
             agents=agents,
+            checkpoint=checkpoint,
+            step_context="compact" if compact_steps else "full",
+            speculative=speculative,
+            executor_pools=(
+                {"default": AgentPool(Manus.create, size=pool_size)}
+                if pool_size
+                else {}
+            ),
+            budget=budget,
+            events=events,
         )
         logger.warning("Processing your request...")
 
-        try:
-            start_time = time.time()
-            result = await asyncio.wait_for(
-                flow.execute(prompt),
-                timeout=3600,  # 60 minute timeout for the entire execution
-            )
-            elapsed_time = time.time() - start_time
-            logger.info(f"Request processed in {elapsed_time:.2f} seconds")
-            logger.info(result)
-        except asyncio.TimeoutError:
-            logger.error("Request processing timed out after 1 hour")
-            logger.info(
-                "Operation terminated due to timeout. Please try a simpler request."
-            )
+        # The budget stops the flow in time and keeps its partial result; the
+        # hard cap is a backstop in case a call ignores it
+        start_time = time.time()
+        hard_cap = (
+            budget.max_seconds + HARD_CAP_GRACE_SECONDS
+            if budget and budget.max_seconds
+            else None
+        )
+        result = await asyncio.wait_for(flow.execute(prompt), timeout=hard_cap)
+        elapsed_time = time.time() - start_time
+        logger.info(f"Request processed in {elapsed_time:.2f} seconds")
+        logger.info(f"Plan events: {metrics.summary()}")
+        logger.info(result)
 
+    except asyncio.TimeoutError:
+        logger.error("Request processing timed out after the hard time cap")
     except KeyboardInterrupt:
         logger.info("Operation cancelled by user.")
     except Exception as e:
@@ -46,4 +145,20 @@ async def run_flow():
 
 
 if __name__ == "__main__":
-    asyncio.run(run_flow())
+    args = parse_args()
+    budget = FlowBudget(
+        max_seconds=args.time_budget,
+        max_tokens=args.token_budget,
+        fallback_llm=args.fallback_llm,
+    )
+    asyncio.run(
+        run_flow(
+            args.checkpoint,
+            args.resume,
+            args.compact_steps,
+            args.speculative,
+            args.pool_size,
+            budget,
+            args.events,
+        )
+    )
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+import argparse
+import asyncio
+import json
+import sys
+
+from app.agent.manus import Manus
+from app.agent.pool import AgentPool
+from app.logger import logger
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Run independent prompts concurrently on a pool of agents"
+    )
+    parser.add_argument(
+        "prompts",
+        nargs="?",
+        help="File with one prompt per line (default: read from stdin)",
+    )
+    parser.add_argument(
+        "--size", "-n", type=int, default=4, help="Number of pooled agents"
+    )
+    return parser.parse_args()
+
+
+async def run_pool(prompts: list[str], size: int) -> None:
+    async with AgentPool(Manus.create, size=size) as pool:
+        results = await asyncio.gather(
+            *(pool.run(prompt) for prompt in prompts), return_exceptions=True
+        )
+        for prompt, result in zip(prompts, results):
+            if isinstance(result, Exception):
+                logger.error(f"Request failed: {prompt[:60]}: {result}")
+            else:
+                logger.info(f"Request completed: {prompt[:60]}\n{result}")
+        logger.info(f"Pool stats: {json.dumps(pool.stats(), indent=2)}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    source = open(args.prompts, encoding="utf-8") if args.prompts else sys.stdin
+    with source:
+        prompts = [line.strip() for line in source if line.strip()]
+    if not prompts:
+        logger.warning("No prompts provided.")
+    else:
+        asyncio.run(run_pool(prompts, args.size))
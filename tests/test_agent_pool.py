@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from app.agent.base import BaseAgent
+from app.agent.pool import AgentPool
+from app.flow.planning import PlanningFlow
+from app.schema import AgentState
+from app.tool import PlanningTool
+
+
+class EchoAgent(BaseAgent):
+    """Agent whose single step waits briefly and echoes what it has seen."""
+
+    name: str = "echo"
+    max_steps: int = 2
+
+    async def step(self) -> str:
+        await asyncio.sleep(0.05)
+        if "fail" in self.messages[0].content:
+            raise ValueError("boom")
+        self.state = AgentState.FINISHED
+        return "|".join(m.content for m in self.messages)
+
+
+async def make_agent() -> EchoAgent:
+    return EchoAgent()
+
+
+@pytest.mark.asyncio
+async def test_requests_run_concurrently_with_isolated_memory():
+    """Tests that pooled agents overlap requests and never see earlier ones."""
+    async with AgentPool(make_agent, size=3) as pool:
+        started = asyncio.get_running_loop().time()
+        results = await asyncio.gather(*(pool.run(f"r{i}") for i in range(6)))
+        elapsed = asyncio.get_running_loop().time() - started
+        stats = pool.stats()
+
+    assert results == [f"Step 1: r{i}" for i in range(6)]
+    assert elapsed < 0.25
+    assert stats["completed"] == 6
+    assert stats["queue_wait_p95_s"] > 0
+
+
+@pytest.mark.asyncio
+async def test_failed_request_does_not_poison_agent():
+    """Tests that an agent serves the next request after one raises."""
+    async with AgentPool(make_agent, size=1) as pool:
+        with pytest.raises(ValueError):
+            await pool.run("fail")
+        assert await pool.run("ok") == "Step 1: ok"
+        assert pool.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_flow_routes_step_types_to_warm_pools():
+    """Tests that tagged steps reuse their pool's agents and clean up at flow end."""
+    created, cleaned = [], []
+
+    class WarmAgent(EchoAgent):
+        async def cleanup(self) -> None:
+            cleaned.append(self.name)
+
+    def factory(kind: str):
+        async def make() -> WarmAgent:
+            created.append(kind)
+            return WarmAgent(name=kind)
+
+        return make
+
+    class QuietFlow(PlanningFlow):
+        async def _finalize_plan(self) -> str:
+            return "finalized"
+
+    tool = PlanningTool()
+    await tool.execute(
+        command="create",
+        plan_id="p",
+        title="Trip",
+        steps=["[SEARCH] flights", "[SEARCH] hotels", "Book", "[SEARCH] cars"],
+    )
+    flow = QuietFlow(
+        EchoAgent(),
+        planning_tool=tool,
+        plan_id="p",
+        executor_pools={
+            "search": AgentPool(factory("search"), size=1),
+            "default": AgentPool(factory("default"), size=1),
+        },
+    )
+
+    result = await flow.execute("")
+
+    assert created == ["search", "default"]
+    assert cleaned == ["search", "default"]
+    assert tool.plans["p"]["step_statuses"] == ["completed"] * 4
+    # Each step starts from fresh memory: the echo holds only its own prompt
+    assert result.count("You are now working on step") == 4
+    assert 'step 0: "[SEARCH] flights"' not in result.split("Step 1:")[2]
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app import bedrock
+from app.bedrock import BedrockClient
+
+
+class StubBoto3Client:
+    """Records requests and answers them from canned responses."""
+
+    def __init__(self, stream_events=None):
+        self.stream_events = stream_events or []
+        self.requests = []
+        self.threads = set()
+
+    def converse(self, **request):
+        self.requests.append(request)
+        self.threads.add(threading.current_thread().name)
+        # Answers with the ids of the tool results it was sent
+        ids = [
+            item["toolResult"]["toolUseId"]
+            for item in request["messages"][-1]["content"]
+            if "toolResult" in item
+        ]
+        return {
+            "output": {
+                "message": {"role": "assistant", "content": [{"text": ",".join(ids)}]}
+            },
+            "stopReason": "end_turn",
+            "usage": {"inputTokens": 3, "outputTokens": 1, "totalTokens": 4},
+        }
+
+    def converse_stream(self, **request):
+        self.requests.append(request)
+        return {"stream": iter(self.stream_events)}
+
+
+@pytest.fixture
+def stub_boto3(monkeypatch):
+    created = []
+
+    def client(service_name, config=None):
+        created.append(StubBoto3Client())
+        return created[-1]
+
+    monkeypatch.setattr(bedrock.boto3, "client", client)
+    monkeypatch.setattr(BedrockClient, "_shared_client", None)
+    monkeypatch.setattr(BedrockClient, "_shared_executor", None)
+    return created
+
+
+def tool_turn(call_ids):
+    calls = [
+        {"id": call_id, "function": {"name": "lookup", "arguments": "{}"}}
+        for call_id in call_ids
+    ]
+    return [
+        {"role": "user", "content": "look it up"},
+        {"role": "assistant", "content": None, "tool_calls": calls},
+    ] + [
+        {"role": "tool", "tool_call_id": call_id, "content": f"result {call_id}"}
+        for call_id in call_ids
+    ]
+
+
+def test_clients_share_one_boto3_client_and_executor(stub_boto3):
+    """Tests that every BedrockClient reuses the first boto3 client and pool."""
+    first, second = BedrockClient(), BedrockClient()
+
+    assert len(stub_boto3) == 1
+    assert first.client is second.client is stub_boto3[0]
+    assert first.executor is second.executor
+    assert first.chat.completions.executor is first.executor
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_keep_their_own_tool_use_ids(stub_boto3):
+    """Tests that parallel requests send their own toolUseIds off the event loop."""
+    completions = BedrockClient().chat.completions
+
+    responses = await asyncio.gather(
+        *[
+            completions.create(
+                model="m",
+                messages=tool_turn([f"call_{n}a", f"call_{n}b"]),
+                max_tokens=10,
+                temperature=0,
+                stream=False,
+            )
+            for n in range(4)
+        ]
+    )
+
+    client = stub_boto3[0]
+    assert {name.split("_")[0] for name in client.threads} == {"bedrock"}
+    # Both results of a request go back in one user turn, each with its own id
+    for n, response in enumerate(responses):
+        assert response.choices[0].message.content == f"call_{n}a,call_{n}b"
+    assert all(len(r["messages"]) == 3 for r in client.requests)
+
+
+@pytest.mark.asyncio
+async def test_stream_events_assemble_into_text_and_tool_calls(stub_boto3):
+    """Tests that converse_stream deltas rebuild the text and tool call arguments."""
+    completions = BedrockClient().chat.completions
+    stub_boto3[0].stream_events = [
+        {"messageStart": {"role": "assistant"}},
+        {"contentBlockDelta": {"contentBlockIndex": 0, "delta": {"text": "Look"}}},
+        {"contentBlockDelta": {"contentBlockIndex": 0, "delta": {"text": "ing"}}},
+        {
+            "contentBlockStart": {
+                "contentBlockIndex": 1,
+                "start": {"toolUse": {"toolUseId": "t1", "name": "search"}},
+            }
+        },
+        {
+            "contentBlockStart": {
+                "contentBlockIndex": 2,
+                "start": {"toolUse": {"toolUseId": "t2", "name": "fetch"}},
+            }
+        },
+        {
+            "contentBlockDelta": {
+                "contentBlockIndex": 2,
+                "delta": {"toolUse": {"input": '{"url": '}},
+            }
+        },
+        {
+            "contentBlockDelta": {
+                "contentBlockIndex": 1,
+                "delta": {"toolUse": {"input": '{"q": "x"}'}},
+            }
+        },
+        {
+            "contentBlockDelta": {
+                "contentBlockIndex": 2,
+                "delta": {"toolUse": {"input": '"u"}'}},
+            }
+        },
+        {"messageStop": {"stopReason": "tool_use"}},
+        {"metadata": {"usage": {"inputTokens": 7, "outputTokens": 5}}},
+    ]
+
+    stream = await completions.create(
+        model="m",
+        messages=[{"role": "user", "content": "hi"}],
+        max_tokens=10,
+        temperature=0,
+        stream=True,
+    )
+    text, calls, finish_reason, usage = "", {}, None, None
+    async for chunk in stream:
+        choice = chunk.choices[0]
+        text += choice.delta.content or ""
+        for call in getattr(choice.delta, "tool_calls", None) or []:
+            entry = calls.setdefault(call.index, {"arguments": ""})
+            if getattr(call, "id", None):
+                entry.update(id=call.id, name=call.function.name)
+            entry["arguments"] += call.function.arguments
+        finish_reason = choice.finish_reason or finish_reason
+        usage = getattr(chunk, "usage", None) or usage
+
+    assert text == "Looking"
+    assert calls == {
+        0: {"id": "t1", "name": "search", "arguments": '{"q": "x"}'},
+        1: {"id": "t2", "name": "fetch", "arguments": '{"url": "u"}'},
+    }
+    assert json.loads(calls[1]["arguments"]) == {"url": "u"}
+    assert finish_reason == "tool_use"
+    assert usage.prompt_tokens == 7
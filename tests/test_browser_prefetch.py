@@ -0,0 +1,108 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.agent.browser import BrowserContextHelper
+from app.schema import Function, ToolCall
+from app.tool import ToolCollection
+from app.tool.base import BaseTool, ToolResult
+
+
+class StubBrowser(BaseTool):
+    """Each action loads a new page; capturing the state takes `delay` seconds."""
+
+    name: str = "browser_use"
+    description: str = "Stub browser"
+    delay: float = 0.0
+    page: int = 0
+    captures: int = 0
+    cancelled: int = 0
+
+    async def execute(self, **kwargs) -> ToolResult:
+        self.page += 1
+        return ToolResult(output=f"loaded page {self.page}")
+
+    async def get_current_state(self) -> ToolResult:
+        page = self.page
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        self.captures += 1
+        return ToolResult(output=json.dumps({"url": f"https://example.com/{page}"}))
+
+
+def tool_call(name: str) -> ToolCall:
+    return ToolCall(id=name, function=Function(name=name, arguments="{}"))
+
+
+def helper_for(browser: StubBrowser) -> BrowserContextHelper:
+    tools = ToolCollection(browser)
+    return BrowserContextHelper(SimpleNamespace(available_tools=tools))
+
+
+def executor(browser: StubBrowser):
+    async def execute(command: ToolCall) -> str:
+        if command.function.name == browser.name:
+            return str(await browser.execute())
+        return f"ran {command.function.name}"
+
+    return execute
+
+
+@pytest.mark.asyncio
+async def test_prefetched_state_is_reused_until_the_next_browser_action():
+    """Tests that the state captured after an action serves the next prompt."""
+    browser = StubBrowser()
+    helper = helper_for(browser)
+
+    await helper.execute_tool(tool_call("browser_use"), executor(browser))
+    # Other tools leave the page alone, so they keep the prefetch
+    await helper.execute_tool(tool_call("python_execute"), executor(browser))
+    await asyncio.sleep(0)
+
+    state = await helper.get_browser_state()
+
+    assert state == {"url": "https://example.com/1"}
+    assert browser.captures == 1
+    assert helper._prefetch_task is None
+    # With nothing prefetched the state is captured on demand
+    assert await helper.get_browser_state() == state
+    assert browser.captures == 2
+
+
+@pytest.mark.asyncio
+async def test_browser_action_cancels_a_pending_prefetch():
+    """Tests that a prefetch of the old page is dropped when the page changes."""
+    browser = StubBrowser(delay=0.05)
+    helper = helper_for(browser)
+
+    await helper.execute_tool(tool_call("browser_use"), executor(browser))
+    stale = helper._prefetch_task
+    await asyncio.sleep(0.01)
+    await helper.execute_tool(tool_call("browser_use"), executor(browser))
+
+    state = await helper.get_browser_state()
+
+    assert stale.cancelled()
+    assert browser.cancelled == 1
+    assert browser.captures == 1
+    assert state == {"url": "https://example.com/2"}
+
+
+@pytest.mark.asyncio
+async def test_cleanup_cancels_the_prefetch():
+    """Tests that cleaning up the browser does not leave a capture running."""
+    browser = StubBrowser(delay=0.05)
+    helper = helper_for(browser)
+    await helper.execute_tool(tool_call("browser_use"), executor(browser))
+    pending = helper._prefetch_task
+
+    await helper.cleanup_browser()
+    await asyncio.sleep(0)
+
+    assert pending.cancelled()
+    assert helper._prefetch_task is None
@@ -0,0 +1,103 @@
+import pytest
+
+from app.agent.base import BaseAgent
+from app.agent.toolcall import ToolCallAgent
+from app.checkpoint import CheckpointStore
+from app.flow.planning import PlanningFlow
+from app.schema import AgentState, Message
+from app.tool import PlanningTool, ToolCollection
+
+
+def make_agent(store: CheckpointStore) -> ToolCallAgent:
+    return ToolCallAgent(
+        available_tools=ToolCollection(PlanningTool()), checkpoint=store
+    )
+
+
+@pytest.mark.asyncio
+async def test_agent_round_trip(tmp_path):
+    """Tests that messages, step counter and tool state are restored."""
+    store = CheckpointStore(tmp_path / "run.jsonl")
+    agent = make_agent(store)
+    await agent.available_tools.execute(
+        name="planning",
+        tool_input={"command": "create", "plan_id": "p", "title": "T", "steps": ["a"]},
+    )
+    agent.memory.add_message(Message.user_message("task"))
+    agent.current_step = 1
+    store.save_agent(agent)
+    agent.memory.add_message(Message.assistant_message("done"))
+    agent.current_step = 2
+    store.save_agent(agent)
+
+    restored = make_agent(CheckpointStore(tmp_path / "run.jsonl"))
+    assert restored.restore_checkpoint()
+
+    assert [m.content for m in restored.memory.messages] == ["task", "done"]
+    assert restored.current_step == 2
+    assert "p" in restored.available_tools.get_tool("planning").plans
+
+
+def test_agent_records_hold_deltas(tmp_path):
+    """Tests that later checkpoints only store new messages."""
+    store = CheckpointStore(tmp_path / "run.jsonl")
+    agent = make_agent(store)
+    for text in ("one", "two"):
+        agent.memory.add_message(Message.user_message(text))
+        store.save_agent(agent)
+
+    records = list(store.records())
+    assert [len(r["messages"]) for r in records] == [1, 1]
+    assert store.load_agent(agent.name, after=records[-1]["seq"]) is None
+
+
+class NoteAgent(BaseAgent):
+    """Finishes each step after noting which step it ran."""
+
+    name: str = "worker"
+    max_steps: int = 1
+
+    async def step(self) -> str:
+        task = self.memory.messages[-1].content
+        self.update_memory("assistant", "ran " + task.split('"')[1])
+        self.state = AgentState.FINISHED
+        return "done"
+
+
+class QuietFlow(PlanningFlow):
+    async def _finalize_plan(self) -> str:
+        return "finalized"
+
+
+@pytest.mark.asyncio
+async def test_flow_resume_keeps_same_named_agents_apart(tmp_path):
+    """Tests that parallel executors sharing a name restore their own memories."""
+    store = CheckpointStore(tmp_path / "run.jsonl")
+    tool = PlanningTool()
+    await tool.execute(
+        command="create",
+        plan_id="p",
+        title="T",
+        steps=["[A] first", "[B] second", "[A] third"],
+    )
+    agents = {"a": NoteAgent(), "b": NoteAgent()}
+    flow = QuietFlow(
+        agents, planning_tool=tool, plan_id="p", checkpoint=store, max_parallel_steps=2
+    )
+    await flow.execute("")
+
+    resumed = {"a": NoteAgent(), "b": NoteAgent()}
+    flow = QuietFlow(
+        resumed,
+        checkpoint=CheckpointStore(tmp_path / "run.jsonl"),
+        max_parallel_steps=2,
+    )
+    for key, agent in resumed.items():
+        agent.checkpoint, agent.checkpoint_id = flow.checkpoint, key
+    assert flow._restore_checkpoint() is not None
+
+    def ran(agent):
+        return [m.content for m in agent.memory.messages if m.role == "assistant"]
+
+    assert ran(resumed["a"]) == ["ran [A] first", "ran [A] third"]
+    assert ran(resumed["b"]) == ["ran [B] second"]
@@ -0,0 +1,119 @@
+from app.context_budget import (
+    ELIDED_NOTE,
+    IMAGE_DROPPED_NOTE,
+    IMAGE_TOKENS,
+    TURNS_DROPPED_NOTE,
+    ContextBudgeter,
+)
+from app.image_store import image_store
+from app.llm import LLM
+from app.schema import Function, Message, Role, ToolCall
+
+
+class CharLLM:
+    """Counts one token per character plus 10 per message."""
+
+    context_window = 100_000
+    max_tokens = 0
+
+    def count_tokens(self, text: str) -> int:
+        return len(text)
+
+    def count_message_tokens(self, messages) -> int:
+        return sum(len(message.get("content") or "") + 10 for message in messages)
+
+
+def call(call_id: str) -> Message:
+    return Message(
+        role=Role.ASSISTANT,
+        tool_calls=[ToolCall(id=call_id, function=Function(name="t", arguments="{}"))],
+    )
+
+
+def history(observation_chars: int = 1000) -> list:
+    messages = [Message.user_message("task")]
+    for n in range(3):
+        messages += [
+            call(f"c{n}"),
+            Message.tool_message(str(n) * observation_chars, "t", f"c{n}"),
+        ]
+    return messages + [Message.assistant_message("recent"), Message.user_message("go")]
+
+
+def tokens(budgeter: ContextBudgeter, messages: list) -> int:
+    return sum(budgeter._count(message) for message in messages)
+
+
+def test_compaction_elides_oldest_observations_first():
+    """Tests that old observations are elided oldest first, only as needed."""
+    messages = history()
+    budgeter = ContextBudgeter(CharLLM(), keep_recent=4, elide_to=100)
+    budgeter.context_window = tokens(budgeter, messages) - 500
+
+    compacted = budgeter.compact(messages)
+
+    assert compacted[2].content == "0" * 100 + ELIDED_NOTE.format(count=900)
+    assert compacted[4].content == "1" * 1000
+    assert compacted[6] is messages[6]
+    assert messages[2].content == "0" * 1000
+    assert tokens(budgeter, compacted) <= budgeter.budget()
+
+
+def test_compaction_drops_oldest_turns_down_to_the_token_target():
+    """Tests that whole turns are dropped after eliding until the target is met."""
+    messages = history()
+    system = [Message.system_message("s" * 90)]
+    budgeter = ContextBudgeter(CharLLM(), keep_recent=4, elide_to=100)
+    budgeter.context_window = 1400
+
+    compacted = budgeter.compact(messages, system_msgs=system)
+
+    assert tokens(budgeter, compacted) <= budgeter.budget(fixed_tokens=100)
+    assert compacted[0] is messages[0]
+    # One turn would fit on its own, but not together with the note
+    assert compacted[1].content == TURNS_DROPPED_NOTE.format(count=4)
+    # Calls were dropped together with their results
+    assert [m.tool_call_id for m in compacted if m.role == Role.TOOL] == ["c2"]
+    assert compacted[2].tool_calls[0].id == "c2"
+    assert compacted[-4:] == messages[-4:]
+
+
+def test_stale_images_are_dropped_like_format_messages_drops_them():
+    """Tests that compaction and format_messages keep the same recent images."""
+    messages = [
+        Message.user_message(f"shot {n}", base64_image=f"aW1n{n}A==") for n in range(4)
+    ]
+    budgeter = ContextBudgeter(CharLLM(), max_images=2)
+
+    compacted = budgeter.compact(messages)
+    formatted = LLM.format_messages(messages, supports_images=True, max_images=2)
+
+    assert [m.image_ref is not None for m in compacted] == [False, False, True, True]
+    assert compacted[0].content == f"shot 0\n{IMAGE_DROPPED_NOTE}"
+    assert [isinstance(m["content"], list) for m in formatted] == [
+        False,
+        False,
+        True,
+        True,
+    ]
+    assert messages[0].image_ref is not None
+
+
+def test_images_count_toward_the_budget_without_being_loaded(monkeypatch):
+    """Tests that kept images are counted at a fixed size and never read."""
+    messages = history(observation_chars=10)
+    messages[-1] = Message.user_message("go", base64_image="aW1nMQ==")
+    messages[-2] = Message.assistant_message("recent", base64_image="aW1nMA==")
+    budgeter = ContextBudgeter(CharLLM(), keep_recent=2)
+    budgeter.context_window = tokens(budgeter, messages) - 15
+
+    def load(ref):
+        raise AssertionError("image loaded while counting")
+
+    monkeypatch.setattr(image_store, "get", load)
+    compacted = budgeter.compact(messages)
+
+    assert tokens(budgeter, compacted) <= budgeter.budget()
+    # The turns give way to the images, which count for more than their text
+    assert compacted[1].content == TURNS_DROPPED_NOTE.format(count=6)
+    assert compacted[-2:] == messages[-2:]
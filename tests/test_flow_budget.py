@@ -0,0 +1,158 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.agent.base import BaseAgent
+from app.agent.pool import AgentPool
+from app.flow.budget import FlowBudget
+from app.flow.planning import PlanningFlow
+from app.schema import AgentState
+from app.tool import PlanningTool
+
+
+class SlowAgent(BaseAgent):
+    """Finishes each plan step after `delay` seconds."""
+
+    name: str = "worker"
+    max_steps: int = 2
+    delay: float = 0.2
+
+    async def step(self) -> str:
+        await asyncio.sleep(self.delay)
+        self.update_memory("assistant", "Checked the part.")
+        self.state = AgentState.FINISHED
+        return "done"
+
+
+class CostlyAgent(BaseAgent):
+    """Spends 1000 tokens per step and needs four steps to finish."""
+
+    name: str = "pooled"
+    max_steps: int = 5
+    allowed: list = []
+
+    async def step(self) -> str:
+        if self.current_step == 1:
+            self.allowed.append(self.max_steps)
+        self.llm.total_input_tokens += 1000
+        if self.current_step == 4:
+            self.state = AgentState.FINISHED
+        return "done"
+
+
+class QuietFlow(PlanningFlow):
+    async def _finalize_plan(self) -> str:
+        return "finalized"
+
+
+async def make_flow(delay: float, budget: FlowBudget) -> QuietFlow:
+    tool = PlanningTool()
+    await tool.execute(
+        command="create", plan_id="p", title="T", steps=["a", "[OPTIONAL] b", "c"]
+    )
+    return QuietFlow(
+        SlowAgent(delay=delay), planning_tool=tool, plan_id="p", budget=budget
+    )
+
+
+def test_agent_steps_adapt_to_remaining_tokens():
+    """Tests that max_steps shrinks to what the remaining tokens can pay for."""
+    llm = SimpleNamespace(total_input_tokens=0, total_completion_tokens=0)
+    budget = FlowBudget(max_tokens=10000, reserve_ratio=0, min_agent_steps=1)
+    budget.start([llm])
+    assert budget.max_agent_steps(20, remaining_steps=4) == 20
+
+    llm.total_input_tokens = 6000
+    budget.record_agent_steps(steps=6, tokens=6000, seconds=1.0)
+    # 4000 tokens left over 2 steps at 1000 tokens per agent step
+    assert budget.max_agent_steps(20, remaining_steps=2) == 2
+    assert not budget.low
+
+    llm.total_input_tokens = 8000
+    assert budget.low and not budget.exhausted
+
+    llm.total_input_tokens = 10000
+    assert budget.exhausted and budget.over_limit
+
+
+@pytest.mark.asyncio
+async def test_optional_steps_are_skipped_when_budget_runs_low():
+    """Tests that a low budget skips optional steps but still finishes the plan."""
+    flow = await make_flow(0.2, FlowBudget(max_seconds=0.6, low_ratio=0.8))
+
+    result = await flow.execute("")
+
+    statuses = flow.planning_tool.plans["p"]["step_statuses"]
+    assert statuses == ["completed", "blocked", "completed"]
+    assert "Skipped optional step 1" in result
+    assert result.endswith("finalized")
+
+
+@pytest.mark.asyncio
+async def test_slow_steps_stop_with_partial_result():
+    """Tests that running out of time stops steps and still returns a summary."""
+    flow = await make_flow(1.0, FlowBudget(max_seconds=0.5, reserve_ratio=0))
+
+    result = await asyncio.wait_for(flow.execute(""), timeout=2)
+
+    statuses = flow.planning_tool.plans["p"]["step_statuses"]
+    assert statuses[0] == "blocked"
+    assert "Step 0 stopped at its time budget" in result
+    assert "Plan stopped early (budget exhausted)" in result
+    assert flow.agents["default"].max_steps == 2
+
+
+@pytest.mark.asyncio
+async def test_planning_and_final_llm_calls_stay_within_budget(monkeypatch):
+    """Tests that hanging planning and summary calls are cut off by the budget."""
+
+    async def hang(*args, **kwargs):
+        await asyncio.sleep(10)
+
+    flow = PlanningFlow(SlowAgent(delay=0.01), budget=FlowBudget(max_seconds=1.0))
+    monkeypatch.setattr(flow.llm, "ask", hang)
+
+    async def quick_planning(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(tool_calls=None)
+
+    monkeypatch.setattr(flow.llm, "ask_tool", quick_planning)
+    result = await asyncio.wait_for(flow.execute("task"), timeout=3)
+    assert result.endswith("- Step 2: Checked the part.")
+    assert "Plan completed. Status:" in result
+
+    flow = PlanningFlow(SlowAgent(), budget=FlowBudget(max_seconds=0.5))
+    monkeypatch.setattr(flow.llm, "ask_tool", hang)
+    result = await asyncio.wait_for(flow.execute("task"), timeout=2)
+    assert flow.planning_tool.plans[flow.active_plan_id]["steps"][0] == (
+        "Analyze request"
+    )
+    assert "Plan stopped early (budget exhausted)" in result
+
+
+@pytest.mark.asyncio
+async def test_pooled_steps_share_the_step_budget():
+    """Tests that agents from a pool get their max_steps from the budget."""
+    agent = CostlyAgent(allowed=[])
+
+    async def make_agent() -> CostlyAgent:
+        return agent
+
+    tool = PlanningTool()
+    await tool.execute(command="create", plan_id="p", title="T", steps=["a", "b", "c"])
+    budget = FlowBudget(max_tokens=10000, reserve_ratio=0, low_ratio=0)
+    flow = QuietFlow(
+        SlowAgent(),
+        planning_tool=tool,
+        plan_id="p",
+        budget=budget,
+        executor_pools={"default": AgentPool(make_agent, size=1)},
+    )
+
+    await flow.execute("")
+
+    # 4000 of 10000 tokens for the first step leaves 3000 for each of the others
+    assert agent.allowed == [5, 3, 3]
+    assert budget.tokens_spent == 10000
+    assert agent.max_steps == 5
@@ -0,0 +1,84 @@
+import os
+import time
+
+from app import image_store as image_store_module
+from app.image_store import ImageStore, remove_stale_spill_dirs
+from app.schema import Message
+
+
+def test_identical_images_are_stored_once():
+    """Tests that the store is content-addressed."""
+    store = ImageStore()
+    first = store.put("QUJD")
+    second = store.put("QUJD")
+
+    assert first == second
+    assert len(store) == 1
+    assert store.get(first) == "QUJD"
+
+
+def test_evicted_images_spill_to_disk(tmp_path):
+    """Tests that images over the memory bound are spilled and read back."""
+    store = ImageStore(max_memory_bytes=10, spill_dir=tmp_path)
+    refs = [store.put(letter * 6) for letter in "ABC"]
+
+    assert store.spills == 2
+    assert len(list(tmp_path.iterdir())) == 2
+    assert [store.get(ref) for ref in refs] == ["AAAAAA", "BBBBBB", "CCCCCC"]
+    assert store.loads == 2
+
+    store.clear()
+    assert len(store) == 0
+    assert not list(tmp_path.iterdir())
+
+
+def test_spilled_images_past_the_disk_bound_are_deleted(tmp_path):
+    """Tests that the spill directory keeps only the recently used images."""
+    store = ImageStore(max_memory_bytes=6, spill_dir=tmp_path, max_disk_bytes=12)
+    refs = [store.put(letter * 6) for letter in "ABC"]
+    assert store.get(refs[0]) == "AAAAAA"
+    store.put("DDDDDD")
+
+    assert store.drops == 1
+    assert sorted(path.stem for path in tmp_path.iterdir()) == sorted(
+        [refs[0], refs[2]]
+    )
+    assert store.get(refs[1]) is None
+    assert refs[1] not in store
+    # A message whose image was dropped is sent without it
+    message = Message(role="user", content="old shot", image_ref=refs[1])
+    assert "base64_image" not in message.to_dict()
+
+
+def test_stale_spill_dirs_of_earlier_runs_are_removed(tmp_path, monkeypatch):
+    """Tests that only spill directories untouched for long are removed."""
+    monkeypatch.setattr(image_store_module.tempfile, "tempdir", str(tmp_path))
+    stale = tmp_path / "openmanus-images-old"
+    live = tmp_path / "openmanus-images-new"
+    other = tmp_path / "unrelated-old"
+    for path in (stale, live, other):
+        path.mkdir()
+        (path / "x.b64").write_text("QUJD")
+    day_ago = time.time() - 2 * 24 * 60 * 60
+    os.utime(stale, (day_ago, day_ago))
+    os.utime(other, (day_ago, day_ago))
+
+    store = ImageStore(max_memory_bytes=4)
+    store.put("AAAA")
+    store.put("BBBB")
+
+    assert not stale.exists()
+    assert live.exists() and other.exists()
+    assert store._spill_dir.parent == tmp_path
+    assert remove_stale_spill_dirs() == 0
+
+
+def test_message_holds_reference_not_data():
+    """Tests that messages keep an image reference and resolve it on access."""
+    message = Message.user_message("screenshot", base64_image="SU1BR0U=")
+
+    assert message.image_ref
+    assert "SU1BR0U=" not in message.model_dump_json()
+    assert message.base64_image == "SU1BR0U="
+    assert message.to_dict()["base64_image"] == "SU1BR0U="
+    assert "base64_image" not in message.to_dict(include_image=False)
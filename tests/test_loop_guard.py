@@ -0,0 +1,63 @@
+import json
+
+from app.loop_guard import LoopAction, LoopGuard
+from app.schema import Function, ToolCall
+
+
+def call(name: str, **arguments) -> ToolCall:
+    return ToolCall(
+        id="call", function=Function(name=name, arguments=json.dumps(arguments))
+    )
+
+
+def test_repeated_calls_escalate_to_termination():
+    """Tests hint -> withheld tools -> terminate on identical tool calls."""
+    guard = LoopGuard(hint_after=1, restrict_after=2, terminate_after=3)
+    actions = [
+        guard.record_step([call("search", q="x", page=1)], ["ok"]) for _ in range(4)
+    ]
+
+    assert actions == [
+        LoopAction.NONE,
+        LoopAction.HINT,
+        LoopAction.RESTRICT_TOOLS,
+        LoopAction.TERMINATE,
+    ]
+    assert guard.blocked_tools == {"search"}
+
+
+def test_argument_order_is_ignored_and_progress_resets():
+    """Tests canonical argument hashing and that a new action clears strikes."""
+    guard = LoopGuard()
+    guard.record_step([call("search", q="x", page=1)], [])
+    assert guard.record_step([call("search", page=1, q="x")], []) == LoopAction.HINT
+
+    assert guard.record_step([call("search", q="y")], []) == LoopAction.NONE
+    assert guard.strikes == 0
+
+
+def test_repeated_observations_count_as_no_progress():
+    """Tests that new arguments yielding an already seen long output are flagged."""
+    guard = LoopGuard()
+    output = "Error: page not found. " * 5
+    guard.record_step([call("browse", url="a")], [output])
+
+    assert guard.record_step([call("browse", url="b")], [output]) == LoopAction.HINT
+    assert guard.record_step([call("run", code="1")], ["done"]) == LoopAction.NONE
+    assert guard.record_step([call("run", code="2")], ["done"]) == LoopAction.NONE
+
+
+def test_repeated_call_with_new_results_is_progress():
+    """Tests that scrolling on through different pages never escalates."""
+    guard = LoopGuard(hint_after=1, restrict_after=2, terminate_after=3)
+    scroll = call("browser_use", action="scroll_down")
+    actions = [
+        guard.record_step([scroll], [f"Page {i}: " + "new content. " * 10])
+        for i in range(6)
+    ]
+
+    assert actions == [LoopAction.NONE] * 6
+    assert guard.blocked_tools == set()
+    assert guard.record_step([scroll], ["Page 5: " + "new content. " * 10]) == (
+        LoopAction.HINT
+    )
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from app.agent.base import BaseAgent
+from app.flow.flow_factory import FlowFactory, FlowType
+from app.schema import AgentState
+from app.tool.base import BaseTool, ToolResult
+
+
+class PhotoTool(BaseTool):
+    """Inspects a photo; fails once for flaky photos and always for bad ones."""
+
+    name: str = "inspect_photo"
+    description: str = "Inspect a photo"
+    delay: float = 0.01
+    calls: dict = {}
+    running: int = 0
+    max_running: int = 0
+
+    async def execute(self, path: str) -> ToolResult:
+        self.calls[path] = self.calls.get(path, 0) + 1
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay * (2 if "slow" in path else 1))
+        finally:
+            self.running -= 1
+        if "bad" in path or ("flaky" in path and self.calls[path] == 1):
+            return ToolResult(error=f"cannot read {path}")
+        return ToolResult(output=f"ok {path.rsplit('/', 1)[-1]}")
+
+
+class PhotoAgent(BaseAgent):
+    name: str = "mapper"
+    max_steps: int = 1
+
+    async def step(self) -> str:
+        item = self.memory.messages[0].content.rsplit(" ", 1)[-1]
+        self.state = AgentState.FINISHED
+        return f"checked {item}"
+
+
+@pytest.mark.asyncio
+async def test_items_are_retried_isolated_and_streamed_to_reducer(tmp_path):
+    """Tests retries, failure isolation, the concurrency limit and streaming."""
+    names = ["a.jpg", "flaky.jpg", "bad.jpg", "slow.jpg", "slow2.jpg", "e.jpg"]
+    for name in names:
+        (tmp_path / name).write_bytes(b"")
+    tool = PhotoTool(calls={})
+    batches = []
+
+    async def reducer(reduction, batch):
+        batches.append(sorted(result.item.rsplit("/", 1)[-1] for result in batch))
+        return "\n".join(
+            [reduction or ""] + [result.output for result in batch]
+        ).strip()
+
+    flow = FlowFactory.create_flow(
+        FlowType.MAP_REDUCE,
+        agents={},
+        inputs=[str(tmp_path / "*.jpg"), str(tmp_path / "a.jpg")],
+        map_tool=tool,
+        max_concurrency=2,
+        retry_delay=0,
+        reducer=reducer,
+        reduce_batch_size=2,
+    )
+
+    result = await flow.execute("List defects")
+
+    assert tool.max_running == 2
+    assert tool.calls[str(tmp_path / "flaky.jpg")] == 2
+    assert tool.calls[str(tmp_path / "bad.jpg")] == 2
+    assert len(batches) > 1
+    assert sorted(sum(batches, [])) == sorted(set(names) - {"bad.jpg"})
+    assert "ok flaky.jpg" in result
+    assert f"Failed items (1):\n- {tmp_path / 'bad.jpg'}: cannot read" in result
+
+
+@pytest.mark.asyncio
+async def test_agents_map_items_and_llm_reduces(monkeypatch):
+    """Tests mapping with the flow's agents and the default LLM reduce step."""
+    flow = FlowFactory.create_flow(
+        FlowType.MAP_REDUCE,
+        agents=[PhotoAgent(), PhotoAgent()],
+        inputs=["bus1.jpg", "bus2.jpg", "bus3.jpg"],
+        reduce_batch_size=10,
+    )
+    prompts = []
+
+    async def reduce(messages, system_msgs=None, **kwargs):
+        prompts.append(messages[0].content)
+        return "merged checklist"
+
+    monkeypatch.setattr(flow.llm, "ask", reduce)
+    result = await flow.execute("Inspect the photo")
+
+    assert result == "merged checklist"
+    merged = "".join(prompts)
+    for item in ["bus1.jpg", "bus2.jpg", "bus3.jpg"]:
+        assert f"Item: {item}\nResult: Step 1: checked {item}" in merged
+    assert all(agent.state == AgentState.IDLE for agent in flow.agents.values())
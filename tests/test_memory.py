@@ -0,0 +1,52 @@
+from app.schema import Memory, Message, MessageBuffer
+
+
+def test_memory_evicts_oldest_messages():
+    """Tests that memory keeps only the most recent max_messages."""
+    memory = Memory(max_messages=3)
+    for i in range(5):
+        memory.add_message(Message.user_message(str(i)))
+
+    assert isinstance(memory.messages, MessageBuffer)
+    assert [m.content for m in memory.messages] == ["2", "3", "4"]
+    assert [m.content for m in memory.get_recent_messages(2)] == ["3", "4"]
+
+
+def test_assigned_list_is_bounded():
+    """Tests that assigning a plain list keeps the ring buffer and its bound."""
+    memory = Memory(max_messages=2)
+    memory.messages = [Message.user_message(str(i)) for i in range(4)]
+
+    assert isinstance(memory.messages, MessageBuffer)
+    assert [m.content for m in memory.messages] == ["2", "3"]
+
+    buffer = memory.messages
+    buffer += [Message.user_message("4")]
+    memory.messages = buffer
+    assert memory.messages is buffer
+    assert [m.content for m in memory.messages] == ["3", "4"]
+
+
+def test_assistant_content_index_tracks_eviction():
+    """Tests that the assistant content counts follow appends and evictions."""
+    buffer = MessageBuffer(maxlen=3)
+    for content in ["a", "b", "a", "a"]:
+        buffer.append(Message.assistant_message(content))
+    buffer.append(Message.user_message("a"))
+
+    # "b" was evicted, the user message is not indexed
+    assert buffer.assistant_content_count("a") == 2
+    assert buffer.assistant_content_count("b") == 0
+
+    buffer.clear()
+    assert buffer.assistant_content_count("a") == 0
+
+
+def test_memory_round_trips_through_dump():
+    """Tests that memory serializes as a list and restores its bound."""
+    memory = Memory(max_messages=5)
+    memory.add_message(Message.assistant_message("hi"))
+
+    restored = Memory.model_validate(memory.model_dump())
+    assert restored.messages == memory.messages
+    assert restored.messages.maxlen == 5
@@ -0,0 +1,49 @@
+from app.observation import ObservationCompressor, reduce_log, reduce_table
+
+
+def test_small_output_is_unchanged(tmp_path):
+    """Tests that outputs within the limit pass through without spilling."""
+    compressor = ObservationCompressor(max_chars=100, spill_dir=tmp_path)
+
+    assert compressor.compress("short") == "short"
+    assert not list(tmp_path.iterdir())
+
+
+def test_html_is_reduced_to_text_and_spilled(tmp_path):
+    """Tests that HTML loses its markup and the full output is kept on disk."""
+    html = (
+        "<html><head><style>body{}</style></head><body>"
+        + "<div class='row'><p>Item</p></div>" * 200
+        + "</body></html>"
+    )
+    compressor = ObservationCompressor(max_chars=1000, spill_dir=tmp_path)
+    result = compressor.compress(html, "browser_use")
+
+    assert len(result) <= 1000
+    assert "<div" not in result and "Item" in result
+    [spilled] = tmp_path.iterdir()
+    assert spilled.read_text() == html
+    assert str(spilled) in result
+
+
+def test_table_keeps_schema_head_and_tail():
+    """Tests that tables report their columns and keep the first and last rows."""
+    rows = ["id,name,price"] + [f"{i},item {i},{i * 1.5}" for i in range(100)]
+    result = reduce_table("\n".join(rows), head=3, tail=2)
+
+    assert result.splitlines()[0] == (
+        "Table with 100 rows and 3 columns: id (int), name (text), price (float)"
+    )
+    assert "0,item 0,0.0" in result and "99,item 99,148.5" in result
+    assert "item 50," not in result
+
+
+def test_log_lines_differing_in_numbers_are_collapsed():
+    """Tests that repeated log lines are counted instead of kept."""
+    log = "\n".join(["start"] + [f"12:00:{i:02d} retrying" for i in range(30)])
+
+    assert reduce_log(log).splitlines() == [
+        "start",
+        "12:00:00 retrying",
+        "  ...[previous line repeated 29 more times]",
+    ]
@@ -0,0 +1,69 @@
+import asyncio
+import json
+
+import pytest
+
+from app.agent.toolcall import ToolCallAgent
+from app.schema import Function, ToolCall
+from app.tool import ToolCollection
+from app.tool.base import BaseTool, ToolResult
+
+
+class Lookup(BaseTool):
+    """Read-only lookup; later calls finish first, and "boom" raises."""
+
+    name: str = "lookup"
+    description: str = "Look something up."
+    concurrency_safe: bool = True
+
+    async def execute(self, key: str, delay: float = 0.0) -> ToolResult:
+        await asyncio.sleep(delay)
+        if key == "boom":
+            raise RuntimeError("lookup failed")
+        return ToolResult(output=f"value of {key}")
+
+
+def call(call_id: str, arguments) -> ToolCall:
+    return ToolCall(
+        id=call_id, function=Function(name="lookup", arguments=json.dumps(arguments))
+    )
+
+
+def make_agent() -> ToolCallAgent:
+    return ToolCallAgent(
+        available_tools=ToolCollection(Lookup()), compact_context=False, loop_guard=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_parallel_results_keep_call_order_and_isolate_failures():
+    """Tests that a concurrent batch is recorded in call order despite a failure."""
+    agent = make_agent()
+    agent.tool_calls = [
+        call("c1", {"key": "a", "delay": 0.03}),
+        call("c2", {"key": "boom", "delay": 0.02}),
+        call("c3", {"key": "c", "delay": 0.0}),
+    ]
+    assert agent._batch_tool_calls(agent.tool_calls) == [agent.tool_calls]
+
+    await agent.act()
+
+    messages = agent.memory.messages
+    assert [m.tool_call_id for m in messages] == ["c1", "c2", "c3"]
+    assert "value of a" in messages[0].content
+    assert "lookup failed" in messages[1].content
+    assert "value of c" in messages[2].content
+
+
+@pytest.mark.asyncio
+async def test_non_object_arguments_return_an_error_instead_of_crashing():
+    """Tests that JSON arguments that are not an object fail only their call."""
+    agent = make_agent()
+    agent.tool_calls = [call("c1", ["a"]), call("c2", "a"), call("c3", {"key": "c"})]
+
+    assert len(agent._batch_tool_calls(agent.tool_calls)) == 3
+    await agent.act()
+
+    contents = [m.content for m in agent.memory.messages]
+    assert contents[0].startswith("Error") and contents[1].startswith("Error")
+    assert "value of c" in contents[2]
@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from app.agent.base import BaseAgent
+from app.exceptions import ToolError
+from app.flow.planning import PlanningFlow
+from app.schema import AgentState
+from app.tool import PlanningTool
+from app.tool.plan_store import PlanStore
+
+
+overlap = {"active": 0, "peak": 0}
+together = {"arrived": 0, "release": None}
+
+
+class StepAgent(BaseAgent):
+    """Finishes each step after a short wait, tracking how many overlap."""
+
+    name: str = "worker"
+    max_steps: int = 2
+
+    async def step(self) -> str:
+        overlap["active"] += 1
+        overlap["peak"] = max(overlap["peak"], overlap["active"])
+        await asyncio.sleep(0.05)
+        overlap["active"] -= 1
+        self.state = AgentState.FINISHED
+        return "done"
+
+
+class TogetherAgent(BaseAgent):
+    """Finishes its step only once the other step has started too."""
+
+    name: str = "worker"
+    max_steps: int = 2
+
+    async def step(self) -> str:
+        together["arrived"] += 1
+        if together["arrived"] == 2:
+            together["release"].set()
+        await together["release"].wait()
+        self.state = AgentState.FINISHED
+        return "done"
+
+
+class QuietFlow(PlanningFlow):
+    async def _finalize_plan(self) -> str:
+        return "finalized"
+
+
+@pytest.mark.asyncio
+async def test_ready_steps_follow_dependencies():
+    """Tests that only steps with completed dependencies are ready."""
+    tool = PlanningTool()
+    await tool.execute(
+        command="create",
+        plan_id="p",
+        title="Inspect",
+        steps=["BEB photos", "NABI photos", "Report"],
+        step_dependencies=[[], [], [0, 1]],
+    )
+    assert tool.get_ready_steps("p") == [0, 1]
+
+    await tool.execute(
+        command="mark_step", plan_id="p", step_index=0, step_status="completed"
+    )
+    assert tool.get_ready_steps("p") == [1]
+
+    await tool.execute(
+        command="mark_step", plan_id="p", step_index=1, step_status="completed"
+    )
+    assert tool.get_ready_steps("p") == [2]
+
+
+@pytest.mark.asyncio
+async def test_plans_without_dependencies_stay_sequential():
+    """Tests the default of each step depending on the previous one."""
+    tool = PlanningTool()
+    await tool.execute(command="create", plan_id="p", title="T", steps=["a", "b"])
+    assert tool.get_ready_steps("p") == [0]
+
+    with pytest.raises(ToolError):
+        await tool.execute(command="update", plan_id="p", step_dependencies=[[1], []])
+
+
+@pytest.mark.asyncio
+async def test_independent_steps_run_concurrently():
+    """Tests that the flow overlaps ready steps and completes the whole plan."""
+    overlap.update(active=0, peak=0)
+
+    async def make_worker() -> BaseAgent:
+        return StepAgent()
+
+    tool = PlanningTool()
+    await tool.execute(
+        command="create",
+        plan_id="p",
+        title="Inspect",
+        steps=["BEB photos", "NABI photos", "Report"],
+        step_dependencies=[[], [], [0, 1]],
+    )
+    flow = QuietFlow(
+        StepAgent(),
+        planning_tool=tool,
+        plan_id="p",
+        max_parallel_steps=2,
+        executor_factory=make_worker,
+    )
+
+    result = await flow.execute("")
+
+    assert overlap["peak"] == 2
+    assert tool.plans["p"]["step_statuses"] == ["completed"] * 3
+    assert result.endswith("finalized")
+
+
+@pytest.mark.asyncio
+async def test_steps_finishing_together_are_saved_with_the_steps_they_unblock(
+    monkeypatch, tmp_path
+):
+    """Tests that two steps finishing at once reach the store in one write."""
+    together.update(arrived=0, release=asyncio.Event())
+
+    async def make_worker() -> BaseAgent:
+        return TogetherAgent()
+
+    store = PlanStore(tmp_path / "plans.db")
+    tool = PlanningTool(plans=store)
+    await tool.execute(
+        command="create",
+        plan_id="p",
+        title="Inspect",
+        steps=["BEB photos", "NABI photos", "Report"],
+        step_dependencies=[[], [], [0, 1]],
+    )
+    writes = []
+    save = store._save
+
+    def record(plan) -> None:
+        if not store._batch_depth:
+            writes.append(plan["step_statuses"])
+        save(plan)
+
+    monkeypatch.setattr(store, "_save", record)
+    flow = QuietFlow(
+        TogetherAgent(),
+        planning_tool=tool,
+        plan_id="p",
+        max_parallel_steps=2,
+        executor_factory=make_worker,
+    )
+
+    await flow.execute("")
+
+    assert ["completed", "completed", "in_progress"] in writes
+    # Neither step was saved as completed on its own
+    assert not [w for w in writes if w[:2].count("completed") == 1]
+    assert PlanStore(tmp_path / "plans.db")["p"]["step_statuses"] == (["completed"] * 3)
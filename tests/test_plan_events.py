@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import pytest
+
+from app.agent.base import BaseAgent
+from app.flow.events import (
+    JsonlEventSink,
+    PlanEvent,
+    PlanEventBus,
+    PlanEventType,
+    PlanMetrics,
+)
+from app.flow.planning import PlanningFlow
+from app.schema import AgentState
+from app.tool import PlanningTool
+from app.tool.plan_store import Plan, PlanStore
+
+
+class DoneAgent(BaseAgent):
+    name: str = "worker"
+    max_steps: int = 1
+
+    async def step(self) -> str:
+        self.state = AgentState.FINISHED
+        return "done"
+
+
+class QuietFlow(PlanningFlow):
+    async def _finalize_plan(self) -> str:
+        return "finalized"
+
+
+def event(index: int) -> PlanEvent:
+    return PlanEvent(type=PlanEventType.STEP_STARTED, plan_id="p", step_index=index)
+
+
+@pytest.mark.asyncio
+async def test_slow_subscribers_get_batches_without_blocking_others(tmp_path):
+    """Tests that events queued behind a slow subscriber arrive as one batch."""
+    bus = PlanEventBus()
+    slow_batches, fast_batches = [], []
+
+    async def slow(events):
+        slow_batches.append(len(events))
+        await asyncio.sleep(0.05)
+
+    bus.subscribe(slow)
+    bus.subscribe(lambda events: fast_batches.append(len(events)))
+    sink = bus.subscribe(JsonlEventSink(tmp_path / "events.jsonl"))
+
+    bus.publish(event(0))
+    await asyncio.sleep(0.01)
+    for i in range(1, 5):
+        bus.publish(event(i))
+    await bus.flush()
+
+    assert slow_batches == [1, 4]
+    assert sum(fast_batches) == 5
+    lines = sink.path.read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["step_index"] for line in lines] == [0, 1, 2, 3, 4]
+
+
+def test_store_batch_writes_each_plan_once(tmp_path):
+    """Tests that changes inside a batch reach the database when it ends."""
+    store = PlanStore(tmp_path / "plans.db")
+    store["p"] = Plan.create("p", "T", ["a", "b"])
+    reader = PlanStore(tmp_path / "plans.db")
+
+    with store.batch():
+        store["p"].set_status(0, "completed")
+        store["p"].set_status(1, "in_progress")
+        assert reader["p"]["step_statuses"] == ["not_started", "not_started"]
+    assert reader["p"]["step_statuses"] == ["completed", "in_progress"]
+
+
+@pytest.mark.asyncio
+async def test_flow_publishes_step_events():
+    """Tests the events of a two-step run and the metrics built from them."""
+    tool = PlanningTool()
+    await tool.execute(command="create", plan_id="p", title="T", steps=["a", "b"])
+    bus = PlanEventBus()
+    received = []
+    bus.subscribe(received.extend)
+    metrics = bus.subscribe(PlanMetrics())
+    flow = QuietFlow(DoneAgent(), planning_tool=tool, plan_id="p", events=bus)
+
+    await flow.execute("")
+
+    assert [(e.type.value, e.step_index) for e in received] == [
+        ("step_started", 0),
+        ("step_completed", 0),
+        ("step_started", 1),
+        ("step_completed", 1),
+        ("plan_finished", None),
+    ]
+    assert received[0].step_text == "a"
+    assert received[-1].detail["statuses"] == {"completed": 2}
+    assert metrics.counts["step_completed"] == 2
+    assert set(metrics.step_seconds) == {0, 1}
@@ -0,0 +1,108 @@
+import pytest
+
+from app.tool import PlanningTool
+from app.tool.plan_store import Plan, PlanStore
+
+
+def test_cursor_tracks_first_active_step():
+    """Tests that the cursor advances past finished steps and moves back on reset."""
+    plan = Plan.create("p", "Plan", ["a", "b", "c"])
+    assert plan.next_active_step() == 0
+
+    plan.set_status(0, "completed")
+    plan.set_status(1, "blocked")
+    assert plan.next_active_step() == 2
+
+    plan.set_status(0, "not_started")
+    assert plan.next_active_step() == 0
+
+    plan["step_statuses"] = ["completed"] * 3
+    assert plan.next_active_step() is None
+
+
+def test_status_index_follows_every_kind_of_change():
+    """Tests the status counts, completion order and upcoming steps."""
+    plan = Plan.create("p", "Plan", ["a", "b", "c", "d"])
+    plan.set_status(2, "completed")
+    plan.set_status(0, "completed")
+    plan.set_status(1, "in_progress")
+
+    assert plan.count("completed") == 2
+    assert plan.count("not_started", "in_progress") == 2
+    assert plan.recently_completed(5) == [2, 0]
+    assert plan.recently_completed(1) == [0]
+    assert plan.upcoming_steps(5, skip=1) == [3]
+
+    plan["step_statuses"] = ["completed", "completed", "not_started", "blocked"]
+    assert plan.recently_completed(5) == [0, 1]
+    assert plan.count("blocked") == 1
+    assert plan.upcoming_steps(1) == [2]
+
+    plan.update(steps=Plan.create("p", "Plan", ["x", "y"]).steps)
+    assert plan.count("not_started") == 2
+    assert plan.recently_completed(5) == []
+
+
+def test_rendered_text_is_cached_until_mutation():
+    """Tests that the plan text is reused until the plan changes."""
+    plan = Plan.create("p", "Plan", ["a", "b"])
+    text = plan.render()
+    assert plan.render() is text
+    assert "0. [ ] a" in text
+
+    plan.set_status(0, "completed")
+    assert plan.render() is not text
+    assert "0. [✓] a" in plan.render()
+
+
+def test_sqlite_store_shares_plans_between_workers(tmp_path):
+    """Tests that a change saved by one store is seen by another on the same file."""
+    first = PlanStore(tmp_path / "plans.db")
+    second = PlanStore(tmp_path / "plans.db")
+
+    first["p"] = Plan.create("p", "Plan", ["a", "b"])
+    assert "p" in second
+    assert second["p"]["steps"] == ["a", "b"]
+
+    first["p"].set_status(0, "completed")
+    assert second["p"]["step_statuses"] == ["completed", "not_started"]
+    assert second["p"].next_active_step() == 1
+
+    del second["p"]
+    assert "p" not in first
+    assert len(first) == 0
+
+
+def test_concurrent_step_updates_from_two_workers_both_survive(tmp_path):
+    """Tests that a stale worker merges its change instead of overwriting."""
+    PlanStore(tmp_path / "plans.db")["p"] = Plan.create("p", "Plan", ["a", "b", "c"])
+    first = PlanStore(tmp_path / "plans.db")
+    second = PlanStore(tmp_path / "plans.db")
+    plan_a, plan_b = first["p"], second["p"]
+
+    plan_a.set_status(0, "completed")
+    plan_b.set_status(1, "completed")
+    plan_b.set_notes(1, "done by b")
+
+    expected = ["completed", "completed", "not_started"]
+    assert plan_b["step_statuses"] == expected
+    assert PlanStore(tmp_path / "plans.db")["p"]["step_statuses"] == expected
+    assert first["p"]["step_statuses"] == expected
+    assert first["p"]["step_notes"][1] == "done by b"
+    assert first["p"].next_active_step() == 2
+
+
+@pytest.mark.asyncio
+async def test_planning_tool_state_round_trip():
+    """Tests that dumped plans load into a new tool with statuses intact."""
+    tool = PlanningTool()
+    await tool.execute(command="create", plan_id="p", title="Plan", steps=["a", "b"])
+    await tool.execute(
+        command="mark_step", plan_id="p", step_index=0, step_status="completed"
+    )
+
+    restored = PlanningTool()
+    restored.load_state(tool.dump_state())
+    assert restored.plans["p"]["step_statuses"] == ["completed", "not_started"]
+    assert restored.plans["p"].next_active_step() == 1
+    assert "p" not in PlanningTool().plans
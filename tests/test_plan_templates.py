@@ -0,0 +1,80 @@
+import pytest
+
+from app.agent.base import BaseAgent
+from app.flow.plan_templates import PlanTemplateCache, normalize_request
+from app.flow.planning import PlanningFlow
+from app.schema import AgentState
+
+
+class DoneAgent(BaseAgent):
+    name: str = "worker"
+    max_steps: int = 1
+
+    async def step(self) -> str:
+        self.state = AgentState.FINISHED
+        return "done"
+
+
+class QuietFlow(PlanningFlow):
+    async def _finalize_plan(self) -> str:
+        return "finalized"
+
+
+def test_requests_normalize_to_shape_and_values():
+    """Tests that numbers, paths and quotes are taken out of the request."""
+    shape, params = normalize_request('Inspect bus BEB-12 photos in /data/b12 "full"')
+    assert shape == "inspect bus {0} photos in {1} {2}"
+    assert params == ["BEB-12", "/data/b12", '"full"']
+
+
+def test_templates_match_exact_and_similar_shapes(tmp_path):
+    """Tests instantiation with new values, fuzzy matching and persistence."""
+    cache = PlanTemplateCache(tmp_path / "templates.json", fuzzy_threshold=0.8)
+    cache.store(
+        "Inspect bus 12 photos in /data/b12",
+        "Inspect bus 12",
+        ["Open /data/b12", "Fill the checklist for bus 12"],
+    )
+
+    plan = cache.lookup("Inspect bus 40 photos in /data/b40")
+    assert plan["title"] == "Inspect bus 40"
+    assert plan["steps"] == ["Open /data/b40", "Fill the checklist for bus 40"]
+
+    assert cache.lookup("Please inspect bus 7 photos in /x") is not None
+    assert cache.lookup("Write a poem about bus 7") is None
+    assert (cache.hits, cache.fuzzy_hits, cache.misses) == (2, 1, 1)
+
+    strict = PlanTemplateCache(tmp_path / "templates.json", fuzzy_threshold=None)
+    assert strict.lookup("Please inspect bus 7 photos in /x") is None
+    assert strict.templates["inspect bus {0} photos in {1}"]["hits"] == 2
+
+
+def test_similar_shapes_with_a_different_task_do_not_match():
+    """Tests that one changed word other than filler or values is a miss."""
+    cache = PlanTemplateCache(None, fuzzy_threshold=0.8)
+    cache.store(
+        "Inspect bus 12 photos and fill the checklist", "Bus 12", ["Photos", "Fill"]
+    )
+
+    assert cache.lookup("Inspect bus 40 tires and fill the checklist") is None
+    assert cache.lookup("Please inspect bus 40 photos and fill the checklist")
+    assert (cache.hits, cache.fuzzy_hits, cache.misses) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_flow_uses_template_instead_of_planning_call(monkeypatch):
+    """Tests that a known request shape creates its plan without the LLM."""
+    cache = PlanTemplateCache(None)
+    cache.store("Inspect bus 12", "Bus 12", ["Photos of bus 12", "Checklist"])
+    flow = QuietFlow(DoneAgent(), template_cache=cache)
+
+    async def no_planning_call(*args, **kwargs):
+        raise AssertionError("planning LLM called")
+
+    monkeypatch.setattr(flow.llm, "ask_tool", no_planning_call)
+    result = await flow.execute("Inspect bus 31")
+
+    plan = flow.planning_tool.plans[flow.active_plan_id]
+    assert plan["steps"] == ["Photos of bus 31", "Checklist"]
+    assert plan["step_statuses"] == ["completed", "completed"]
+    assert result.endswith("finalized")
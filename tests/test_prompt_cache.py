@@ -0,0 +1,78 @@
+import pytest
+
+from app.bedrock import ChatCompletions
+from app.llm import CACHE_CONTROL, LLM
+
+
+TOOLS = [
+    {"type": "function", "function": {"name": name, "description": name}}
+    for name in ("search", "terminate")
+]
+MESSAGES = [
+    {"role": "system", "content": "You are an agent."},
+    {"role": "system", "content": "Use the tools."},
+    {"role": "user", "content": "Find it."},
+]
+
+
+def make_llm(api_type: str, model: str, prompt_cache: bool = True) -> LLM:
+    # Only the settings apply_prompt_cache reads; no client is created
+    llm = object.__new__(LLM)
+    llm.api_type, llm.model, llm.prompt_cache = api_type, model, prompt_cache
+    return llm
+
+
+@pytest.mark.parametrize(
+    "api_type, model",
+    [
+        ("openai", "gpt-4o"),
+        ("openai", "claude-3-7-sonnet-20250219"),
+        ("aws", "us.meta.llama3-2-90b-instruct-v1:0"),
+    ],
+)
+def test_no_markers_where_the_endpoint_ignores_or_rejects_them(api_type, model):
+    """Tests that only Bedrock models with prompt caching get cache markers."""
+    llm = make_llm(api_type, model)
+
+    messages, tools = llm.apply_prompt_cache(MESSAGES, TOOLS)
+
+    assert messages is MESSAGES
+    assert tools is TOOLS
+
+
+def test_markers_end_the_system_and_tool_prefix_for_bedrock():
+    """Tests where the markers land and that they become Bedrock cache points."""
+    llm = make_llm("aws", "us.anthropic.claude-3-7-sonnet-20250219-v1:0")
+
+    messages, tools = llm.apply_prompt_cache(MESSAGES, TOOLS)
+
+    assert messages[0] == MESSAGES[0]
+    assert messages[1]["content"] == [
+        {"type": "text", "text": "Use the tools.", "cache_control": CACHE_CONTROL}
+    ]
+    assert messages[2] is MESSAGES[2]
+    assert [bool(tool.get("cache_control")) for tool in tools] == [False, True]
+    assert MESSAGES[1]["content"] == "Use the tools."
+    assert "cache_control" not in TOOLS[1]
+
+    bedrock = ChatCompletions(client=None)
+    system, _ = bedrock._convert_openai_messages_to_bedrock_format(messages)
+    bedrock_tools = bedrock._convert_openai_tools_to_bedrock_format(tools)
+    # Every system message is kept, with the cache point after the last one
+    assert system == [
+        {"text": "You are an agent."},
+        {"text": "Use the tools."},
+        {"cachePoint": {"type": "default"}},
+    ]
+    assert [list(tool) for tool in bedrock_tools] == [
+        ["toolSpec"],
+        ["toolSpec"],
+        ["cachePoint"],
+    ]
+
+
+def test_prompt_cache_can_be_turned_off():
+    """Tests that prompt_cache = false sends Bedrock requests without markers."""
+    llm = make_llm("aws", "anthropic.claude-sonnet-4-20250514-v1:0", False)
+
+    assert llm.apply_prompt_cache(MESSAGES, TOOLS) == (MESSAGES, TOOLS)
@@ -0,0 +1,121 @@
+import pytest
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+from app.exceptions import ReplayMissError
+from app.replay import RecordReplayTransport, ReplayClient
+
+
+def completion(text: str) -> ChatCompletion:
+    return ChatCompletion.model_validate(
+        {
+            "id": "c1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "m",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": text},
+                }
+            ],
+        }
+    )
+
+
+def chunk(text: str) -> ChatCompletionChunk:
+    return ChatCompletionChunk.model_validate(
+        {
+            "id": "c2",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "m",
+            "choices": [{"index": 0, "delta": {"content": text}}],
+        }
+    )
+
+
+class FakeCompletions:
+    """Answers with the last user message, upper-cased; streams it word by word."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **params):
+        self.calls += 1
+        text = params["messages"][-1]["content"].upper()
+        if not params.get("stream"):
+            return completion(text)
+
+        async def stream():
+            for word in text.split():
+                yield chunk(word + " ")
+
+        return stream()
+
+
+class FakeClient:
+    def __init__(self):
+        self.chat = type("Chat", (), {})()
+        self.chat.completions = FakeCompletions()
+
+
+def request(text: str, **params) -> dict:
+    return {"model": "m", "messages": [{"role": "user", "content": text}], **params}
+
+
+async def collect(stream) -> str:
+    return "".join([c.choices[0].delta.content async for c in await stream])
+
+
+@pytest.mark.asyncio
+async def test_recorded_calls_replay_without_the_client(tmp_path):
+    """Tests that a replay serves recorded responses and chunks offline."""
+    path = tmp_path / "replay.jsonl"
+    real = FakeClient()
+    recorder = ReplayClient(real, RecordReplayTransport("record", path))
+
+    recorded = await recorder.chat.completions.create(**request("hello", timeout=5))
+    recorded_again = await recorder.chat.completions.create(**request("again"))
+    recorded_stream = await collect(
+        recorder.chat.completions.create(**request("two words", stream=True))
+    )
+    assert real.chat.completions.calls == 3
+
+    replayer = ReplayClient(None, RecordReplayTransport("replay", path, latency=0))
+    # Served by request, not by recording order; timeouts do not change the key
+    replayed_stream = await collect(
+        replayer.chat.completions.create(**request("two words", stream=True))
+    )
+    replayed_again = await replayer.chat.completions.create(**request("again"))
+    replayed = await replayer.chat.completions.create(**request("hello", timeout=30))
+
+    assert isinstance(replayed, ChatCompletion)
+    assert replayed.choices[0].message.content == "HELLO"
+    assert replayed == recorded
+    assert replayed_again.choices[0].message.content == "AGAIN"
+    assert replayed_stream == recorded_stream == "TWO WORDS "
+    assert recorded_again.choices[0].message.content == "AGAIN"
+
+
+@pytest.mark.asyncio
+async def test_requests_missing_from_the_recording(tmp_path):
+    """Tests that unrecorded requests raise, or fall back to recording order."""
+    path = tmp_path / "replay.jsonl"
+    recorder = ReplayClient(FakeClient(), RecordReplayTransport("record", path))
+    await recorder.chat.completions.create(**request("first"))
+    await recorder.chat.completions.create(**request("second"))
+
+    strict = ReplayClient(
+        None, RecordReplayTransport("replay", path, latency=0, strict=True)
+    )
+    with pytest.raises(ReplayMissError):
+        await strict.chat.completions.create(**request("drifted"))
+
+    lenient = ReplayClient(None, RecordReplayTransport("replay", path, latency=0))
+    second = await lenient.chat.completions.create(**request("second"))
+    drifted = await lenient.chat.completions.create(**request("drifted"))
+    assert second.choices[0].message.content == "SECOND"
+    assert drifted.choices[0].message.content == "FIRST"
+    with pytest.raises(ReplayMissError):
+        await lenient.chat.completions.create(**request("first"))
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_identical_calls_share_one_request():
+    """Tests that concurrent calls with the same key run the call once."""
+    flight = SingleFlight()
+    started = 0
+
+    async def call():
+        nonlocal started
+        started += 1
+        await asyncio.sleep(0.05)
+        return "result"
+
+    key = flight.request_key({"model": "m", "messages": [{"content": "hi"}]})
+    results = await asyncio.gather(*[flight.do(key, call) for _ in range(5)])
+
+    assert started == 1
+    assert [r for r, _ in results] == ["result"] * 5
+    assert sum(owner for _, owner in results) == 1
+    assert flight.calls == 1 and flight.coalesced == 4
+
+
+@pytest.mark.asyncio
+async def test_errors_propagate_to_waiters():
+    """Tests that a failed call raises in every coalesced caller."""
+    flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("boom")
+
+    results = await asyncio.gather(
+        *[flight.do("key", call) for _ in range(3)], return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert not flight._inflight
+
+
+def test_request_key_ignores_timeout():
+    """Tests that transport-only params do not change the request key."""
+    params = {"model": "m", "messages": []}
+    assert SingleFlight.request_key(params) == SingleFlight.request_key(
+        {**params, "timeout": 30}
+    )
+    assert SingleFlight.request_key(params) != SingleFlight.request_key(
+        {**params, "model": "other"}
+    )
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from app.agent.base import BaseAgent
+from app.flow.planning import PlanningFlow
+from app.schema import AgentState
+from app.tool import PlanningTool
+
+
+class NoteAgent(BaseAgent):
+    """Records each step prompt and reports which step it finished."""
+
+    name: str = "worker"
+    max_steps: int = 2
+    prompts: list = []
+
+    async def step(self) -> str:
+        prompt = self.memory.messages[-1].content
+        self.prompts.append(prompt)
+        self.update_memory("assistant", f"Finished step {len(self.prompts) - 1}.")
+        self.state = AgentState.FINISHED
+        return "raw tool output " * 50
+
+
+class QuietFlow(PlanningFlow):
+    async def _finalize_plan(self) -> str:
+        return "finalized"
+
+
+@pytest.mark.asyncio
+async def test_compact_prompts_carry_summaries_and_remaining_steps():
+    """Tests that compact step prompts summarize recent steps instead of the plan."""
+    tool = PlanningTool()
+    await tool.execute(
+        command="create", plan_id="p", title="Trip", steps=["a", "b", "c", "d"]
+    )
+    agent = NoteAgent(prompts=[])
+    flow = QuietFlow(
+        agent, planning_tool=tool, plan_id="p", step_context="compact", summary_steps=2
+    )
+
+    await flow.execute("")
+
+    first, last = agent.prompts[0], agent.prompts[-1]
+    assert "Progress:" not in first
+    assert "REMAINING STEPS:\n1. b\n2. c\n3. d" in first
+    assert "(1 earlier steps omitted)" in last
+    assert "1. b\n   Result: Finished step 1." in last
+    assert "2. c\n   Result: Finished step 2." in last
+    assert "raw tool output" not in last
+    assert "REMAINING STEPS" not in last
+
+
+@pytest.mark.asyncio
+async def test_speculative_flow_finalizes_from_running_summary(monkeypatch):
+    """Tests that steps are summarized as they finish and finalization adds no call."""
+    tool = PlanningTool()
+    await tool.execute(command="create", plan_id="p", title="Trip", steps=["a", "b"])
+    flow = PlanningFlow(
+        NoteAgent(prompts=[]), planning_tool=tool, plan_id="p", speculative=True
+    )
+    calls = []
+
+    async def fold(messages, system_msgs=None, **kwargs):
+        calls.append(messages[0].content)
+        return f"Summary of {len(calls)} steps."
+
+    monkeypatch.setattr(flow.llm, "ask", fold)
+    result = await flow.execute("")
+
+    assert len(calls) == 2
+    assert "Summary so far:\n(nothing yet)" in calls[0]
+    assert "Summary so far:\nSummary of 1 steps." in calls[1]
+    assert "Its result: Finished step 1." in calls[1]
+    assert result.endswith(
+        "Plan completed:\n\n2/2 steps completed.\n\nSummary of 2 steps."
+    )
+
+
+@pytest.mark.asyncio
+async def test_slow_running_summary_is_not_awaited_past_its_bound(monkeypatch):
+    """Tests that steps still being folded at the end are appended as plain text."""
+    tool = PlanningTool()
+    await tool.execute(command="create", plan_id="p", title="Trip", steps=["a", "b"])
+    flow = PlanningFlow(
+        NoteAgent(prompts=[]),
+        planning_tool=tool,
+        plan_id="p",
+        speculative=True,
+        summary_wait=0.05,
+    )
+
+    async def fold(messages, system_msgs=None, **kwargs):
+        if "Summary so far:\n(nothing yet)" not in messages[0].content:
+            await asyncio.sleep(10)
+        return "Summary of step a."
+
+    monkeypatch.setattr(flow.llm, "ask", fold)
+    result = await asyncio.wait_for(flow.execute(""), timeout=5)
+
+    assert result.endswith(
+        "2/2 steps completed.\n\nSummary of step a.\n- b: Finished step 1."
+    )
+
+
+@pytest.mark.asyncio
+async def test_compact_prompts_list_only_the_next_remaining_steps():
+    """Tests that long plans list the next few remaining steps and count the rest."""
+    tool = PlanningTool()
+    steps = [f"part {i}" for i in range(200)]
+    await tool.execute(command="create", plan_id="p", title="Big", steps=steps)
+    agent = NoteAgent(prompts=[])
+    flow = QuietFlow(
+        agent,
+        planning_tool=tool,
+        plan_id="p",
+        step_context="compact",
+        remaining_steps=3,
+    )
+
+    await flow.execute("")
+
+    first, middle = agent.prompts[0], agent.prompts[100]
+    upcoming = "1. part 1\n2. part 2\n3. part 3\n(and 196 more steps)"
+    assert f"REMAINING STEPS:\n{upcoming}" in first
+    assert "(0/200 steps completed)" in first
+    assert "(100/200 steps completed)" in middle
+    assert "101. part 101\n102. part 102\n103. part 103\n(and 96 more steps)" in middle
+    assert "98. part 98\n   Result: Finished step 98." in middle
+    assert max(len(prompt) for prompt in agent.prompts) < 2 * len(first)
@@ -0,0 +1,82 @@
+import pytest
+
+from app.tool import ToolCollection
+from app.tool.base import BaseTool, CachePolicy, ToolResult
+from app.tool.cache import ToolResultCache
+from app.tool.str_replace_editor import StrReplaceEditor
+
+
+class ReadFile(BaseTool):
+    """Counts executions so tests can tell hits from misses."""
+
+    name: str = "read_file"
+    description: str = "Read a file."
+    calls: int = 0
+
+    def cache_policy(self, path: str) -> CachePolicy:
+        return CachePolicy(files=[path], persist=True)
+
+    async def execute(self, path: str) -> ToolResult:
+        self.calls += 1
+        with open(path) as f:
+            return ToolResult(output=f.read())
+
+
+@pytest.fixture
+def tools(tmp_path) -> ToolCollection:
+    collection = ToolCollection(ReadFile())
+    collection.cache = ToolResultCache(disk_dir=tmp_path / "cache")
+    return collection
+
+
+@pytest.mark.asyncio
+async def test_repeated_call_is_served_from_cache(tools, tmp_path):
+    """Tests that identical calls execute once until the file changes."""
+    path = tmp_path / "data.txt"
+    path.write_text("one")
+
+    first = await tools.execute(name="read_file", tool_input={"path": str(path)})
+    second = await tools.execute(name="read_file", tool_input={"path": str(path)})
+    assert first.output == second.output == "one"
+    assert tools.get_tool("read_file").calls == 1
+    assert tools.cache.hit_rate == 0.5
+
+    path.write_text("changed")
+    third = await tools.execute(name="read_file", tool_input={"path": str(path)})
+    assert third.output == "changed"
+    assert tools.cache.stale == 1
+
+
+@pytest.mark.asyncio
+async def test_persisted_results_survive_a_new_cache(tools, tmp_path):
+    """Tests that persisted results are read back from disk."""
+    path = tmp_path / "data.txt"
+    path.write_text("one")
+    await tools.execute(name="read_file", tool_input={"path": str(path)})
+
+    tools.cache = ToolResultCache(disk_dir=tmp_path / "cache")
+    result = await tools.execute(name="read_file", tool_input={"path": str(path)})
+
+    assert result.output == "one"
+    assert tools.get_tool("read_file").calls == 1
+
+
+def test_expired_entries_are_misses():
+    """Tests TTL expiry and that failures are never cached."""
+    cache = ToolResultCache()
+    cache.put("search", {"q": "x"}, CachePolicy(ttl=0), ToolResult(output="r"))
+    cache.put("search", {"q": "y"}, CachePolicy(), ToolResult(error="failed"))
+
+    assert cache.get("search", {"q": "x"}, CachePolicy(ttl=0)) is None
+    assert cache.get("search", {"q": "y"}, CachePolicy()) is None
+    assert cache.stale == 1
+
+
+def test_editor_caches_file_views_but_not_directory_listings(tmp_path):
+    """Tests that nested listings are never reused from a stale cache."""
+    path = tmp_path / "notes.txt"
+    path.write_text("x")
+    editor = StrReplaceEditor()
+
+    assert editor.cache_policy(command="view", path=str(tmp_path)) is None
+    assert editor.cache_policy(command="view", path=str(path)).files == [str(path)]
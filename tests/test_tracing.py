@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import pytest
+
+from app.config import TracingSettings
+from app.tracing import NOOP_SPAN, Span, Tracer, current_span, summarize
+
+
+@pytest.fixture
+def tracer(tmp_path) -> Tracer:
+    """Creates an enabled tracer writing to a temporary directory."""
+    return Tracer(TracingSettings(enabled=True, output_dir=str(tmp_path)))
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_tasks(tracer: Tracer, tmp_path):
+    """Tests that child spans link to their parent, including in gathered tasks."""
+
+    async def tool(i: int):
+        with tracer.span("tool.execute", tool=f"t{i}") as span:
+            span.set_attribute("output_bytes", 10)
+            await asyncio.sleep(0)
+
+    with tracer.span("agent.run") as root:
+        with tracer.span("agent.step") as step:
+            await asyncio.gather(tool(0), tool(1))
+
+    spans = [json.loads(line) for line in (tmp_path / "spans.jsonl").open()]
+    by_name = {}
+    for span in spans:
+        by_name.setdefault(span["name"], []).append(span)
+
+    assert {s["traceId"] for s in spans} == {root.trace_id}
+    assert by_name["agent.step"][0]["parentSpanId"] == root.span_id
+    assert [s["parentSpanId"] for s in by_name["tool.execute"]] == [step.span_id] * 2
+    assert len(list(tmp_path.glob("trace_*.json"))) == 1
+
+
+@pytest.mark.asyncio
+async def test_spans_ending_after_their_trace_are_dropped(tracer: Tracer, tmp_path):
+    """Tests that a child outliving its root span leaves no trace state behind."""
+    release = asyncio.Event()
+
+    async def background():
+        with tracer.span("browser.prefetch"):
+            await release.wait()
+
+    with tracer.span("agent.run"):
+        task = asyncio.create_task(background())
+        await asyncio.sleep(0)
+    release.set()
+    await task
+
+    spans = [json.loads(line) for line in (tmp_path / "spans.jsonl").open()]
+    assert [s["name"] for s in spans] == ["agent.run"]
+    assert not tracer._finished
+
+
+def test_errors_mark_span_status(tracer: Tracer):
+    """Tests that an exception inside a span records an error status."""
+    with pytest.raises(ValueError):
+        with tracer.span("agent.run") as span:
+            raise ValueError("boom")
+
+    assert span.status == "ERROR"
+    assert "boom" in span.status_message
+
+
+def test_disabled_tracer_yields_noop_span():
+    """Tests that disabled tracing creates no spans."""
+    tracer = Tracer(TracingSettings(enabled=False))
+    with tracer.span("agent.run") as span:
+        span.set_attribute("steps", 1)
+        assert current_span() is NOOP_SPAN
+
+    assert span is NOOP_SPAN
+    assert not span.recording
+
+
+def test_summary_aggregates_by_name():
+    """Tests that the summary table sums counts and token attributes."""
+    root = Span("agent.run")
+    spans = [
+        Span("llm.request", root, input_tokens=100, completion_tokens=5)
+        for _ in range(2)
+    ]
+    for span in spans + [root]:
+        span.end()
+
+    lines = summarize(spans + [root]).splitlines()
+    row = next(line for line in lines if line.startswith("llm.request")).split()
+
+    assert row[1] == "2"
+    assert row[-3:] == ["200", "10", "0"]